@@ -0,0 +1,100 @@
+import os
+import csv
+import glob
+from typing import List, Optional, Tuple
+import ffmpeg
+
+# Whisper-friendly audio: mono 16 kHz low-bitrate MP3. At 32 kbps an hour of
+# speech is ~14 MB, so most lectures fit in one request under the 25 MB limit.
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_BITRATE_KBPS = int(os.getenv("AUDIO_BITRATE_KBPS", "32"))
+MAX_TRANSCRIBE_BYTES = 24 * 1024 * 1024  # 24MB to be safe (OpenAI limit is 25MB)
+# Segment length in seconds; 0 picks the longest segment that fits the limit
+AUDIO_SEGMENT_SECONDS = int(os.getenv("AUDIO_SEGMENT_SECONDS", "0"))
+# Segment length for engines without a request size limit: one segment
+UNSEGMENTED_SECONDS = 7 * 24 * 3600
+# Longest segment when lectures are indexed while they are transcribed
+# (0 = no cap). Shorter segments make a lecture queryable sooner. Only
+# lectures that need several segments anyway are capped.
+INCREMENTAL_SEGMENT_SECONDS = int(os.getenv("INCREMENTAL_SEGMENT_SECONDS", "600"))
+
+
+def media_duration(path: str) -> Optional[float]:
+    """Duration in seconds from the file's container header, or None if ffprobe cannot tell."""
+    try:
+        return float(ffmpeg.probe(path)["format"]["duration"])
+    except (ffmpeg.Error, KeyError, ValueError, OSError):
+        return None
+
+
+def segment_seconds(max_bytes: Optional[int] = MAX_TRANSCRIBE_BYTES, incremental: bool = False,
+                    duration: Optional[float] = None) -> int:
+    """
+    Segment length for a transcription engine accepting files up to max_bytes
+    (None = unlimited). With incremental, a lecture of the given duration
+    (None = unknown) that needs several segments anyway gets shorter ones.
+    """
+    if AUDIO_SEGMENT_SECONDS > 0:
+        return AUDIO_SEGMENT_SECONDS
+    if max_bytes is None:
+        longest = UNSEGMENTED_SECONDS
+    else:
+        # Leave 5% headroom for container overhead and bitrate jitter
+        longest = int(max_bytes * 8 / (AUDIO_BITRATE_KBPS * 1000) * 0.95)
+    # A lecture that fits one request stays one request (one call, no seams)
+    if incremental and INCREMENTAL_SEGMENT_SECONDS > 0 and (duration is None or duration > longest):
+        return min(longest, INCREMENTAL_SEGMENT_SECONDS)
+    return longest
+
+
+def extract_audio_segments(video_path: str, base_path: str, chunk_duration: int = None) -> List[Tuple[str, float]]:
+    """
+    Decode the video once and write time-segmented speech audio.
+
+    Writes {base_path}_chunk_NNN.mp3 files via ffmpeg's segment muxer and
+    returns [(segment_path, start_seconds), ...]. Start times come from the
+    muxer's segment list, i.e. the real cut points, not i * chunk_duration.
+    """
+    chunk_duration = chunk_duration or segment_seconds()
+    segment_pattern = f"{base_path}_chunk_%03d.mp3"
+    segment_list_path = f"{base_path}_segments.csv"
+    # Stale segments from an earlier run would be picked up by the list parser
+    for stale in glob.glob(f"{base_path}_chunk_*.mp3"):
+        os.remove(stale)
+    (
+        ffmpeg
+        .input(video_path)
+        .output(
+            segment_pattern,
+            vn=None,
+            ac=1,
+            ar=AUDIO_SAMPLE_RATE,
+            acodec='libmp3lame',
+            audio_bitrate=f"{AUDIO_BITRATE_KBPS}k",
+            f='segment',
+            segment_time=chunk_duration,
+            reset_timestamps=1,
+            segment_list=segment_list_path,
+            segment_list_type='csv'
+        )
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    segments = read_segment_list(segment_list_path)
+    try:
+        os.remove(segment_list_path)
+    except OSError:
+        pass
+    return segments
+
+
+def read_segment_list(segment_list_path: str) -> List[Tuple[str, float]]:
+    """Parse an ffmpeg CSV segment list (filename,start,end) into (path, start)."""
+    segment_dir = os.path.dirname(segment_list_path)
+    segments = []
+    with open(segment_list_path, "r", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            segments.append((os.path.join(segment_dir, os.path.basename(row[0])), float(row[1])))
+    return segments
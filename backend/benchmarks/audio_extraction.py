@@ -0,0 +1,88 @@
+"""
+Benchmark: legacy extract-then-rechunk audio path vs single-pass segmentation.
+
+Legacy: one ffmpeg pass to a full-quality MP3, then one more decode of that
+MP3 per 10-minute chunk (N+1 passes). Single pass: video straight to mono
+16 kHz low-bitrate segments with the segment muxer. Reports wall time and
+bytes written (including intermediates) as JSON.
+
+Usage (from the backend/ directory):
+    python benchmarks/audio_extraction.py --minutes 120
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+
+from common import generate_lecture_video
+
+import ffmpeg
+from audio_processing import extract_audio_segments, segment_seconds
+
+
+def legacy_extract_and_chunk(video_path: str, work_dir: str, chunk_duration: int = 600) -> int:
+    """The pre-segment-muxer pipeline; returns total bytes written."""
+    audio_path = os.path.join(work_dir, "legacy.mp3")
+    ffmpeg.input(video_path).output(audio_path, acodec='mp3', vn=None).overwrite_output().run(quiet=True)
+    bytes_written = os.path.getsize(audio_path)
+    duration = float(ffmpeg.probe(audio_path)['format']['duration'])
+    for i in range(math.ceil(duration / chunk_duration)):
+        chunk_path = os.path.join(work_dir, f"legacy_chunk_{i:03d}.mp3")
+        (
+            ffmpeg
+            .input(audio_path, ss=i * chunk_duration, t=chunk_duration)
+            .output(chunk_path, acodec='mp3')
+            .overwrite_output()
+            .run(quiet=True)
+        )
+        bytes_written += os.path.getsize(chunk_path)
+    return bytes_written
+
+
+def single_pass(video_path: str, work_dir: str) -> dict:
+    segments = extract_audio_segments(video_path, os.path.join(work_dir, "single"))
+    return {
+        "bytes_written": sum(os.path.getsize(path) for path, _ in segments),
+        "segments": len(segments),
+        "segment_starts": [round(start, 3) for _, start in segments],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Existing video (default: generate one)")
+    parser.add_argument("--minutes", type=int, default=120, help="Length of the generated video")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="audio_bench_")
+    try:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(work_dir, "lecture.mp4")
+            generate_lecture_video(video_path, args.minutes * 60)
+
+        start = time.perf_counter()
+        legacy_bytes = legacy_extract_and_chunk(video_path, work_dir)
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        single = single_pass(video_path, work_dir)
+        single_seconds = time.perf_counter() - start
+
+        print(json.dumps({
+            "video": os.path.basename(video_path),
+            "segment_seconds": segment_seconds(),
+            "legacy": {"wall_seconds": round(legacy_seconds, 3), "bytes_written": legacy_bytes},
+            "single_pass": {"wall_seconds": round(single_seconds, 3), **single},
+            "speedup": round(legacy_seconds / single_seconds, 2) if single_seconds else None,
+            "bytes_ratio": round(legacy_bytes / single["bytes_written"], 2) if single["bytes_written"] else None,
+        }, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
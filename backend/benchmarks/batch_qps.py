@@ -0,0 +1,102 @@
+"""
+Throughput of rag_query (one question at a time) vs rag_query_batch.
+
+Starts benchmarks/fake_openai.py as the OpenAI endpoint, ingests a
+synthetic transcript into a throwaway directory, then answers --queries
+distinct questions both ways and prints queries per second as JSON. Each
+mode gets its own question set so neither benefits from the other's caches.
+
+Usage (from the backend/ directory):
+    python benchmarks/batch_qps.py --queries 200 --concurrency 8
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, wait_for_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM generations in flight for the batch")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--first-token-ms", type=float, default=300.0)
+    parser.add_argument("--token-interval-ms", type=float, default=5.0)
+    parser.add_argument("--embedding-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "fake_openai.py"),
+        "--port", str(args.port),
+        "--first-token-ms", str(args.first_token_ms),
+        "--token-interval-ms", str(args.token_interval_ms),
+        "--embedding-ms", str(args.embedding_ms),
+    ])
+    work_dir = tempfile.mkdtemp(prefix="batch_qps_")
+    os.chdir(work_dir)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+    try:
+        wait_for_server(f"http://127.0.0.1:{args.port}/")
+        from langchain_openai import OpenAIEmbeddings
+        import embeddings
+        import job_store
+        import rag_query
+        import vector_pipeline
+
+        # The fake server embeds raw text, so skip client-side tokenization
+        embeddings._embeddings = embeddings.CachedEmbeddings(
+            OpenAIEmbeddings(model=embeddings.EMBEDDING_MODEL, check_embedding_ctx_length=False),
+            embeddings.EMBEDDING_MODEL,
+            embeddings.EmbeddingCache(),
+        )
+
+        os.makedirs("uploads")
+        with open("uploads/benchmark.transcript.txt", "w", encoding="utf-8") as f:
+            f.write(" ".join(
+                f"Section {i} of the lecture covers topic {i % 37} with worked example {i}." for i in range(2000)
+            ))
+        job_store.init_db()
+        job_store.add_job("benchmark.mp4")
+        vector_pipeline.process_transcript("benchmark.mp4")
+
+        sequential_questions = [f"What does the lecture say about topic {i}?" for i in range(args.queries)]
+        batch_questions = [f"How is topic {i} explained in the lecture?" for i in range(args.queries)]
+
+        start = time.perf_counter()
+        sequential = [rag_query.rag_query("benchmark.mp4", q) for q in sequential_questions]
+        sequential_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = rag_query.rag_query_batch("benchmark.mp4", batch_questions, max_concurrency=args.concurrency)
+        batch_seconds = time.perf_counter() - start
+
+        print(json.dumps({
+            "queries": args.queries,
+            "concurrency": args.concurrency,
+            "sequential": {
+                "seconds": round(sequential_seconds, 3),
+                "qps": round(args.queries / sequential_seconds, 2),
+            },
+            "batch": {
+                "seconds": round(batch_seconds, 3),
+                "qps": round(args.queries / batch_seconds, 2),
+                "errors": sum(1 for r in batch if r["error"]),
+            },
+            "speedup": round(sequential_seconds / batch_seconds, 2),
+            "answers_match": all(s["answer"] == b["answer"] for s, b in zip(sequential, batch)),
+        }, indent=2))
+    finally:
+        fake.terminate()
+        fake.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
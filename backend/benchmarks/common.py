@@ -0,0 +1,71 @@
+"""Helpers shared by the benchmark scripts."""
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+# Let benchmark scripts import backend modules when run as
+# `python benchmarks/<script>.py` from the backend/ directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def generate_lecture_video(path: str, seconds: int, frequency: int = 440, video: bool = True):
+    """
+    Create a small synthetic lecture (tone + black frames). Vary frequency
+    to get distinct files, since identical uploads are deduplicated. With
+    video=False only the audio track is written (e.g. to an .m4a path).
+    """
+    inputs = ["-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={seconds}"]
+    if video:
+        inputs += ["-f", "lavfi", "-i", f"color=c=black:s=160x120:r=1:d={seconds}"]
+        codecs = ["-shortest", "-c:v", "libx264", "-c:a", "aac"]
+    else:
+        codecs = ["-c:a", "aac"]
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *inputs, *codecs, path], check=True)
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def upload(base_url: str, video_path: str) -> dict:
+    """POST a file to /upload as multipart/form-data using only the stdlib."""
+    boundary = uuid.uuid4().hex
+    filename = os.path.basename(video_path)
+    with open(video_path, "rb") as f:
+        payload = f.read()
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    request = urllib.request.Request(
+        f"{base_url}/upload",
+        data=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def wait_for_server(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return  # server is up; the path just doesn't exist
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start at {url}")
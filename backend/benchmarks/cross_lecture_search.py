@@ -0,0 +1,165 @@
+"""
+Latency and recall of cross-lecture search as the number of lectures grows:
+the per-lecture fan-out /search used to do (one search per lecture, on the
+Chroma or flat retriever) vs the shared cross-lecture routing index.
+
+Builds synthetic lectures in a throwaway directory (no API calls). Each
+lecture has --chunks chunks of 30 s; its vectors cluster around one topic
+per 10-minute stretch, so time windows summarize their chunks like real
+lectures do. Window levels are written as ingestion would. Queries are
+noisy copies of stored chunks; recall@k is measured against exact search
+over every chunk.
+
+Usage (from the backend/ directory):
+    python benchmarks/cross_lecture_search.py --counts 10 50 200 --chunks 300
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from common import percentile
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+CHUNK_SECONDS = 30
+
+
+def lecture_vectors(args, lecture: int) -> np.ndarray:
+    rng = np.random.default_rng(lecture)
+    topics = rng.standard_normal((args.chunks * CHUNK_SECONDS // 600 + 1, args.dim)).astype(np.float32)
+    vectors = topics[np.arange(args.chunks) * CHUNK_SECONDS // 600]
+    vectors = vectors + 0.8 * rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(args, lecture: int):
+    from rag_registry import open_collection
+    from vector_pipeline import collection_name_for
+    from window_index import build_levels, window_collection_name
+    from word_timeline import build_timeline
+
+    collection_name = collection_name_for(f"bench_{lecture}.mp4")
+    vectors = lecture_vectors(args, lecture)
+    ids = [f"{lecture}-{i}" for i in range(args.chunks)]
+    metadatas = [
+        {"chunk_index": i, "start_time": float(i * CHUNK_SECONDS), "end_time": float((i + 1) * CHUNK_SECONDS)}
+        for i in range(args.chunks)
+    ]
+    collection = open_collection(collection_name)
+    for start in range(0, args.chunks, 1000):
+        end = start + 1000
+        collection.add(
+            ids=ids[start:end], embeddings=vectors[start:end], metadatas=metadatas[start:end],
+            documents=[f"chunk {i} of lecture {lecture}" for i in range(start, min(end, args.chunks))],
+        )
+    # One word per second along the lecture
+    seconds = args.chunks * CHUNK_SECONDS
+    timeline = build_timeline(["word"] * seconds, range(seconds), range(1, seconds + 1))
+    for level, (window_ids, documents, window_metadatas, window_vectors) in build_levels(
+        timeline, ids, metadatas, vectors
+    ).items():
+        open_collection(window_collection_name(collection_name, level)).add(
+            ids=window_ids, embeddings=window_vectors, documents=documents, metadatas=window_metadatas
+        )
+
+
+def fan_out(rag_query, rag_registry, query_vector, k, backend):
+    """The previous /search: one top-k search per lecture, merged by distance."""
+    rag_registry.RETRIEVER_BACKEND = backend
+    collections = rag_query.lecture_collections()
+
+    def search_one(item):
+        collection_name, filenames = item
+        vectordb = rag_registry.get_vectorstore(filenames[0], collection_name)
+        return [(score, doc) for doc, score in vectordb.similarity_search_by_vector_with_relevance_scores(query_vector, k=k)]
+
+    hits = [hit for found in rag_query.search_executor.map(search_one, collections.items()) for hit in found]
+    return [doc.id for _, doc in sorted(hits, key=lambda hit: hit[0])[:k]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--chunks", type=int, default=300, help="Chunks per lecture (30 s each)")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="cross_lecture_search_")
+    os.chdir(work_dir)
+    try:
+        import job_store
+        import rag_query
+        import rag_registry
+        from corpus_index import corpus
+
+        job_store.init_db()
+        # Hold every lecture: this measures search, not flat index eviction
+        rag_registry.flat_indexes.max_bytes = 2 ** 40
+        rng = np.random.default_rng(7)
+
+        report = []
+        built = 0
+        for count in sorted(args.counts):
+            for lecture in range(built, count):
+                build(args, lecture)
+                job_store.add_job(f"bench_{lecture}.mp4")
+                job_store.update_job(f"bench_{lecture}.mp4", status="done")
+            built = count
+            row = {"lectures": count}
+            started = time.perf_counter()
+            rag_query.search_lectures_by_vector("warm-up", rng.standard_normal(args.dim).tolist(), k=args.k)
+            row["routing_index_load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+            queries = []
+            for _ in range(args.queries):
+                lecture, chunk = int(rng.integers(count)), int(rng.integers(args.chunks))
+                vector = lecture_vectors(args, lecture)[chunk] + 0.02 * rng.standard_normal(args.dim)
+                queries.append(vector.astype(np.float32).tolist())
+            for backend in ("chroma", "flat"):
+                fan_out(rag_query, rag_registry, queries[0], args.k, backend)
+                samples, exact = [], []
+                for vector in queries:
+                    start = time.perf_counter()
+                    exact.append(fan_out(rag_query, rag_registry, vector, args.k, backend))
+                    samples.append(time.perf_counter() - start)
+                ordered = sorted(samples)
+                row[f"fan_out_{backend}"] = {
+                    "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                    "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+                }
+            samples, recalls = [], []
+            for vector, expected in zip(queries, exact):
+                start = time.perf_counter()
+                result = rag_query.search_lectures_by_vector("bench", vector, k=args.k)
+                samples.append(time.perf_counter() - start)
+                found = {f"{hit['video_id']}:{hit['chunk_index']}" for hit in result["hits"]}
+                wanted = {f"bench_{doc_id.split('-')[0]}.mp4:{doc_id.split('-')[1]}" for doc_id in expected}
+                recalls.append(len(found & wanted) / len(wanted))
+            assert result["lectures_searched"] == count and not result["errors"], result["errors"]
+            ordered = sorted(samples)
+            row["routing_index"] = {
+                "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+                f"recall@{args.k}": round(float(np.mean(recalls)), 3),
+            }
+            report.append(row)
+
+        print(json.dumps({
+            "chunks_per_lecture": args.chunks,
+            "routing_rows": corpus.stats()["rows"],
+            "cpu_count": os.cpu_count(),
+            "results": report,
+        }, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Embedding throughput in chunks per second for each embedding backend,
+bypassing the embedding cache.
+
+Backends:
+    openai      OpenAIEmbeddings (real API, or --openai-base-url for
+                benchmarks/fake_openai.py)
+    local       sentence-transformers on CPU, in-process
+    local-onnx  same model through ONNX Runtime (--onnx-file, e.g. a
+                quantized onnx/model_qint8_avx2.onnx)
+    local-pool  sentence-transformers with --workers processes
+
+Chunks are synthetic ~800-character transcript passages (CHUNK_SIZE).
+Backends whose packages or models are unavailable are reported as skipped.
+
+Usage (from the backend/ directory):
+    python benchmarks/embedding_throughput.py --chunks 512 --backends local local-onnx local-pool
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+
+WORDS = (
+    "gradient descent loss function model training data layer network weights bias "
+    "optimizer learning rate batch epoch validation accuracy transformer attention "
+    "token embedding vector matrix probability distribution sample feature"
+).split()
+
+
+def synthetic_chunks(count: int, size: int) -> list:
+    rng = random.Random(0)
+    chunks = []
+    for _ in range(count):
+        words = []
+        while sum(len(w) + 1 for w in words) < size:
+            words.append(rng.choice(WORDS))
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def make_backend(name: str, args):
+    import embeddings
+    if name == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        if args.openai_base_url:
+            # The fake server takes raw text, so skip client-side tokenization
+            return OpenAIEmbeddings(
+                model=embeddings.EMBEDDING_MODEL,
+                base_url=args.openai_base_url,
+                api_key=os.getenv("OPENAI_API_KEY", "sk-benchmark"),
+                check_embedding_ctx_length=False,
+            )
+        return OpenAIEmbeddings(model=embeddings.EMBEDDING_MODEL)
+    if name == "local":
+        return embeddings.LocalEmbeddings(args.model, args.batch_size, onnx_file="", workers=0)
+    if name == "local-onnx":
+        return embeddings.LocalEmbeddings(args.model, args.batch_size, onnx_file=args.onnx_file, workers=0)
+    if name == "local-pool":
+        return embeddings.LocalEmbeddings(args.model, args.batch_size, onnx_file="", workers=args.workers)
+    raise ValueError(name)
+
+
+def main():
+    from vector_pipeline import CHUNK_SIZE
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--backends", nargs="+", default=["local", "local-onnx", "local-pool"],
+                        choices=["openai", "local", "local-onnx", "local-pool"])
+    parser.add_argument("--model", default=os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    parser.add_argument("--onnx-file", default="onnx/model_qint8_avx2.onnx")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--openai-base-url", help="e.g. http://localhost:8010/v1 for the fake server")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks, CHUNK_SIZE)
+    results = {}
+    for name in args.backends:
+        try:
+            backend = make_backend(name, args)
+            backend.embed_documents(chunks[:8])  # load the model / open connections
+            start = time.perf_counter()
+            vectors = backend.embed_documents(chunks)
+            seconds = time.perf_counter() - start
+            results[name] = {
+                "seconds": round(seconds, 3),
+                "chunks_per_second": round(len(chunks) / seconds, 1),
+                "dimensions": len(vectors[0]),
+            }
+            if hasattr(backend, "close"):
+                backend.close()
+        except Exception as e:
+            results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+
+    print(json.dumps({
+        "chunks": args.chunks,
+        "chunk_chars": CHUNK_SIZE,
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
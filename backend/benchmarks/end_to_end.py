@@ -0,0 +1,286 @@
+"""
+End-to-end benchmark: upload -> process_job -> /rag-query against a local
+OpenAI stand-in, reported as one JSON document for regression tracking.
+
+Starts benchmarks/fake_openai.py (configurable latency, 500s and 429s) and
+the backend (uvicorn main:app) in a throwaway working directory, generates
+synthetic lectures of the given lengths with ffmpeg, uploads them one at a
+time and waits for each to finish, then sends distinct questions to every
+lecture (uncached), and repeats them (answer cache hits).
+
+Reported:
+  ingest   per lecture: upload, processing and transcription wall time,
+           time until it was first queryable, real-time factor and the
+           job's stage timings; overall audio
+           seconds ingested per second (use --parallel with
+           --env INGEST_WORKERS=N to measure scaling with workers)
+  query    p50/p95/p99 latency, qps and errors, uncached and cached
+  backend  peak RSS (VmHWM) of the backend process
+  openai   request / 500 / 429 counts per endpoint from the fake server
+
+Usage (from the backend/ directory):
+    python benchmarks/end_to_end.py --minutes 5 30 --queries 50 --output e2e.json
+    python benchmarks/end_to_end.py --minutes 10 --rate-limit-rate 0.05 --env RETRIEVER_BACKEND=flat
+
+The backend's OpenAIEmbeddings tokenizes with tiktoken, which downloads its
+encoding on first use (or reads TIKTOKEN_CACHE_DIR).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from common import BACKEND_DIR, generate_lecture_video, percentile, upload, wait_for_server
+
+QUESTIONS = [
+    "What is the main topic of this lecture?",
+    "How is gradient descent explained?",
+    "What does the lecturer say about the learning rate?",
+    "Which example is worked through?",
+    "How is overfitting addressed?",
+    "What is said about validation data?",
+    "Summarise the key ideas.",
+    "What comes after the introduction?",
+]
+
+
+def get_json(url: str, timeout: float = 30) -> dict:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def post_json(url: str, payload: dict, timeout: float = 120) -> dict:
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def peak_rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def latency_summary(samples: list, errors: int, wall_seconds: float) -> dict:
+    ordered = sorted(samples)
+    return {
+        "requests": len(samples) + errors,
+        "errors": errors,
+        "qps": round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+    }
+
+
+def upload_lecture(base_url: str, video_path: str) -> tuple:
+    """(filename, upload seconds)"""
+    start = time.perf_counter()
+    uploaded = upload(base_url, video_path)
+    return uploaded["filename"], time.perf_counter() - start
+
+
+def wait_for_job(base_url: str, filename: str, video_path: str, seconds: int, upload_seconds: float,
+                 timeout: float, start: float = None) -> dict:
+    """Poll until the job finishes; wall time counts from start (default: now)."""
+    start = start or time.perf_counter()
+    job = None
+    first_queryable = None
+    while time.perf_counter() - start < timeout:
+        jobs = get_json(f"{base_url}/processing-status?filename={filename}")["jobs"]
+        job = jobs[0] if jobs else None
+        if job and first_queryable is None and job["status"] in ("partially_available", "done"):
+            first_queryable = time.perf_counter() - start
+        if job and job["status"] in ("done", "error"):
+            break
+        time.sleep(0.1)
+    wall_seconds = time.perf_counter() - start
+    metadata = (job or {}).get("transcript_metadata") or {}
+    stages = (job or {}).get("stage_timings") or {}
+    processing_seconds = stages.get("total", wall_seconds)
+    transcription_seconds = metadata.get("transcription_seconds")
+    return {
+        "filename": filename,
+        "video_seconds": seconds,
+        "bytes": os.path.getsize(video_path),
+        "status": job["status"] if job else "missing",
+        "error": job.get("error") if job else None,
+        "upload_seconds": round(upload_seconds, 3),
+        # Wall time includes waiting in the queue; processing time does not
+        "wall_seconds": round(wall_seconds, 3),
+        # Until the first part could be queried (incremental indexing)
+        "first_queryable_seconds": round(first_queryable, 3) if first_queryable is not None else None,
+        "processing_seconds": round(processing_seconds, 3),
+        "transcription_seconds": transcription_seconds,
+        # Audio extraction, chunking, embedding and indexing
+        "other_processing_seconds": round(processing_seconds - transcription_seconds, 3)
+        if transcription_seconds is not None else None,
+        "real_time_factor": metadata.get("real_time_factor"),
+        "stage_seconds": stages,
+    }
+
+
+def run_queries(base_url: str, requests: list, concurrency: int) -> dict:
+    samples, errors = [], 0
+
+    def one(payload):
+        start = time.perf_counter()
+        try:
+            result = post_json(f"{base_url}/rag-query", payload)
+        except (urllib.error.URLError, OSError):
+            return None
+        if result["answer"].startswith(("Error", "Unexpected error")):
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed in pool.map(one, requests):
+            if elapsed is None:
+                errors += 1
+            else:
+                samples.append(elapsed)
+    return latency_summary(samples, errors, time.perf_counter() - start)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=int, nargs="+", default=[5, 30], help="Lengths of the generated lectures")
+    parser.add_argument("--audio-only", action="store_true", help="Generate audio files instead of videos")
+    parser.add_argument("--queries", type=int, default=50, help="Distinct questions per lecture")
+    parser.add_argument("--query-concurrency", type=int, default=4)
+    parser.add_argument("--ingest-timeout", type=float, default=1800)
+    parser.add_argument("--parallel", action="store_true",
+                        help="Upload all lectures before waiting, so INGEST_WORKERS of them process at once")
+    parser.add_argument("--backend-port", type=int, default=8020)
+    parser.add_argument("--fake-port", type=int, default=8021)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the backend, e.g. RETRIEVER_BACKEND=flat")
+    parser.add_argument("--first-token-ms", type=float, default=400.0)
+    parser.add_argument("--token-interval-ms", type=float, default=10.0)
+    parser.add_argument("--embedding-ms", type=float, default=50.0)
+    parser.add_argument("--transcription-ms", type=float, default=500.0)
+    parser.add_argument("--transcription-rtf", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="end_to_end_")
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    base_url = f"http://127.0.0.1:{args.backend_port}"
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "fake_openai.py"),
+        "--port", str(args.fake_port),
+        "--first-token-ms", str(args.first_token_ms),
+        "--token-interval-ms", str(args.token_interval_ms),
+        "--embedding-ms", str(args.embedding_ms),
+        "--transcription-ms", str(args.transcription_ms),
+        "--transcription-rtf", str(args.transcription_rtf),
+        "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate),
+    ])
+    backend_env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "OPENAI_API_KEY": "sk-benchmark",
+        **dict(item.split("=", 1) for item in args.env),
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+         "--port", str(args.backend_port), "--log-level", "warning"],
+        cwd=work_dir, env=backend_env,
+    )
+    try:
+        wait_for_server(f"{fake_url}/stats")
+        wait_for_server(f"{base_url}/", timeout=120)
+
+        paths = []
+        for i, minutes in enumerate(args.minutes):
+            path = os.path.join(work_dir, f"synthetic_{i}_{minutes}min.{'m4a' if args.audio_only else 'mp4'}")
+            # A different tone per lecture keeps uploads from being deduplicated
+            generate_lecture_video(path, minutes * 60, frequency=300 + 50 * i, video=not args.audio_only)
+            paths.append((path, minutes * 60))
+
+        lectures = []
+        ingest_started = time.perf_counter()
+        if args.parallel:
+            # Processing time includes time spent waiting in the queue
+            uploads = [(path, seconds, *upload_lecture(base_url, path)) for path, seconds in paths]
+            for path, seconds, filename, upload_seconds in uploads:
+                lectures.append(wait_for_job(base_url, filename, path, seconds, upload_seconds,
+                                             args.ingest_timeout, start=ingest_started))
+        else:
+            for path, seconds in paths:
+                filename, upload_seconds = upload_lecture(base_url, path)
+                lectures.append(wait_for_job(base_url, filename, path, seconds, upload_seconds, args.ingest_timeout))
+        ingest_seconds = time.perf_counter() - ingest_started
+
+        done = [lecture["filename"] for lecture in lectures if lecture["status"] == "done"]
+        requests = [
+            {"video_id": filename, "query": f"{QUESTIONS[q % len(QUESTIONS)]} (#{q})"}
+            for filename in done for q in range(args.queries)
+        ]
+        uncached = run_queries(base_url, requests, args.query_concurrency)
+        cached = run_queries(base_url, requests, args.query_concurrency)
+
+        audio = sum(lecture["video_seconds"] for lecture in lectures if lecture["status"] == "done")
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "config": {k: v for k, v in vars(args).items() if k != "output"},
+            },
+            "ingest": {
+                "lectures": lectures,
+                "failed": len(lectures) - len(done),
+                "total_audio_seconds": audio,
+                "wall_seconds": round(ingest_seconds, 3),
+                "audio_seconds_per_second": round(audio / ingest_seconds, 2) if ingest_seconds else 0.0,
+            },
+            "query": {"uncached": uncached, "cached": cached},
+            "backend": {"peak_rss_mb": round(peak_rss_bytes(backend.pid) / 2**20, 1)},
+            "openai": get_json(f"{fake_url}/stats")["endpoints"],
+        }
+        output = json.dumps(report, indent=2)
+        print(output)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(output)
+    finally:
+        for process in (backend, fake):
+            process.terminate()
+            process.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Minimal stand-in for the OpenAI API, for benchmarks that must not hit the
+real service. Serves:
+
+    POST /v1/audio/transcriptions  verbose_json with word timestamps
+    POST /v1/chat/completions      streaming (SSE) and non-streaming
+    POST /v1/embeddings            deterministic unit vectors per input text
+    GET  /stats                    request / error / 429 counters per endpoint
+
+Chat replies are a fixed lorem-style answer emitted one word per chunk,
+after --first-token-ms, with --token-interval-ms between chunks.
+Transcriptions estimate the audio duration from the upload size at
+--audio-kbps (the pipeline's AUDIO_BITRATE_KBPS) and take
+--transcription-ms plus --transcription-rtf x duration to answer.
+--error-rate and --rate-limit-rate inject 500s and 429s (with Retry-After)
+into every endpoint, to exercise the backend's retry paths.
+
+Usage (from the backend/ directory):
+    python benchmarks/fake_openai.py --port 8010 --first-token-ms 400
+Then start the backend with OPENAI_BASE_URL=http://localhost:8010/v1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIMENSIONS = 1536
+ANSWER_WORDS = (
+    "The lecture introduces the topic at [00:30] and then works through an example "
+    "at [02:15], explaining each step and summarising the key ideas at the end."
+).split()
+TRANSCRIPT_VOCABULARY = (
+    "today we discuss gradient descent and how the learning rate controls each step "
+    "of optimisation we then look at regularisation overfitting and validation data "
+    "before an example that trains a small neural network on images"
+).split()
+
+app = FastAPI()
+settings = {
+    "first_token_ms": 400.0,
+    "token_interval_ms": 20.0,
+    "embedding_ms": 0.0,
+    "transcription_ms": 200.0,
+    "transcription_rtf": 0.0,
+    "audio_kbps": 32.0,
+    "words_per_second": 2.5,
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+}
+stats = defaultdict(lambda: {"requests": 0, "errors": 0, "rate_limited": 0})
+stats_lock = threading.Lock()
+failure_rng = random.Random(0)
+
+
+def injected_failure(endpoint: str):
+    """Count the request and, per the configured rates, return a 429/500 response."""
+    with stats_lock:
+        stats[endpoint]["requests"] += 1
+        roll = failure_rng.random()
+        if roll < settings["rate_limit_rate"]:
+            stats[endpoint]["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+        if roll < settings["rate_limit_rate"] + settings["error_rate"]:
+            stats[endpoint]["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Internal error (fake)", "type": "server_error", "code": None}},
+                status_code=500,
+            )
+    return None
+
+
+def fake_embedding(text: str) -> list:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def chunk_payload(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    return json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    })
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    failure = injected_failure("transcriptions")
+    if failure is not None:
+        return failure
+    form = await request.form()
+    audio = await form["file"].read()
+    duration = len(audio) * 8 / (settings["audio_kbps"] * 1000)
+    await asyncio.sleep((settings["transcription_ms"] + settings["transcription_rtf"] * duration * 1000) / 1000)
+
+    count = int(duration * settings["words_per_second"])
+    rng = random.Random(hashlib.sha256(audio[:65536]).digest())
+    step = 1.0 / settings["words_per_second"]
+    words = [
+        {"word": rng.choice(TRANSCRIPT_VOCABULARY), "start": round(i * step, 3), "end": round(i * step + step * 0.8, 3)}
+        for i in range(count)
+    ]
+    return {
+        "task": "transcribe",
+        "language": "english",
+        "duration": duration,
+        "text": " ".join(w["word"] for w in words),
+        "words": words,
+        "segments": [],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    failure = injected_failure("chat")
+    if failure is not None:
+        return failure
+    body = await request.json()
+    model = body.get("model", "gpt-4o-mini")
+    completion_id = f"chatcmpl-{time.time_ns()}"
+
+    if not body.get("stream"):
+        await asyncio.sleep((settings["first_token_ms"] + settings["token_interval_ms"] * len(ANSWER_WORDS)) / 1000)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(ANSWER_WORDS)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(ANSWER_WORDS), "total_tokens": len(ANSWER_WORDS)},
+        }
+
+    async def events():
+        await asyncio.sleep(settings["first_token_ms"] / 1000)
+        yield f"data: {chunk_payload(completion_id, model, {'role': 'assistant', 'content': ''})}\n\n"
+        for i, word in enumerate(ANSWER_WORDS):
+            if i:
+                await asyncio.sleep(settings["token_interval_ms"] / 1000)
+            content = word if i == 0 else f" {word}"
+            yield f"data: {chunk_payload(completion_id, model, {'content': content})}\n\n"
+        yield f"data: {chunk_payload(completion_id, model, {}, 'stop')}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    failure = injected_failure("embeddings")
+    if failure is not None:
+        return failure
+    body = await request.json()
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    if settings["embedding_ms"]:
+        await asyncio.sleep(settings["embedding_ms"] / 1000)
+    # langchain sends token ids when tiktoken is available; hash them as text
+    data = [
+        {"object": "embedding", "index": i, "embedding": fake_embedding(json.dumps(text))}
+        for i, text in enumerate(inputs)
+    ]
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "text-embedding-3-small"),
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    with stats_lock:
+        return {"settings": settings, "endpoints": {name: dict(counts) for name, counts in stats.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--first-token-ms", type=float, default=400.0)
+    parser.add_argument("--token-interval-ms", type=float, default=20.0)
+    parser.add_argument("--embedding-ms", type=float, default=0.0)
+    parser.add_argument("--transcription-ms", type=float, default=200.0)
+    parser.add_argument("--transcription-rtf", type=float, default=0.0,
+                        help="Extra transcription latency as a fraction of the audio duration")
+    parser.add_argument("--audio-kbps", type=float, default=32.0, help="Bitrate used to estimate audio duration")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for injected failures")
+    args = parser.parse_args()
+    settings.update(
+        first_token_ms=args.first_token_ms,
+        token_interval_ms=args.token_interval_ms,
+        embedding_ms=args.embedding_ms,
+        transcription_ms=args.transcription_ms,
+        transcription_rtf=args.transcription_rtf,
+        audio_kbps=args.audio_kbps,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+    failure_rng.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
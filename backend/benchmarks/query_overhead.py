@@ -0,0 +1,82 @@
+"""
+Microbenchmark: per-query client setup in rag_query, before and after the
+process-wide registry.
+
+"before" rebuilds what rag_query used to build on every call (Chroma client
+and collection, OpenAIEmbeddings, ChatPromptTemplate, ChatOpenAI). "after"
+goes through rag_registry. No network calls are made; a throwaway Chroma
+directory is used.
+
+Usage (from the backend/ directory):
+    python benchmarks/query_overhead.py --iterations 200
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from common import percentile
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+
+def time_calls(fn, iterations: int) -> dict:
+    fn()  # warm up imports and lazy singletons
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="query_overhead_")
+    os.chdir(work_dir)
+    try:
+        from langchain_chroma import Chroma
+        from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+        from langchain.prompts import ChatPromptTemplate
+        import rag_registry
+        import rag_query
+
+        collection = "lecture_benchmark"
+
+        def before():
+            Chroma(
+                collection_name=collection,
+                embedding_function=OpenAIEmbeddings(model="text-embedding-3-small"),
+                persist_directory=rag_registry.CHROMA_PATH
+            )
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", "You are a helpful lecture assistant."),
+                ("human", "Context:\n{context}\n\nQuestion: {question}")
+            ])
+            prompt | ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
+
+        def after():
+            rag_registry.get_vectorstore("benchmark.mp4", collection)
+            rag_query.PROMPT | rag_registry.get_llm()
+
+        print(json.dumps({
+            "iterations": args.iterations,
+            "before": time_calls(before, args.iterations),
+            "after": time_calls(after, args.iterations),
+        }, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
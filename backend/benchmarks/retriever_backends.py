@@ -0,0 +1,159 @@
+"""
+Query latency, memory and recall of the retriever backends: Chroma (HNSW)
+vs the in-process flat index in float32, float16 and int8.
+
+Creates --lectures synthetic collections of --chunks vectors each in a
+throwaway Chroma directory (no API calls). For each backend it loads every
+lecture, runs --queries top-k searches spread across them, and reports
+p50/p99 latency, the RSS growth from loading, and recall@k against exact
+float32 search. Backends run in separate processes so RSS numbers don't mix.
+
+Usage (from the backend/ directory):
+    python benchmarks/retriever_backends.py --lectures 20 --chunks 400
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import BACKEND_DIR, percentile
+
+BACKENDS = ("chroma", "float32", "float16", "int8")
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def query_vectors(args, rng) -> tuple:
+    """Noisy copies of stored vectors, so every query has real neighbours."""
+    lectures = rng.integers(0, args.lectures, size=args.queries)
+    rows = rng.integers(0, args.chunks, size=args.queries)
+    return lectures, rows
+
+
+def lecture_vectors(args, lecture: int) -> np.ndarray:
+    vectors = np.random.default_rng(lecture).standard_normal((args.chunks, args.dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(args):
+    import chromadb
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    for lecture in range(args.lectures):
+        collection = client.get_or_create_collection(f"lecture_bench_{lecture}")
+        vectors = lecture_vectors(args, lecture)
+        ids = [f"{lecture}-{i}" for i in range(args.chunks)]
+        for start in range(0, args.chunks, 1000):
+            end = start + 1000
+            collection.add(
+                ids=ids[start:end],
+                embeddings=vectors[start:end],
+                documents=[f"chunk {i} of lecture {lecture}" for i in range(start, min(end, args.chunks))],
+                metadatas=[{"chunk_index": i} for i in range(start, min(end, args.chunks))],
+            )
+
+
+def run_backend(args):
+    """Runs in a child process; prints one JSON line."""
+    os.chdir(os.path.dirname(args.chroma_path))
+    import flat_index
+    import rag_registry
+    from langchain_chroma import Chroma
+
+    rng = np.random.default_rng(12345)
+    lectures, rows = query_vectors(args, rng)
+    queries = []
+    for lecture, row in zip(lectures, rows):
+        vector = lecture_vectors(args, lecture)[row] + rng.standard_normal(args.dim).astype(np.float32) * 0.02
+        queries.append((int(lecture), vector.tolist()))
+
+    client = rag_registry.get_chroma_client()
+    before = rss_bytes()
+    retrievers = {}
+    start = time.perf_counter()
+    for lecture in range(args.lectures):
+        name = f"lecture_bench_{lecture}"
+        if args.backend == "chroma":
+            store = Chroma(client=client, collection_name=name)
+            store.similarity_search_by_vector_with_relevance_scores(queries[0][1], k=args.k)  # load HNSW
+        else:
+            store = flat_index.FlatIndex.from_collection(client.get_collection(name), args.backend)
+        retrievers[lecture] = store
+    load_seconds = time.perf_counter() - start
+    loaded = rss_bytes() - before
+
+    samples, results = [], []
+    for lecture, vector in queries:
+        start = time.perf_counter()
+        hits = retrievers[lecture].similarity_search_by_vector_with_relevance_scores(vector, k=args.k)
+        samples.append(time.perf_counter() - start)
+        results.append([doc.id for doc, _ in hits])
+    ordered = sorted(samples)
+    print(json.dumps({
+        "backend": args.backend,
+        "load_seconds": round(load_seconds, 3),
+        "rss_growth_mb": round(loaded / 2**20, 1),
+        "vector_mb": round(sum(r.nbytes for r in retrievers.values()) / 2**20, 1) if args.backend != "chroma" else None,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "results": results,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lectures", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=400, help="Vectors per lecture")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--backend", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--chroma-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        run_backend(args)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="retriever_backends_")
+    args.chroma_path = os.path.join(work_dir, "chroma_db")
+    try:
+        build(args)
+        reports = {}
+        for backend in BACKENDS:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--backend", backend, "--chroma-path", args.chroma_path]
+                + [f"--{name}={getattr(args, name)}" for name in ("lectures", "chunks", "dim", "queries", "k")],
+                check=True, capture_output=True, text=True, cwd=BACKEND_DIR,
+            ).stdout
+            reports[backend] = json.loads(output.strip().splitlines()[-1])
+
+        exact = reports["float32"]["results"]
+        for report in reports.values():
+            hits = sum(len(set(r) & set(e)) for r, e in zip(report.pop("results"), exact))
+            report["recall_at_k_vs_exact"] = round(hits / (len(exact) * args.k), 4)
+        print(json.dumps({
+            "lectures": args.lectures,
+            "chunks_per_lecture": args.chunks,
+            "dim": args.dim,
+            "queries": args.queries,
+            "k": args.k,
+            "backends": reports,
+        }, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
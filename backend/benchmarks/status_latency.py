@@ -0,0 +1,88 @@
+"""
+Load test: /processing-status latency while a long lecture is ingesting.
+
+Uploads a video (or a synthetic one generated with ffmpeg), then hammers
+/processing-status from several threads until the job finishes or the time
+limit is hit, and prints latency percentiles as JSON.
+
+Usage (backend running on :8000, from the backend/ directory):
+    python benchmarks/status_latency.py --minutes 60 --concurrency 8
+    python benchmarks/status_latency.py --video uploads/lecture.mp4
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+from common import generate_lecture_video, percentile, upload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--video", help="Existing video to upload (default: generate one)")
+    parser.add_argument("--minutes", type=int, default=60, help="Length of the generated video")
+    parser.add_argument("--concurrency", type=int, default=8, help="Polling threads")
+    parser.add_argument("--max-seconds", type=float, default=300, help="Stop polling after this long")
+    args = parser.parse_args()
+
+    video_path = args.video
+    if video_path is None:
+        video_path = os.path.join(tempfile.mkdtemp(), "loadtest_lecture.mp4")
+        generate_lecture_video(video_path, args.minutes * 60)
+
+    uploaded = upload(args.base_url, video_path)
+    job_filename = uploaded["filename"]
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    stop = threading.Event()
+    status_url = f"{args.base_url}/processing-status"
+
+    def poll():
+        nonlocal errors
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(status_url, timeout=60) as response:
+                    data = json.loads(response.read())
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                job = next((j for j in data["jobs"] if j["filename"] == job_filename), None)
+                if job and job["status"] in ("done", "error"):
+                    stop.set()
+            except Exception:
+                with lock:
+                    errors += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=poll, daemon=True) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    stop.wait(args.max_seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ordered = sorted(latencies)
+    print(json.dumps({
+        "job": job_filename,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "requests": len(ordered),
+        "errors": errors,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 2),
+            "p95": round(percentile(ordered, 95) * 1000, 2),
+            "p99": round(percentile(ordered, 99) * 1000, 2),
+            "max": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Time to first byte: /rag-query (whole answer) vs /rag-query/stream (SSE).
+
+Each question is sent once per endpoint with a unique suffix so the answer
+cache never short-circuits the LLM call. For the streaming endpoint both the
+first event (timestamps) and the first answer token are reported.
+
+Run against the fake OpenAI server so numbers are repeatable:
+    python benchmarks/fake_openai.py --port 8010 --first-token-ms 400 &
+    OPENAI_BASE_URL=http://localhost:8010/v1 OPENAI_API_KEY=sk-fake uvicorn main:app --port 8000 &
+    python benchmarks/stream_ttfb.py --video-id lecture.mp4 --requests 20
+"""
+import argparse
+import json
+import time
+import urllib.request
+import uuid
+
+from common import percentile
+
+
+def post(url: str, payload: dict):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    return urllib.request.urlopen(request, timeout=120)
+
+
+def time_blocking(base_url: str, payload: dict) -> dict:
+    start = time.perf_counter()
+    with post(f"{base_url}/rag-query", payload) as response:
+        response.read(1)
+        first_byte = time.perf_counter() - start
+        response.read()
+    return {"first_byte": first_byte, "first_token": first_byte, "total": time.perf_counter() - start}
+
+
+def time_streaming(base_url: str, payload: dict) -> dict:
+    start = time.perf_counter()
+    first_byte = first_token = None
+    with post(f"{base_url}/rag-query/stream", payload) as response:
+        for line in response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            if first_token is None and line.startswith(b"event: token"):
+                first_token = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return {"first_byte": first_byte or total, "first_token": first_token or total, "total": total}
+
+
+def summarize(samples: list) -> dict:
+    summary = {}
+    for field in ("first_byte", "first_token", "total"):
+        ordered = sorted(s[field] for s in samples)
+        summary[field] = {
+            "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--video-id", required=True, help="Filename of a processed lecture")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--question", default="What is the main topic of this lecture?")
+    args = parser.parse_args()
+
+    blocking, streaming = [], []
+    for _ in range(args.requests):
+        suffix = uuid.uuid4().hex[:8]
+        blocking.append(time_blocking(args.base_url, {"video_id": args.video_id, "query": f"{args.question} ({suffix}a)"}))
+        streaming.append(time_streaming(args.base_url, {"video_id": args.video_id, "query": f"{args.question} ({suffix}b)"}))
+
+    print(json.dumps({
+        "requests": args.requests,
+        "rag_query": summarize(blocking),
+        "rag_query_stream": summarize(streaming),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Real-time factor (processing seconds / audio seconds) of the transcription
+backends on the same audio.
+
+Extracts speech audio from a video (or a generated synthetic lecture) with
+the pipeline's own ffmpeg settings, then transcribes it once per backend.
+The openai backend needs OPENAI_API_KEY (or OPENAI_BASE_URL pointing at a
+compatible server); faster-whisper needs `pip install faster-whisper`.
+Unavailable backends are reported as skipped.
+
+Usage (from the backend/ directory):
+    python benchmarks/transcription_rtf.py --video uploads/lecture.mp4 --backends faster-whisper fake
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from common import generate_lecture_video
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Lecture video to transcribe (default: generate one)")
+    parser.add_argument("--minutes", type=int, default=5, help="Length of the generated video")
+    parser.add_argument("--backends", nargs="+", default=["faster-whisper", "fake"],
+                        choices=["openai", "faster-whisper", "fake"])
+    args = parser.parse_args()
+
+    import transcription
+    from audio_processing import UNSEGMENTED_SECONDS, extract_audio_segments
+
+    work_dir = tempfile.mkdtemp(prefix="transcription_rtf_")
+    try:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(work_dir, "lecture.mp4")
+            generate_lecture_video(video_path, args.minutes * 60)
+        # One segment per backend call, as for engines without a size limit
+        segments = extract_audio_segments(video_path, os.path.join(work_dir, "audio"), UNSEGMENTED_SECONDS)
+        audio_path = segments[0][0]
+
+        results = {}
+        for name in args.backends:
+            try:
+                backend = transcription.TRANSCRIBERS[name]()
+                start = time.perf_counter()
+                result = backend.transcribe(audio_path)
+                elapsed = time.perf_counter() - start
+                results[name] = {
+                    "audio_seconds": round(result.duration, 2),
+                    "seconds": round(elapsed, 3),
+                    "real_time_factor": round(elapsed / result.duration, 4) if result.duration else None,
+                    "words": len(result.timeline),
+                }
+            except Exception as e:
+                results[name] = {"skipped": f"{type(e).__name__}: {e}"}
+
+        print(json.dumps({
+            "audio_bytes": os.path.getsize(audio_path),
+            "cpu_count": os.cpu_count(),
+            "results": results,
+        }, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import math
+import threading
+from typing import List, Optional
+from langchain_core.documents import Document
+from metrics import CONTEXT_TOKENS
+
+# Prompt context assembly. Retrieved chunks are admitted in relevance order
+# while the packed context fits CONTEXT_TOKEN_BUDGET tokens, then put back in
+# lecture order. Neighbouring chunks are merged into one span, so the
+# CHUNK_OVERLAP characters they share are sent once. The budget freed by
+# merging admits further chunks.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+# Retrieved chunks considered for the context, best first
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "8"))
+# Hits farther than this (squared L2) are never used
+CONTEXT_MAX_DISTANCE = 2.0
+SEPARATOR = "\n---\n"
+
+_encoding_lock = threading.Lock()
+_encoding = None
+_encoding_loaded = False
+
+
+def get_encoding():
+    """The LLM's tiktoken encoding, or None if it can't be loaded (e.g. offline without a cache)."""
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            from rag_registry import LLM_MODEL
+            try:
+                import tiktoken
+                _encoding = tiktoken.encoding_for_model(LLM_MODEL)
+            except Exception as e:
+                print(f"Tokenizer for {LLM_MODEL} unavailable, estimating tokens from length: {e}")
+            _encoding_loaded = True
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        # ~4 characters per token for English text
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def text_overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is a prefix of right, at word boundaries."""
+    # The overlap starts with right's first word: only try where that word occurs
+    first_word = right.split(None, 1)[0] if right.strip() else ""
+    if not first_word or not right.startswith(first_word):
+        return 0
+    position = left.find(first_word, max(0, len(left) - len(right)))
+    while position != -1:
+        length = len(left) - position
+        if (right.startswith(left[position:])
+                and (position == 0 or left[position - 1].isspace())
+                and (length == len(right) or right[length].isspace())):
+            return length
+        position = left.find(first_word, position + 1)
+    return 0
+
+
+def merge_chunks(docs: List[Document]) -> List[dict]:
+    """
+    Merge chunks into spans in lecture order. A chunk that follows the
+    previous one (next chunk_index, or starts before it ends) is appended
+    without the text they share; text already in a span is dropped.
+    """
+    def position(doc):
+        metadata = doc.metadata
+        return (metadata.get("video_id", ""), metadata.get("chunk_index", 0), metadata.get("start_time", 0.0))
+
+    spans = []
+    for doc in sorted(docs, key=position):
+        metadata = doc.metadata
+        text = doc.page_content
+        previous = spans[-1] if spans else None
+        if previous is not None and previous["video_id"] == metadata.get("video_id", ""):
+            follows = (
+                metadata.get("chunk_index") is not None
+                and metadata.get("chunk_index") == previous["last_chunk"] + 1
+            ) or metadata.get("start_time", math.inf) <= previous["end_time"]
+            if text in previous["text"]:
+                continue
+            overlap = text_overlap(previous["text"], text) if follows else 0
+            if follows:
+                previous["text"] += text[overlap:] if overlap else " " + text
+                previous["end_time"] = max(previous["end_time"], metadata.get("end_time", previous["end_time"]))
+                previous["last_chunk"] = metadata.get("chunk_index", previous["last_chunk"])
+                previous["chunks"] += 1
+                continue
+        spans.append({
+            "video_id": metadata.get("video_id", ""),
+            "text": text,
+            "start_time": metadata.get("start_time"),
+            "end_time": metadata.get("end_time", metadata.get("start_time")),
+            "timestamp": metadata.get("timestamp"),
+            "last_chunk": metadata.get("chunk_index", -1),
+            "chunks": 1,
+        })
+    return spans
+
+
+def render(spans: List[dict]) -> str:
+    return SEPARATOR.join(span["text"] for span in spans)
+
+
+def pack_context(docs_scores, budget: int = CONTEXT_TOKEN_BUDGET,
+                 max_chunks: int = CONTEXT_MAX_CHUNKS) -> Optional[tuple]:
+    """
+    Build the prompt context from (Document, distance) hits, nearest first.
+    Returns (context, spans, stats), or None if no hit is close enough.
+    stats compares the packed context with joining the same chunks unmerged
+    ("truncated" if the best hit alone had to be cut to fit the budget).
+    """
+    candidates = [doc for doc, score in docs_scores if score <= CONTEXT_MAX_DISTANCE][:max_chunks]
+    if not candidates:
+        return None
+    selected, spans, context, tokens = [], [], "", 0
+    truncated = False
+    for doc in candidates:
+        trial_spans = merge_chunks(selected + [doc])
+        trial_context = render(trial_spans)
+        trial_tokens = count_tokens(trial_context)
+        if trial_tokens <= budget:
+            selected, spans, context, tokens = selected + [doc], trial_spans, trial_context, trial_tokens
+    if not selected:
+        # Even the best hit is over budget on its own: send its beginning
+        doc = candidates[0]
+        selected = [doc]
+        spans = merge_chunks(selected)
+        spans[0]["text"] = truncate_to_tokens(spans[0]["text"], budget)
+        context = render(spans)
+        tokens = count_tokens(context)
+        truncated = True
+    unmerged_tokens = count_tokens(SEPARATOR.join(doc.page_content for doc in selected))
+    stats = {
+        "tokens": tokens,
+        "unmerged_tokens": unmerged_tokens,
+        "tokens_saved": unmerged_tokens - tokens,
+        "budget": budget,
+        "chunks": len(selected),
+        "spans": len(spans),
+        "truncated": truncated,
+        "tokenizer": get_encoding().name if get_encoding() is not None else "estimate",
+    }
+    CONTEXT_TOKENS.labels("packed").inc(tokens)
+    CONTEXT_TOKENS.labels("saved").inc(max(0, stats["tokens_saved"]))
+    return context, spans, stats
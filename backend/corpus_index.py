@@ -0,0 +1,140 @@
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from flat_index import FlatIndex
+import window_index
+
+# Cross-lecture search (/search) over one in-process routing index, whatever
+# RETRIEVER_BACKEND is. Each queryable lecture contributes its routing rows:
+# the coarsest time-window level when it has window levels, otherwise its
+# chunks (short lectures). The rows of all lectures are stacked into a single
+# matrix, so a query scores every lecture with one matrix product instead of
+# one search per lecture, then descends only into the best windows. Per-query
+# work grows with the number of coarse windows and short-lecture chunks, not
+# with the total number of chunks.
+
+
+class CorpusIndex:
+    """Routing rows of every lecture stacked into one FlatIndex, restacked lazily after a lecture changes."""
+
+    def __init__(self):
+        self._parts: Dict[str, FlatIndex] = {}  # collection_name -> its routing rows
+        self._stacked = None  # (collection names, FlatIndex, window row mask)
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.stacks = 0
+
+    @staticmethod
+    def _load(collection_name: str) -> FlatIndex:
+        from rag_registry import open_collection
+        levels = window_index.load_levels(collection_name)
+        if levels:
+            return levels[0][1]
+        return FlatIndex.from_collection(open_collection(collection_name))
+
+    def _index(self, collection_names: List[str], executor=None) -> tuple:
+        """(names, stacked FlatIndex, window row mask, {collection_name: error}) for collection_names."""
+        with self._lock:
+            missing = [name for name in collection_names if name not in self._parts]
+
+        def load(name):
+            try:
+                return self._load(name)
+            except Exception as e:
+                return e
+
+        loaded = list(executor.map(load, missing) if executor is not None else map(load, missing))
+        errors = {name: str(part) for name, part in zip(missing, loaded) if isinstance(part, Exception)}
+        with self._lock:
+            for name, part in zip(missing, loaded):
+                if not isinstance(part, Exception):
+                    self._parts[name] = part
+                    self.loads += 1
+            names = tuple(name for name in collection_names if name in self._parts)
+            if self._stacked is None or self._stacked[0] != names:
+                self._stacked = (names, *self._stack(names))
+                self.stacks += 1
+            return (*self._stacked, errors)
+
+    def _stack(self, names: tuple) -> tuple:
+        parts = [(name, self._parts[name]) for name in names if len(self._parts[name])]
+        if not parts:
+            return FlatIndex([], [], [], np.zeros((0, 0), dtype=np.float32)), np.zeros(0, dtype=bool)
+        ids, documents, metadatas = [], [], []
+        for name, part in parts:
+            ids.extend(part.ids)
+            documents.extend(part.documents)
+            metadatas.extend({**metadata, "collection": name} for metadata in part.metadatas)
+        vectors = np.concatenate([part._dequantized() for _, part in parts])
+        windows = np.array(["level" in metadata for metadata in metadatas], dtype=bool)
+        return FlatIndex(ids, documents, metadatas, vectors), windows
+
+    def search(self, collection_names: List[str], query_embedding, k: int,
+               wanted: Optional[List[str]] = None, executor=None) -> tuple:
+        """
+        Global top-k chunks over collection_names (only those in wanted, when
+        given) as [(collection_name, Document, distance)], nearest first, plus
+        {collection_name: error} for lectures that could not be loaded.
+        """
+        from rag_registry import get_flat_index
+        _, index, windows, errors = self._index(collection_names, executor)
+        if not len(index):
+            return [], errors
+        if wanted is None:
+            rows = np.arange(len(index))
+        else:
+            groups = index.rows_by("collection")
+            rows = np.array(sorted(row for name in wanted for row in groups.get(name, ())), dtype=np.int64)
+        if not len(rows):
+            return [], errors
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        distances = index._distances(query, rows)[0]
+
+        def nearest(mask, n):
+            candidates = np.flatnonzero(mask)
+            if n < len(candidates):
+                candidates = candidates[np.argpartition(distances[candidates], n - 1)[:n]]
+            return candidates[np.argsort(distances[candidates], kind="stable")]
+
+        is_window = windows[rows]
+        hits = [
+            (index.metadatas[rows[i]]["collection"], index._document(int(rows[i])), float(distances[i]))
+            for i in nearest(~is_window, k)
+        ]
+        # Descend into the best coarse windows of the corpus, per lecture
+        top_windows = {}
+        for i in nearest(is_window, max(window_index.WINDOW_BEAM, k)):
+            top_windows.setdefault(index.metadatas[rows[i]]["collection"], []).append(
+                (index._document(int(rows[i])), float(distances[i]))
+            )
+        for name, lecture_windows in top_windows.items():
+            try:
+                found = window_index.search(name, get_flat_index(name), query_embedding, k, lecture_windows)
+            except Exception as e:
+                errors[name] = str(e)
+                continue
+            hits.extend((name, doc, score) for doc, score in found or ())
+        hits.sort(key=lambda hit: hit[2])
+        return hits[:k], errors
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        with self._lock:
+            if collection_name is None:
+                self._parts.clear()
+                self._stacked = None
+            elif self._parts.pop(collection_name, None) is not None:
+                self._stacked = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            index = self._stacked[1] if self._stacked is not None else None
+            return {
+                "lectures": len(self._parts),
+                "rows": len(index) if index is not None else 0,
+                "bytes": index.nbytes if index is not None else 0,
+                "loads": self.loads,
+                "stacks": self.stacks,
+            }
+
+
+corpus = CorpusIndex()
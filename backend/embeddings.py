@@ -0,0 +1,283 @@
+import os
+import time
+import asyncio
+import atexit
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+# Embedding model plus an on-disk cache keyed by (model, sha256(text)), shared
+# by ingest (vector_pipeline) and queries (rag_query). Re-embedding unchanged
+# chunks or repeated questions is served from disk instead of the API.
+EMBEDDING_MODEL = "text-embedding-3-small"
+# "openai" (EMBEDDING_MODEL over the API) or "local" (sentence-transformers on CPU)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+# Optional ONNX Runtime inference, e.g. onnx/model_qint8_avx2.onnx for int8 weights
+LOCAL_EMBEDDING_ONNX_FILE = os.getenv("LOCAL_EMBEDDING_ONNX_FILE", "")
+# Worker processes for large ingest batches (0 = encode in-process)
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "0"))
+# Cache misses are embedded and stored in batches of this many texts, so an
+# interrupted ingest keeps the vectors of the batches that finished
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+# Least recently used entries are evicted above this many bytes of vectors
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+class EmbeddingCache:
+    """SQLite-backed vector cache with LRU eviction and hit/miss counters."""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+            """
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, keys: List[str]) -> dict:
+        """Return {key: vector} for cached keys and refresh their LRU position."""
+        found = {}
+        conn = self._connection()
+        unique_keys = list(dict.fromkeys(keys))
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(unique_keys), 500):
+            batch = unique_keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            for key, blob in conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ):
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        if found:
+            now = time.time()
+            conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+        hits = sum(1 for key in keys if key in found)
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: dict):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)", rows
+        )
+        self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM embeddings ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+        with self._stats_lock:
+            self.evictions += len(stale)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM embeddings")
+
+    def stats(self) -> dict:
+        conn = self._connection()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the underlying model."""
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        # Embed each distinct missing text once, caching batch by batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), EMBEDDING_BATCH_SIZE):
+            batch = missing_keys[i:i + EMBEDDING_BATCH_SIZE]
+            vectors = self.underlying.embed_documents([missing[key] for key in batch])
+            fresh = dict(zip(batch, vectors))
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(self.model_name, text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        vector = self.underlying.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Cache I/O is local SQLite; only the model call is awaited natively
+        key = self.cache.make_key(self.model_name, text)
+        cached = await asyncio.to_thread(self.cache.get_many, [key])
+        if key in cached:
+            return cached[key]
+        vector = await self.underlying.aembed_query(text)
+        await asyncio.to_thread(self.cache.put_many, {key: vector})
+        return vector
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    sentence-transformers model on CPU. Vectors are L2-normalized like
+    OpenAI's, so Chroma's score threshold keeps the same meaning. The model
+    (and the optional process pool) are loaded on first use.
+    """
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+                 onnx_file: str = LOCAL_EMBEDDING_ONNX_FILE, workers: int = LOCAL_EMBEDDING_WORKERS):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.onnx_file = onnx_file
+        self.workers = workers
+        self._model = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                if self.onnx_file:
+                    self._model = SentenceTransformer(
+                        self.model_name, device="cpu", backend="onnx",
+                        model_kwargs={"file_name": self.onnx_file}
+                    )
+                else:
+                    self._model = SentenceTransformer(self.model_name, device="cpu")
+            return self._model
+
+    def _encode(self, texts: List[str], pool=None) -> List[List[float]]:
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            pool=pool
+        )
+        return np.asarray(vectors, dtype=np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # A process pool only pays off once there are several batches to split
+        if self.workers > 1 and len(texts) >= 2 * self.batch_size:
+            model = self.model
+            with self._lock:
+                if self._pool is None:
+                    self._pool = model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+                    atexit.register(self.close)
+            return self._encode(texts, pool=self._pool)
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                from sentence_transformers import SentenceTransformer
+                SentenceTransformer.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+
+def embedding_model_id() -> str:
+    """
+    Identifies the configured embedding model. It is part of every cache key
+    and is recorded on each Chroma collection, so vectors from different
+    models are never mixed.
+    """
+    if EMBEDDING_BACKEND == "local":
+        model_id = f"local:{LOCAL_EMBEDDING_MODEL}"
+        # Quantized ONNX weights produce (slightly) different vectors
+        return f"{model_id}#{LOCAL_EMBEDDING_ONNX_FILE}" if LOCAL_EMBEDDING_ONNX_FILE else model_id
+    if EMBEDDING_BACKEND != "openai":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+    return EMBEDDING_MODEL
+
+
+_embeddings: Optional[CachedEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """Process-wide cached embedding function used for ingest and queries."""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            if EMBEDDING_BACKEND == "local":
+                underlying = LocalEmbeddings()
+            else:
+                underlying = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+            _embeddings = CachedEmbeddings(underlying, embedding_model_id(), EmbeddingCache())
+        return _embeddings
+
+
+def embedding_cache_stats() -> dict:
+    return get_embeddings().cache.stats()
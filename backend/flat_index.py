@@ -0,0 +1,204 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+# Exact in-process retrieval for per-lecture collections. A lecture has a few
+# hundred chunks, so one matrix-vector product over all of them is cheaper
+# than Chroma's HNSW lookup plus SQLite round-trips. Chroma stays the store of
+# record; a FlatIndex is a read-only copy of one collection loaded on demand.
+FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "float32")  # float32 | float16 | int8
+FLAT_INDEX_MAX_BYTES = int(os.getenv("FLAT_INDEX_MAX_BYTES", str(256 * 1024 * 1024)))
+FLAT_INDEX_DTYPES = ("float32", "float16", "int8")
+# Vectors fetched from Chroma per get() call while loading an index
+FLAT_INDEX_PAGE_SIZE = 256
+
+
+class FlatIndex:
+    """
+    One collection's vectors as a contiguous (n, dim) matrix plus parallel
+    id/text/metadata arrays. Scores are squared L2 distances, the same as
+    Chroma's default space, so callers can keep their score thresholds.
+    """
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[dict],
+                 embeddings: np.ndarray, dtype: str = FLAT_INDEX_DTYPE):
+        if dtype not in FLAT_INDEX_DTYPES:
+            raise ValueError(f"Unsupported flat index dtype: {dtype}")
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            vectors = vectors.reshape(len(ids), -1)
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.dtype = dtype
+        self.scales = None
+        if dtype == "int8":
+            # Symmetric per-row quantization: row ~= matrix[row] * scales[row]
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.matrix = np.round(vectors / scales[:, None]).astype(np.int8)
+            self.scales = scales.astype(np.float32)
+        else:
+            self.matrix = vectors.astype(dtype)
+        # Squared norms of the stored (possibly quantized) rows, for L2 distances
+        self.row_norms = np.square(self._dequantized()).sum(axis=1).astype(np.float32)
+        # metadata key -> {value: [row, ...]}, built on first use by rows_by
+        self._groups = {}
+
+    @classmethod
+    def from_collection(cls, collection, dtype: str = FLAT_INDEX_DTYPE) -> "FlatIndex":
+        """Load every vector of a chromadb collection, a page at a time."""
+        total = collection.count()
+        ids, documents, metadatas = [], [], []
+        embeddings = None
+        for offset in range(0, total, FLAT_INDEX_PAGE_SIZE):
+            page = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=FLAT_INDEX_PAGE_SIZE,
+                offset=offset
+            )
+            vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            if embeddings is None:
+                # Fill one preallocated matrix instead of holding every page's copy
+                embeddings = np.empty((total, vectors.shape[1]), dtype=np.float32)
+            embeddings[len(ids):len(ids) + len(vectors)] = vectors
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(m or {} for m in page["metadatas"])
+        if embeddings is None:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        return cls(ids, documents, metadatas, embeddings[:len(ids)], dtype)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        # Vector payload only; texts and metadata are small next to 1536-d rows
+        return self.matrix.nbytes + self.row_norms.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def _dequantized(self) -> np.ndarray:
+        if self.scales is not None:
+            return self.matrix.astype(np.float32) * self.scales[:, None]
+        return self.matrix.astype(np.float32, copy=False)
+
+    def _distances(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """(n_queries, n_rows) squared L2 distances, to every row or only to rows."""
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        # Compact dtypes save resident memory; NumPy only has BLAS kernels for
+        # float32/float64, so they are widened for the duration of the product
+        matrix = matrix.astype(np.float32, copy=False)
+        dots = queries @ matrix.T
+        if self.scales is not None:
+            dots *= (self.scales if rows is None else self.scales[rows])[None, :]
+        row_norms = self.row_norms if rows is None else self.row_norms[rows]
+        query_norms = np.square(queries).sum(axis=1)
+        return np.maximum(query_norms[:, None] + row_norms[None, :] - 2.0 * dots, 0.0)
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self.documents[row], metadata=self.metadatas[row], id=self.ids[row])
+
+    def search_many(self, embeddings: List[List[float]], k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """Top-k (Document, distance) per query embedding, nearest first."""
+        if not len(self) or not len(embeddings):
+            return [[] for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        distances = self._distances(queries)
+        k = min(k, len(self))
+        # argpartition finds the k nearest in O(n); only those k get sorted
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(distances, nearest):
+            ordered = candidates[np.argsort(row[candidates], kind="stable")]
+            results.append([(self._document(i), float(row[i])) for i in ordered])
+        return results
+
+    def search_rows(self, embedding: List[float], rows, k: int = 4) -> List[Tuple[Document, float]]:
+        """Top-k (Document, distance) among the given rows only; cost grows with len(rows), not the index."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return []
+        query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        distances = self._distances(query, rows)[0]
+        k = min(k, len(rows))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        ordered = nearest[np.argsort(distances[nearest], kind="stable")]
+        return [(self._document(int(rows[i])), float(distances[i])) for i in ordered]
+
+    def rows_for_ids(self, ids: List[str]) -> List[int]:
+        """Rows of the given IDs; unknown IDs are skipped."""
+        row_of = self._groups.get(None)
+        if row_of is None:
+            row_of = self._groups[None] = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        return [row_of[doc_id] for doc_id in ids if doc_id in row_of]
+
+    def rows_by(self, key: str) -> dict:
+        """{metadata[key]: [row, ...]} for selecting rows by a metadata field."""
+        groups = self._groups.get(key)
+        if groups is None:
+            groups = {}
+            for row, metadata in enumerate(self.metadatas):
+                groups.setdefault(metadata.get(key), []).append(row)
+            self._groups[key] = groups
+        return groups
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4):
+        """Same call and result shape as langchain's Chroma, for a single query."""
+        return self.search_many([embedding], k)[0]
+
+
+class FlatIndexCache:
+    """LRU of loaded indexes, evicting least recently used ones over a byte budget."""
+
+    def __init__(self, max_bytes: int = FLAT_INDEX_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self._indexes: "OrderedDict[str, FlatIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, collection_name: str, loader) -> FlatIndex:
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is not None:
+                self._indexes.move_to_end(collection_name)
+                return index
+        index = loader()
+        with self._lock:
+            self.loads += 1
+            if collection_name in self._indexes:
+                self.bytes -= self._indexes.pop(collection_name).nbytes
+            self._indexes[collection_name] = index
+            self.bytes += index.nbytes
+            # Always keep the index just loaded, even if it alone exceeds the budget
+            while self.bytes > self.max_bytes and len(self._indexes) > 1:
+                _, evicted = self._indexes.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+        return index
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        with self._lock:
+            if collection_name is None:
+                self._indexes.clear()
+                self.bytes = 0
+                return
+            index = self._indexes.pop(collection_name, None)
+            if index is not None:
+                self.bytes -= index.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "dtype": FLAT_INDEX_DTYPE,
+                "indexes": len(self._indexes),
+                "vectors": sum(len(index) for index in self._indexes.values()),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
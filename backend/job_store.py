@@ -0,0 +1,577 @@
+import os
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, List, Optional, Union
+
+# SQLite job store. Replaces the whole-file read-modify-write of db.json with
+# indexed point reads/updates that are safe across threads and uvicorn workers.
+DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+LEGACY_DB_PATH = "db.json"
+
+JOB_FIELDS = [
+    "filename",
+    "status",
+    "progress",
+    "error",
+    "audio_path",
+    "transcript_path",
+    "transcript_metadata",
+    "content_hash",
+    "alias_of",
+    "stage_timings",
+    "priority",
+    "queued_at",
+    "claimed_by",
+    "heartbeat_at",
+    "coverage",
+]
+# Columns stored as JSON text and decoded on read
+JSON_FIELDS = {"transcript_metadata", "stage_timings", "coverage"}
+# Lectures that can be queried: finished, or still processing with some chunks indexed
+QUERYABLE_STATUSES = ("done", "partially_available")
+# A worker owns jobs in these states
+RUNNING_STATUSES = ("processing", "partially_available")
+# Jobs that will still write a lecture's artifacts: at most one original per content_hash
+ACTIVE_STATUSES = ("queued",) + RUNNING_STATUSES
+
+_local = threading.local()
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection, opening it in WAL mode on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # isolation_level=None -> autocommit; explicit BEGIN where needed
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Run a block inside BEGIN IMMEDIATE ... COMMIT, rolling back on error."""
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    job = {}
+    for field in JOB_FIELDS:
+        value = row[field]
+        if field in JSON_FIELDS and value is not None:
+            value = json.loads(value)
+        job[field] = value
+    return job
+
+
+def _encode(field: str, value):
+    if field in JSON_FIELDS and value is not None:
+        return json.dumps(value)
+    return value
+
+
+# --- SCHEMA & MIGRATION ---
+def init_db():
+    """Create tables/indexes and import db.json once if it exists."""
+    conn = get_connection()
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS processing_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            audio_path TEXT,
+            transcript_path TEXT,
+            transcript_metadata TEXT,
+            content_hash TEXT,
+            alias_of TEXT,
+            stage_timings TEXT,
+            priority INTEGER NOT NULL DEFAULT 0,
+            queued_at TEXT,
+            claimed_by TEXT,
+            heartbeat_at TEXT,
+            coverage TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS uploads (
+            upload_id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            total_size INTEGER,
+            received INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            artifact_key TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS collection_versions (
+            collection_name TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        """
+    )
+    # Columns added after the first release of the store
+    _ensure_columns(conn, "processing_jobs", {
+        "content_hash": "TEXT",
+        "alias_of": "TEXT",
+        "stage_timings": "TEXT",
+        "priority": "INTEGER NOT NULL DEFAULT 0",
+        "queued_at": "TEXT",
+        "claimed_by": "TEXT",
+        "heartbeat_at": "TEXT",
+        "coverage": "TEXT",
+    })
+    conn.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON processing_jobs(status, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_content_hash ON processing_jobs(content_hash);
+        CREATE INDEX IF NOT EXISTS idx_jobs_alias_of ON processing_jobs(alias_of);
+        CREATE INDEX IF NOT EXISTS idx_jobs_queue ON processing_jobs(status, priority DESC, queued_at, id);
+        """
+    )
+    migrate_legacy_db()
+
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: dict):
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def migrate_legacy_db(legacy_path: str = LEGACY_DB_PATH):
+    """One-time import of jobs and sessions from the old db.json file."""
+    conn = get_connection()
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+        return
+    if not os.path.exists(legacy_path):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_migrated', ?)", (_now(),))
+        return
+    try:
+        with open(legacy_path, "r") as dbf:
+            legacy = json.load(dbf)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Skipping db.json migration: {e}")
+        return
+
+    with transaction() as conn:
+        # Re-check inside the write lock so concurrent workers migrate once
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+            return
+        now = _now()
+        for job in legacy.get("processing_jobs", []):
+            if not job.get("filename"):
+                continue
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO processing_jobs
+                    (filename, status, progress, error, audio_path, transcript_path,
+                     transcript_metadata, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job["filename"],
+                    job.get("status", "queued"),
+                    job.get("progress", 0),
+                    job.get("error"),
+                    job.get("audio_path"),
+                    job.get("transcript_path"),
+                    _encode("transcript_metadata", job.get("transcript_metadata")),
+                    now,
+                    now,
+                ),
+            )
+        for session in legacy.get("sessions", []):
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, filename, created_at) VALUES (?, ?, ?)",
+                (session["session_id"], session["filename"], session.get("created_at", now)),
+            )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_migrated', ?)", (now,))
+    print(f"Migrated {len(legacy.get('processing_jobs', []))} jobs from {legacy_path}")
+
+
+# --- PROCESSING JOBS ---
+def add_job(filename: str, content_hash: Optional[str] = None, priority: int = 0) -> dict:
+    """Insert a queued job, resetting any previous record for the same file."""
+    now = _now()
+    get_connection().execute(
+        """
+        INSERT INTO processing_jobs (filename, status, progress, content_hash, priority, queued_at, created_at, updated_at)
+        VALUES (?, 'queued', 0, ?, ?, ?, ?, ?)
+        ON CONFLICT(filename) DO UPDATE SET
+            status = 'queued', progress = 0, error = NULL, stage_timings = NULL, coverage = NULL,
+            content_hash = COALESCE(excluded.content_hash, content_hash),
+            priority = excluded.priority, queued_at = excluded.queued_at,
+            claimed_by = NULL, heartbeat_at = NULL,
+            updated_at = excluded.updated_at
+        """,
+        (filename, content_hash, priority, now, now, now),
+    )
+    return get_job(filename)
+
+
+def add_job_unless_active(filename: str, content_hash: str, priority: int = 0) -> Optional[dict]:
+    """
+    add_job, unless another original job for the same content is queued or
+    running: two jobs would share segment files, checkpoint and collection.
+    Returns None in that case, without queuing anything.
+    """
+    with transaction():
+        if find_active_job_by_hash(content_hash, exclude=filename) is not None:
+            return None
+        return add_job(filename, content_hash=content_hash, priority=priority)
+
+
+def add_alias(filename: str, canonical: dict) -> dict:
+    """Record filename as another name for an already uploaded lecture."""
+    now = _now()
+    get_connection().execute(
+        """
+        INSERT OR REPLACE INTO processing_jobs
+            (filename, status, progress, error, audio_path, transcript_path,
+             transcript_metadata, coverage, content_hash, alias_of, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            filename,
+            canonical["status"],
+            canonical["progress"],
+            canonical["error"],
+            canonical["audio_path"],
+            canonical["transcript_path"],
+            _encode("transcript_metadata", canonical["transcript_metadata"]),
+            _encode("coverage", canonical["coverage"]),
+            canonical["content_hash"],
+            canonical["filename"],
+            now,
+            now,
+        ),
+    )
+    return get_job(filename)
+
+
+def find_job_by_hash(content_hash: str) -> Optional[dict]:
+    """Most recent non-failed original (non-alias) job for this content."""
+    row = get_connection().execute(
+        """
+        SELECT * FROM processing_jobs
+        WHERE content_hash = ? AND alias_of IS NULL AND status != 'error'
+        ORDER BY id DESC LIMIT 1
+        """,
+        (content_hash,),
+    ).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def find_active_job_by_hash(content_hash: str, exclude: Optional[str] = None) -> Optional[dict]:
+    """The original job currently queued or running for this content, other than exclude."""
+    row = get_connection().execute(
+        f"""
+        SELECT * FROM processing_jobs
+        WHERE content_hash = ? AND alias_of IS NULL AND filename != ?
+            AND status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})
+        ORDER BY id DESC LIMIT 1
+        """,
+        (content_hash, exclude or "", *ACTIVE_STATUSES),
+    ).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def update_job(filename: str, **fields):
+    """Point update of the given fields on a job and any aliases of it."""
+    unknown = set(fields) - set(JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+    if not fields:
+        return
+    assignments = ", ".join(f"{field} = ?" for field in fields)
+    values = [_encode(field, value) for field, value in fields.items()]
+    get_connection().execute(
+        f"UPDATE processing_jobs SET {assignments}, updated_at = ? WHERE filename = ? OR alias_of = ?",
+        (*values, _now(), filename, filename),
+    )
+
+
+def get_job(filename: str) -> Optional[dict]:
+    row = get_connection().execute(
+        "SELECT * FROM processing_jobs WHERE filename = ?", (filename,)
+    ).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(status: Union[str, Iterable[str], None] = None) -> List[dict]:
+    """List jobs in insertion order, optionally filtered by one or more statuses (indexed)."""
+    conn = get_connection()
+    if status is None:
+        rows = conn.execute("SELECT * FROM processing_jobs ORDER BY id").fetchall()
+    else:
+        statuses = [status] if isinstance(status, str) else list(status)
+        placeholders = ",".join("?" * len(statuses))
+        rows = conn.execute(
+            f"SELECT * FROM processing_jobs WHERE status IN ({placeholders}) ORDER BY id", statuses
+        ).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+
+def delete_job(filename: str):
+    get_connection().execute("DELETE FROM processing_jobs WHERE filename = ?", (filename,))
+
+
+# --- QUEUE ---
+# Queued originals (aliases follow their original) run highest priority first,
+# then in the order they were queued. Claims are atomic, so several worker
+# processes can share one queue.
+QUEUE_ORDER = "priority DESC, queued_at, id"
+
+
+def claim_next_job(worker_id: str) -> Optional[dict]:
+    """Move the next queued job to 'processing', owned by worker_id; None if the queue is empty."""
+    with transaction() as conn:
+        row = conn.execute(
+            f"SELECT * FROM processing_jobs WHERE status = 'queued' AND alias_of IS NULL ORDER BY {QUEUE_ORDER} LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        now = _now()
+        conn.execute(
+            """
+            UPDATE processing_jobs SET status = 'processing', claimed_by = ?, heartbeat_at = ?, updated_at = ?
+            WHERE filename = ? OR alias_of = ?
+            """,
+            (worker_id, now, now, row["filename"], row["filename"]),
+        )
+    return get_job(row["filename"])
+
+
+def requeue_job(filename: str, claimed_by: Optional[str]) -> bool:
+    """
+    Put a running job back in the queue, keeping its priority and place.
+    Only applies while the job is still owned by claimed_by, so a job that
+    another worker has since reclaimed is left alone.
+    """
+    with transaction() as conn:
+        updated = conn.execute(
+            """
+            UPDATE processing_jobs SET status = 'queued', progress = 0, claimed_by = NULL, heartbeat_at = NULL, updated_at = ?
+            WHERE filename = ? AND status IN (?, ?) AND claimed_by IS ?
+            """,
+            (_now(), filename, *RUNNING_STATUSES, claimed_by),
+        ).rowcount
+        if updated:
+            conn.execute(
+                "UPDATE processing_jobs SET status = 'queued', progress = 0, updated_at = ? WHERE alias_of = ?",
+                (_now(), filename),
+            )
+    return bool(updated)
+
+
+def heartbeat_jobs(filenames: List[str]):
+    """Mark running jobs as alive; jobs without recent heartbeats can be recovered."""
+    if not filenames:
+        return
+    placeholders = ",".join("?" * len(filenames))
+    get_connection().execute(
+        f"UPDATE processing_jobs SET heartbeat_at = ? WHERE filename IN ({placeholders})",
+        (_now(), *filenames),
+    )
+
+
+def retry_job(filename: str) -> bool:
+    """
+    Queue a failed job again, at the back of its priority level. Refused
+    (False) unless it failed, or while another job for the same content
+    (e.g. a later re-upload) is queued or running.
+    """
+    now = _now()
+    with transaction() as conn:
+        job = get_job(filename)
+        if job is None or (job["content_hash"] and find_active_job_by_hash(job["content_hash"], exclude=filename)):
+            return False
+        updated = conn.execute(
+            """
+            UPDATE processing_jobs SET status = 'queued', progress = 0, error = NULL,
+                claimed_by = NULL, heartbeat_at = NULL, queued_at = ?, updated_at = ?
+            WHERE filename = ? AND status = 'error' AND alias_of IS NULL
+            """,
+            (now, now, filename),
+        ).rowcount
+        if updated:
+            conn.execute(
+                "UPDATE processing_jobs SET status = 'queued', progress = 0, error = NULL, updated_at = ? WHERE alias_of = ?",
+                (now, filename),
+            )
+    return bool(updated)
+
+
+def list_queued() -> List[dict]:
+    """Queued jobs in the order they will run."""
+    rows = get_connection().execute(
+        f"SELECT * FROM processing_jobs WHERE status = 'queued' AND alias_of IS NULL ORDER BY {QUEUE_ORDER}"
+    ).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+
+def queue_depth() -> int:
+    return get_connection().execute(
+        "SELECT COUNT(*) FROM processing_jobs WHERE status = 'queued' AND alias_of IS NULL"
+    ).fetchone()[0]
+
+
+def queue_position(filename: str) -> Optional[int]:
+    """1-based position of a queued job (1 runs next), or None if it is not queued."""
+    job = get_job(filename)
+    if job is None or job["status"] != "queued" or job["alias_of"]:
+        return None
+    ahead = get_connection().execute(
+        """
+        SELECT COUNT(*) FROM processing_jobs AS q JOIN processing_jobs AS j ON j.filename = ?
+        WHERE q.status = 'queued' AND q.alias_of IS NULL AND q.id != j.id
+          AND (q.priority > j.priority OR (q.priority = j.priority AND (
+               COALESCE(q.queued_at, '') < COALESCE(j.queued_at, '')
+               OR (COALESCE(q.queued_at, '') = COALESCE(j.queued_at, '') AND q.id < j.id))))
+        """,
+        (filename,),
+    ).fetchone()[0]
+    return ahead + 1
+
+
+# --- CHECKPOINTS ---
+# Progress of unfinished ingestion, keyed by artifact key (content hash), so
+# a retry or a re-upload of the same recording resumes where it stopped.
+def get_checkpoint(artifact_key: str) -> dict:
+    row = get_connection().execute(
+        "SELECT data FROM checkpoints WHERE artifact_key = ?", (artifact_key,)
+    ).fetchone()
+    return json.loads(row["data"]) if row else {}
+
+
+def save_checkpoint(artifact_key: str, data: dict):
+    get_connection().execute(
+        "INSERT OR REPLACE INTO checkpoints (artifact_key, data, updated_at) VALUES (?, ?, ?)",
+        (artifact_key, json.dumps(data), _now()),
+    )
+
+
+def delete_checkpoint(artifact_key: str):
+    get_connection().execute("DELETE FROM checkpoints WHERE artifact_key = ?", (artifact_key,))
+
+
+# --- COLLECTION VERSIONS ---
+# A new random version is written each time a lecture's collection is
+# (re)indexed. Every process compares it with the version it last saw before
+# using cached results, so caches in other uvicorn workers don't outlive a
+# reindex. Random rather than counted, so versions never repeat after a clear.
+def bump_collection_version(collection_name: str) -> str:
+    version = uuid.uuid4().hex
+    get_connection().execute(
+        "INSERT OR REPLACE INTO collection_versions (collection_name, version, updated_at) VALUES (?, ?, ?)",
+        (collection_name, version, _now()),
+    )
+    return version
+
+
+def get_collection_versions(collection_names: Iterable[str]) -> dict:
+    """{collection_name: version} for the given collections that have been indexed."""
+    names = list(collection_names)
+    versions = {}
+    # Stay well below SQLite's bound-parameter limit
+    for start in range(0, len(names), 500):
+        batch = names[start:start + 500]
+        rows = get_connection().execute(
+            f"SELECT collection_name, version FROM collection_versions "
+            f"WHERE collection_name IN ({', '.join('?' for _ in batch)})",
+            batch,
+        ).fetchall()
+        versions.update((row["collection_name"], row["version"]) for row in rows)
+    return versions
+
+
+# --- SESSIONS ---
+def add_session(session: dict):
+    get_connection().execute(
+        "INSERT INTO sessions (session_id, filename, created_at) VALUES (?, ?, ?)",
+        (session["session_id"], session["filename"], session["created_at"]),
+    )
+
+
+def clear_sessions():
+    get_connection().execute("DELETE FROM sessions")
+
+
+def list_sessions() -> List[dict]:
+    rows = get_connection().execute(
+        "SELECT session_id, filename, created_at FROM sessions ORDER BY rowid"
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# --- RESUMABLE UPLOADS ---
+def create_upload(upload_id: str, filename: str, total_size: Optional[int] = None) -> dict:
+    now = _now()
+    get_connection().execute(
+        "INSERT INTO uploads (upload_id, filename, total_size, received, created_at, updated_at) VALUES (?, ?, ?, 0, ?, ?)",
+        (upload_id, filename, total_size, now, now),
+    )
+    return get_upload(upload_id)
+
+
+def get_upload(upload_id: str) -> Optional[dict]:
+    row = get_connection().execute(
+        "SELECT upload_id, filename, total_size, received, created_at FROM uploads WHERE upload_id = ?",
+        (upload_id,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def set_upload_received(upload_id: str, received: int):
+    get_connection().execute(
+        "UPDATE uploads SET received = ?, updated_at = ? WHERE upload_id = ?",
+        (received, _now(), upload_id),
+    )
+
+
+def delete_upload(upload_id: str):
+    get_connection().execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+
+def clear_all():
+    """Remove all jobs, checkpoints, sessions, pending uploads and collection versions (used by /clear-data)."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM processing_jobs")
+        conn.execute("DELETE FROM checkpoints")
+        conn.execute("DELETE FROM sessions")
+        conn.execute("DELETE FROM uploads")
+        conn.execute("DELETE FROM collection_versions")
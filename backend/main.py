@@ -1,22 +1,34 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 import os
 import asyncio
 import json
-from typing import List
-import ffmpeg
-from openai import OpenAI
+from typing import List, Optional
 import os
 from dotenv import load_dotenv
-import math
+import time
+import hashlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi.websockets import WebSocket
+from audio_processing import extract_audio_segments, media_duration, segment_seconds
+from transcription import Transcription, get_transcriber
+from word_timeline import concat_timelines, load_timeline, save_timeline, timeline_path
+from metrics import API_RETRIES, BYTES_PROCESSED, JOBS_FINISHED, JOBS_IN_FLIGHT, STAGE_SECONDS, StageTimings, render_metrics
+from scheduler import Scheduler
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Requeues jobs interrupted by a restart, then starts the ingest workers
+    await scheduler.start()
+    yield
+    await scheduler.stop()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+app = FastAPI(lifespan=lifespan)
 
 # Allow CORS for frontend dev
 app.add_middleware(
@@ -27,41 +39,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory job queue and WebSocket manager
-job_queue = []
-websockets: List[WebSocket] = []
+# Bounded pool shared by all jobs for parallel chunk transcription
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+transcription_executor = ThreadPoolExecutor(max_workers=TRANSCRIBE_CONCURRENCY, thread_name_prefix="transcribe")
+
+# Index segmented lectures while they are transcribed, so they can be queried
+# ("partially_available") before processing finishes
+INCREMENTAL_INDEXING = os.getenv("INCREMENTAL_INDEXING", "true").lower() == "true"
+
 
 # Pydantic models
 class RAGQuery(BaseModel):
     video_id: str
     query: str
 
+class RAGBatchQuery(BaseModel):
+    video_id: str
+    queries: List[str]
+
+class LectureSearch(BaseModel):
+    query: str
+    video_ids: Optional[List[str]] = None  # None searches every completed lecture
+    k: int = 10
+
+class UploadInit(BaseModel):
+    filename: str
+    total_size: Optional[int] = None
+
 # --- DATABASE INITIALIZATION ---
-def init_db():
-    db_path = "db.json"
-    if not os.path.exists(db_path):
-        with open(db_path, "w") as dbf:
-            json.dump({
-                "lectures": [],
-                "processing_jobs": [],
-                "sessions": []
-            }, dbf, indent=2)
-    else:
-        # Ensure all required keys exist
-        with open(db_path, "r+") as dbf:
-            db = json.load(dbf)
-            if "lectures" not in db:
-                db["lectures"] = []
-            if "processing_jobs" not in db:
-                db["processing_jobs"] = []
-            if "sessions" not in db:
-                db["sessions"] = []
-            dbf.seek(0)
-            json.dump(db, dbf, indent=2)
-            dbf.truncate()
+# Jobs and sessions live in a SQLite store (jobs.db); db.json is imported once.
+import job_store
+import progress_hub
 
 # Initialize database on startup
-init_db()
+job_store.init_db()
 
 # --- SESSION MANAGEMENT ---
 # Each session is a dict: {"session_id": str, "filename": str, "created_at": str, ...}
@@ -75,370 +86,408 @@ def create_session(filename: str) -> dict:
         "filename": filename,
         "created_at": datetime.utcnow().isoformat() + "Z"
     }
-    db_path = "db.json"
-    with open(db_path, "r+") as dbf:
-        db = json.load(dbf)
-        if "sessions" not in db:
-            db["sessions"] = []
-        db["sessions"].append(session)
-        dbf.seek(0)
-        json.dump(db, dbf, indent=2)
-        dbf.truncate()
+    job_store.add_session(session)
     return session
 
 def cleanup_sessions():
-    db_path = "db.json"
-    with open(db_path, "r+") as dbf:
-        db = json.load(dbf)
-        db["sessions"] = []
-        dbf.seek(0)
-        json.dump(db, dbf, indent=2)
-        dbf.truncate()
+    job_store.clear_sessions()
 
 def get_sessions():
-    db_path = "db.json"
-    with open(db_path, "r") as dbf:
-        db = json.load(dbf)
-        return db.get("sessions", [])
-
-async def notify_progress(filename: str, progress: int, step: str = None):
-    job_id = filename
-    for ws in websockets:
+    return job_store.list_sessions()
+
+def mark_job_error(filename: str, error_msg: str):
+    job_store.update_job(filename, status="error", progress=0, error=error_msg)
+    notify_progress(filename, 0, step="error", status="error", error=error_msg)
+
+def notify_progress(filename: str, progress: int, step: str = None, **fields):
+    """Publish a job update to its /ws subscribers; never waits on them."""
+    progress_hub.hub.publish(filename, progress=progress, step=step, **fields)
+
+def chunk_base_name(transcript_path: str, chunk_number: int) -> str:
+    """Base name of a chunk's transcript artifacts (text and word timeline)."""
+    return f"{os.path.splitext(transcript_path)[0]}_chunk_{chunk_number:03d}"
+
+def transcribe_chunk(chunk_path: str, chunk_number: int, chunk_start_offset: float, transcript_path: str, max_retries: int = 3) -> Transcription:
+    """
+    Transcribe one audio chunk (blocking; run on transcription_executor).
+    Word timestamps are rebased by chunk_start_offset and saved to the
+    chunk's word timeline, and the text next to it, so a resumed job can
+    reuse the chunk. Retries independently of the other chunks.
+    """
+    for attempt in range(max_retries):
         try:
-            await ws.send_json({"filename": job_id, "progress": progress, "step": step})
-        except Exception:
-            pass
+            started = time.perf_counter()
+            result = get_transcriber().transcribe(chunk_path)
+            STAGE_SECONDS.labels("ingest", "transcribe_chunk").observe(time.perf_counter() - started)
+            # Store word timestamps for this chunk, rebased to the full video
+            chunk_base = chunk_base_name(transcript_path, chunk_number)
+            if len(result.timeline):
+                save_timeline(timeline_path(chunk_base), result.shifted(chunk_start_offset))
+            write_text_file(f"{chunk_base}.txt", result.text)
+            return result
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise RuntimeError(f"Transcription failed for chunk {chunk_number+1}: {str(e)}") from e
+            API_RETRIES.labels("pipeline", "transcribe_chunk").inc()
+            time.sleep(2)
+
+def write_text_file(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as tf:
+        tf.write(text)
 
-async def chunk_audio_file(audio_path: str, chunk_duration: int = 600) -> List[str]:
+def read_text_file(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as tf:
+        return tf.read()
+
+def transcribe_single_file(audio_path: str, transcript_path: str) -> Transcription:
+    """Transcribe a whole audio file in one call to the transcription backend (blocking)."""
+    result = get_transcriber().transcribe(audio_path)
+    # Store word timestamps
+    if len(result.timeline):
+        save_timeline(timeline_path(os.path.splitext(transcript_path)[0]), result.timeline)
+    return result
+
+def record_transcription_stats(filename: str, audio_seconds: float, elapsed: float) -> dict:
+    """Log and return the real-time factor (processing time / audio duration) of a job's transcription."""
+    stats = {
+        "transcription_backend": get_transcriber().name,
+        "audio_seconds": round(audio_seconds, 3),
+        "transcription_seconds": round(elapsed, 3),
+        "real_time_factor": round(elapsed / audio_seconds, 4) if audio_seconds else None
+    }
+    print(f"Transcribed {filename} with {stats['transcription_backend']}: "
+          f"{stats['audio_seconds']}s audio in {stats['transcription_seconds']}s (RTF {stats['real_time_factor']})")
+    return stats
+
+def combine_chunk_timestamps(transcript_path: str, total_chunks: int):
+    """Merge per-chunk word timelines into the lecture's timeline (blocking)."""
+    base_name = os.path.splitext(transcript_path)[0]
+    timelines = []
+    for i in range(total_chunks):
+        chunk_timeline_path = timeline_path(chunk_base_name(transcript_path, i))
+        if os.path.exists(chunk_timeline_path):
+            try:
+                timelines.append(load_timeline(chunk_timeline_path))
+            except Exception as e:
+                print(f"Error reading word timeline {chunk_timeline_path}: {e}")
+    
+    # Save combined timeline
+    combined = concat_timelines(timelines)
+    if len(combined):
+        save_timeline(timeline_path(base_name), combined)
+        print(f"Combined word timeline saved with {len(combined)} words")
+
+def load_chunk_timeline(transcript_path: str, chunk_number: int):
+    """A chunk's word timeline, or None if it had no words."""
+    path = timeline_path(chunk_base_name(transcript_path, chunk_number))
+    return load_timeline(path) if os.path.exists(path) else None
+
+def index_transcribed_prefix(indexer, transcript_chunks: list, transcript_path: str, final: bool, timings: StageTimings):
     """
-    Split audio file into chunks of specified duration (in seconds).
-    Default is 10 minutes (600 seconds) to stay well under 25MB limit.
+    Index the chunks transcribed so far, up to the first one still missing
+    (blocking). Returns the indexer's new state, or None if nothing new was
+    transcribed since the last pass.
     """
-    try:
-        # Get audio duration
-        probe = ffmpeg.probe(audio_path)
-        duration = float(probe['format']['duration'])
-        
-        # Calculate number of chunks needed
-        num_chunks = math.ceil(duration / chunk_duration)
-        
-        chunk_paths = []
-        base_name = os.path.splitext(audio_path)[0]
-        
-        for i in range(num_chunks):
-            start_time = i * chunk_duration
-            chunk_path = f"{base_name}_chunk_{i:03d}.mp3"
-            
-            # Create audio chunk
-            (
-                ffmpeg
-                .input(audio_path, ss=start_time, t=chunk_duration)
-                .output(chunk_path, acodec='mp3')
-                .overwrite_output()
-                .run(quiet=True)
-            )
-            
-            chunk_paths.append(chunk_path)
-        
-        return chunk_paths
-        
-    except Exception as e:
-        print(f"Error chunking audio: {e}")
-        return []
+    prefix = 0
+    while prefix < len(transcript_chunks) and transcript_chunks[prefix] is not None:
+        prefix += 1
+    if not final and prefix <= indexer.state["segments"]:
+        return None
+    timelines = [load_chunk_timeline(transcript_path, i) for i in range(prefix)]
+    return indexer.index(transcript_chunks[:prefix], timelines, final=final, timings=timings)
 
-async def process_job(filename: str):
-    db_path = "db.json"
-    video_path = os.path.join("uploads", filename)
-    audio_path = os.path.join("uploads", f"{os.path.splitext(filename)[0]}.mp3")
-    status = {
-        "filename": filename,
-        "status": "queued",
-        "progress": 0,
-        "error": None,
-        "audio_path": None
+def coverage_of(state: dict, total_segments: int, complete: bool = False) -> dict:
+    """The part of a lecture that can be queried, from an incremental indexer's state."""
+    return {
+        "start": 0.0,
+        "end": round(state["covered_until"], 3),
+        "chunks": state["next_chunk_index"],
+        "segments_indexed": state["segments"],
+        "segments_total": total_segments,
+        "complete": complete
     }
-    # Add job to db.json
+
+def checkpoint_summary(checkpoint: dict) -> dict:
+    """What a retry of the job would skip."""
+    segments = checkpoint.get("segments")
+    return {
+        "audio_extracted": segments is not None,
+        "chunks_total": len(segments) if segments is not None else None,
+        "chunks_transcribed": len(checkpoint.get("chunks", {})),
+        "transcribed": "transcript" in checkpoint,
+        "indexed": checkpoint.get("indexed", False),
+        "segments_indexed": checkpoint.get("incremental", {}).get("segments", 0)
+    }
+
+async def process_job(filename: str):
+    """Run a processing job, recording its stage timings on the job record."""
+    timings = StageTimings("ingest")
+    JOBS_IN_FLIGHT.inc()
     try:
-        with open(db_path, "r+") as dbf:
-            db = json.load(dbf)
-            db["processing_jobs"].append(status)
-            dbf.seek(0)
-            json.dump(db, dbf, indent=2)
-            dbf.truncate()
+        with timings.span("total"):
+            await run_job(filename, timings)
+    finally:
+        JOBS_IN_FLIGHT.dec()
+        job = job_store.get_job(filename)
+        if job is not None:
+            job_store.update_job(filename, stage_timings=timings.stages)
+            JOBS_FINISHED.labels(job["status"]).inc()
+
+# Queued jobs are run by INGEST_WORKERS workers; see scheduler.py
+scheduler = Scheduler(process_job)
+
+async def run_job(filename: str, timings: StageTimings):
+    """
+    Extract, transcribe and index one lecture. Each finished unit (the
+    extracted segments, every transcribed chunk, the combined transcript,
+    the vector index) is checkpointed under the artifact key, so a retry or
+    restart resumes from the first unfinished unit.
+    """
+    from vector_pipeline import IncrementalIndexer, artifact_key, process_transcript
+    # Jobs are normally created by start_processing; add one if missing
+    try:
+        job = job_store.get_job(filename) or job_store.add_job(filename)
     except Exception as e:
-        await notify_progress(filename, 0)
+        notify_progress(filename, 0)
         return
+    content_hash = job["content_hash"]
+    # Audio and transcripts are stored under the content hash so that
+    # re-uploads of the same recording can reuse them
+    key = artifact_key(filename, content_hash)
+    video_path = os.path.join("uploads", filename)
+    audio_path = os.path.join("uploads", f"{key}.mp3")
+    transcript_path = os.path.join("uploads", f"{key}.transcript.txt")
+    # Segments are split to fit the backend's request size limit, and kept
+    # short enough for incremental indexing to make progress visible when
+    # the lecture does not fit one request anyway
+    duration = await asyncio.to_thread(media_duration, video_path) if INCREMENTAL_INDEXING else None
+    chunk_seconds = segment_seconds(get_transcriber().max_file_bytes, INCREMENTAL_INDEXING, duration)
+    checkpoint = job_store.get_checkpoint(key)
+    if checkpoint and checkpoint.get("segment_seconds") != chunk_seconds:
+        # Cut points changed (e.g. another transcription backend): earlier chunks don't line up
+        checkpoint = {}
+    if checkpoint:
+        print(f"Resuming {filename} from checkpoint: {checkpoint_summary(checkpoint)}")
+
+    def save_checkpoint(**fields):
+        checkpoint.update(fields)
+        job_store.save_checkpoint(key, checkpoint)
+
+    def chunk_done(i: int) -> bool:
+        return str(i) in checkpoint.get("chunks", {}) and os.path.exists(f"{chunk_base_name(transcript_path, i)}.txt")
+
     try:
-        await notify_progress(filename, 5, step="uploading")
+        notify_progress(filename, 5, step="uploading")
         # Update status to processing
-        with open(db_path, "r+") as dbf:
-            db = json.load(dbf)
-            for job in db["processing_jobs"]:
-                if job["filename"] == filename:
-                    job["status"] = "processing"
-                    job["progress"] = 5
-            dbf.seek(0)
-            json.dump(db, dbf, indent=2)
-            dbf.truncate()
-        # Audio extraction
-        await notify_progress(filename, 10, step="extracting_audio")
-        try:
-            (
-                ffmpeg
-                .input(video_path)
-                .output(audio_path, acodec='mp3', vn=None)
-                .overwrite_output()
-                .run(quiet=True)
-            )
-            await notify_progress(filename, 30, step="audio_extracted")
-        except Exception as e:
-            # Error during extraction
-            error_msg = f"Audio extraction failed: {str(e)}"
-            with open(db_path, "r+") as dbf:
-                db = json.load(dbf)
-                for job in db["processing_jobs"]:
-                    if job["filename"] == filename:
-                        job["status"] = "error"
-                        job["progress"] = 0
-                        job["error"] = error_msg
-                dbf.seek(0)
-                json.dump(db, dbf, indent=2)
-                dbf.truncate()
-            await notify_progress(filename, 0)
-            return
-        
-        # Check audio file size and chunk if necessary
-        audio_size = os.path.getsize(audio_path)
-        max_size = 24 * 1024 * 1024  # 24MB to be safe (OpenAI limit is 25MB)
+        job_store.update_job(filename, status="processing", progress=5)
+        notify_progress(filename, 5, status="processing")
+        transcribed = "transcript" in checkpoint and os.path.exists(transcript_path)
+
+        segments = checkpoint.get("segments")
+        # Extraction is skipped if every segment still to be transcribed is on disk
+        if not transcribed and (segments is None or not all(
+            os.path.exists(segment_path) for i, (segment_path, _) in enumerate(segments) if not chunk_done(i)
+        )):
+            # Audio extraction and segmentation in a single ffmpeg pass
+            notify_progress(filename, 10, step="extracting_audio")
+            try:
+                with timings.span("audio_extraction"):
+                    segments = await asyncio.to_thread(
+                        extract_audio_segments,
+                        video_path,
+                        os.path.join("uploads", key),
+                        chunk_seconds
+                    )
+                BYTES_PROCESSED.labels("audio").inc(sum(os.path.getsize(path) for path, _ in segments))
+                notify_progress(filename, 30, step="audio_extracted")
+            except Exception as e:
+                # Error during extraction
+                error_msg = f"Audio extraction failed: {str(e)}"
+                mark_job_error(filename, error_msg)
+                notify_progress(filename, 0)
+                return
+            if not segments:
+                mark_job_error(filename, "Audio extraction produced no audio")
+                notify_progress(filename, 0)
+                return
+            if len(segments) == 1:
+                # Whole lecture fits in one transcription request
+                await asyncio.to_thread(os.replace, segments[0][0], audio_path)
+                segments = [(audio_path, segments[0][1])]
+            save_checkpoint(segment_seconds=chunk_seconds, segments=segments)
         
         transcript = ""
-        transcript_path = os.path.join("uploads", f"{os.path.splitext(filename)[0]}.transcript.txt")
+        transcription_started = time.perf_counter()
+        audio_seconds = 0.0
+        indexer = None
         
-        if audio_size > max_size:
-            await notify_progress(filename, 35, step="chunking_large_audio")
-            # Split large audio file into chunks
-            chunk_duration = 600  # 10 minutes per chunk
-            chunk_paths = await chunk_audio_file(audio_path, chunk_duration)
-            
-            if not chunk_paths:
-                error_msg = "Failed to chunk large audio file"
-                with open(db_path, "r+") as dbf:
-                    db = json.load(dbf)
-                    for job in db["processing_jobs"]:
-                        if job["filename"] == filename:
-                            job["status"] = "error"
-                            job["progress"] = 0
-                            job["error"] = error_msg
-                    dbf.seek(0)
-                    json.dump(db, dbf, indent=2)
-                    dbf.truncate()
-                await notify_progress(filename, 0)
-                return
+        if transcribed:
+            transcript = await asyncio.to_thread(read_text_file, transcript_path)
+            transcription_stats = checkpoint["transcript"]
+        elif len(segments) > 1:
+            notify_progress(filename, 35, step="chunking_large_audio")
+            chunk_paths = [segment_path for segment_path, _ in segments]
             
-            # Process each chunk
-            transcript_chunks = []
+            # Transcribe chunks in parallel on the bounded pool; each chunk
+            # retries on its own and results are reassembled by chunk index.
             total_chunks = len(chunk_paths)
-            
-            for i, chunk_path in enumerate(chunk_paths):
-                max_retries = 3
-                chunk_transcript = None
-                
-                for attempt in range(max_retries):
-                    try:
-                        progress = 40 + (i * 20) // total_chunks  # Progress from 40% to 60%
-                        await notify_progress(filename, progress, step=f"transcribing_chunk_{i+1}_of_{total_chunks}")
-                        
-                        with open(chunk_path, "rb") as audio_file:
-                            whisper_response = client.audio.transcriptions.create(
-                                model="whisper-1",
-                                file=audio_file,
-                                response_format="verbose_json",
-                                timestamp_granularities=["word"]
-                            )
-                        chunk_transcript = whisper_response.text
-                        
-                        # Store detailed transcript with timestamps for this chunk
-                        chunk_number = i
-                        chunk_start_offset = i * chunk_duration  # Offset for this chunk in the full video
-                        detailed_transcript_path = f"{os.path.splitext(transcript_path)[0]}_chunk_{chunk_number:03d}_detailed.json"
-                        
-                        # Process words and add global timestamps
-                        if hasattr(whisper_response, 'words') and whisper_response.words:
-                            words_with_global_timestamps = []
-                            for word in whisper_response.words:
-                                word_dict = {
-                                    "word": word.word,
-                                    "start": word.start + chunk_start_offset,  # Add chunk offset
-                                    "end": word.end + chunk_start_offset
-                                }
-                                words_with_global_timestamps.append(word_dict)
-                            
-                            # Save detailed transcript for this chunk
-                            detailed_data = {
-                                "text": chunk_transcript,
-                                "words": words_with_global_timestamps,
-                                "chunk_number": chunk_number,
-                                "chunk_start_offset": chunk_start_offset
-                            }
-                            
-                            with open(detailed_transcript_path, "w", encoding="utf-8") as f:
-                                json.dump(detailed_data, f, indent=2)
-                        
-                        break
-                    except Exception as e:
-                        if attempt == max_retries - 1:
-                            error_msg = f"Transcription failed for chunk {i+1}: {str(e)}"
-                            with open(db_path, "r+") as dbf:
-                                db = json.load(dbf)
-                                for job in db["processing_jobs"]:
-                                    if job["filename"] == filename:
-                                        job["status"] = "error"
-                                        job["progress"] = 0
-                                        job["error"] = error_msg
-                                dbf.seek(0)
-                                json.dump(db, dbf, indent=2)
-                                dbf.truncate()
-                            await notify_progress(filename, 0)
-                            # Clean up chunk files
-                            for chunk_file in chunk_paths:
-                                try:
-                                    os.remove(chunk_file)
-                                except:
-                                    pass
-                            return
-                        await asyncio.sleep(2)
-                
-                if chunk_transcript:
-                    transcript_chunks.append(chunk_transcript)
-                
+            transcript_chunks = [None] * total_chunks
+            chunk_durations = checkpoint.setdefault("chunks", {})
+            resumed = [i for i in range(total_chunks) if chunk_done(i)]
+            for i in resumed:
+                transcript_chunks[i] = await asyncio.to_thread(read_text_file, f"{chunk_base_name(transcript_path, i)}.txt")
+            resumed_audio_seconds = sum(chunk_durations[str(i)] for i in resumed)
+            completed = len(resumed)
+            loop = asyncio.get_running_loop()
+
+            if INCREMENTAL_INDEXING:
+                indexer = IncrementalIndexer(filename, content_hash, checkpoint.get("incremental"))
+
+            async def index_available(resuming: bool = False):
+                # Make the transcribed prefix queryable while later chunks are transcribed
+                try:
+                    state = await asyncio.to_thread(
+                        index_transcribed_prefix, indexer, transcript_chunks, transcript_path, False, timings
+                    )
+                except Exception as e:
+                    # Not fatal: the final pass indexes the whole transcript
+                    print(f"Incremental indexing failed for {filename}: {e}")
+                    return
+                if state is not None:
+                    save_checkpoint(incremental=state)
+                elif not resuming:
+                    return
+                if indexer.state["next_chunk_index"]:
+                    coverage = coverage_of(indexer.state, total_chunks)
+                    job_store.update_job(filename, status="partially_available", coverage=coverage)
+                    notify_progress(filename, 40 + (completed * 20) // total_chunks,
+                                    status="partially_available", coverage=coverage)
+
+            if indexer is not None:
+                # Chunks indexed before a retry are queryable again right away
+                await index_available(resuming=True)
+
+            async def run_chunk(i: int, chunk_path: str, chunk_start_offset: float):
+                chunk_result = await loop.run_in_executor(
+                    transcription_executor,
+                    transcribe_chunk,
+                    chunk_path,
+                    i,
+                    chunk_start_offset,  # Real segment start in the full video
+                    transcript_path
+                )
+                return i, chunk_result
+
+            notify_progress(filename, 40, step=f"transcribing_chunk_{completed}_of_{total_chunks}")
+            tasks = [
+                asyncio.ensure_future(run_chunk(i, segment_path, segment_start))
+                for i, (segment_path, segment_start) in enumerate(segments)
+                if i not in resumed
+            ]
+            failure = None
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    i, chunk_result = await next_done
+                except Exception as e:
+                    # Let the other chunks finish so their results are checkpointed too
+                    failure = failure or e
+                    continue
+                transcript_chunks[i] = chunk_result.text
+                audio_seconds += chunk_result.duration
+                chunk_durations[str(i)] = round(chunk_result.duration, 3)
+                save_checkpoint()
+                completed += 1
+                progress = 40 + (completed * 20) // total_chunks  # Progress from 40% to 60%
+                notify_progress(filename, progress, step=f"transcribing_chunk_{completed}_of_{total_chunks}")
                 # Clean up processed chunk
                 try:
-                    os.remove(chunk_path)
+                    os.remove(chunk_paths[i])
                 except:
                     pass
+                if indexer is not None:
+                    await index_available()
+            if failure is not None:
+                # Unfinished chunks keep their audio for the retry
+                mark_job_error(filename, str(failure))
+                notify_progress(filename, 0)
+                return
             
             # Combine all transcripts
-            transcript = " ".join(transcript_chunks)
+            transcript = " ".join(chunk for chunk in transcript_chunks if chunk)
             
             # Combine all detailed timestamp data
-            combined_words = []
-            for i in range(len(chunk_paths)):
-                detailed_transcript_path = f"{os.path.splitext(transcript_path)[0]}_chunk_{i:03d}_detailed.json"
-                if os.path.exists(detailed_transcript_path):
-                    try:
-                        with open(detailed_transcript_path, "r", encoding="utf-8") as f:
-                            detailed_data = json.load(f)
-                            if "words" in detailed_data:
-                                combined_words.extend(detailed_data["words"])
-                    except Exception as e:
-                        print(f"Error reading detailed transcript {detailed_transcript_path}: {e}")
-            
-            # Save combined detailed transcript
-            if combined_words:
-                combined_detailed_path = f"{os.path.splitext(transcript_path)[0]}_detailed.json"
-                combined_detailed_data = {
-                    "text": transcript,
-                    "words": combined_words,
-                    "total_chunks": len(chunk_paths)
-                }
-                with open(combined_detailed_path, "w", encoding="utf-8") as f:
-                    json.dump(combined_detailed_data, f, indent=2)
-                print(f"Combined detailed transcript saved with {len(combined_words)} words")
+            with timings.span("combine_timestamps"):
+                await asyncio.to_thread(combine_chunk_timestamps, transcript_path, total_chunks)
             
         else:
-            # Process single file (original logic)
             max_retries = 3
             for attempt in range(max_retries):
                 try:
-                    await notify_progress(filename, 40, step="transcribing_audio")
-                    with open(audio_path, "rb") as audio_file:
-                        whisper_response = client.audio.transcriptions.create(
-                            model="whisper-1",
-                            file=audio_file,
-                            response_format="verbose_json",
-                            timestamp_granularities=["word"]
-                        )
-                    transcript = whisper_response.text
-                    
-                    # Store detailed transcript with timestamps
-                    detailed_transcript_path = f"{os.path.splitext(transcript_path)[0]}_detailed.json"
-                    if hasattr(whisper_response, 'words') and whisper_response.words:
-                        words_with_timestamps = []
-                        for word in whisper_response.words:
-                            word_dict = {
-                                "word": word.word,
-                                "start": word.start,
-                                "end": word.end
-                            }
-                            words_with_timestamps.append(word_dict)
-                        
-                        # Save detailed transcript
-                        detailed_data = {
-                            "text": transcript,
-                            "words": words_with_timestamps
-                        }
-                        
-                        with open(detailed_transcript_path, "w", encoding="utf-8") as f:
-                            json.dump(detailed_data, f, indent=2)
-                    
+                    notify_progress(filename, 40, step="transcribing_audio")
+                    result = await asyncio.to_thread(transcribe_single_file, audio_path, transcript_path)
+                    transcript = result.text
+                    audio_seconds = result.duration
                     break
                 except Exception as e:
                     if attempt == max_retries - 1:
                         error_msg = f"Transcription failed after {max_retries} attempts: {str(e)}"
-                        with open(db_path, "r+") as dbf:
-                            db = json.load(dbf)
-                            for job in db["processing_jobs"]:
-                                if job["filename"] == filename:
-                                    job["status"] = "error"
-                                    job["progress"] = 0
-                                    job["error"] = error_msg
-                            dbf.seek(0)
-                            json.dump(db, dbf, indent=2)
-                            dbf.truncate()
-                        await notify_progress(filename, 0)
+                        mark_job_error(filename, error_msg)
+                        notify_progress(filename, 0)
                         return
+                    API_RETRIES.labels("pipeline", "transcribe_file").inc()
                     await asyncio.sleep(2)
         
-        # Save transcript
-        with open(transcript_path, "w", encoding="utf-8") as tf:
-            tf.write(transcript)
-        await notify_progress(filename, 60, step="transcription_done")
+        if not transcribed:
+            transcription_seconds = time.perf_counter() - transcription_started
+            timings.add("transcription", transcription_seconds)
+            # Real-time factor covers only the audio transcribed in this run
+            transcription_stats = record_transcription_stats(filename, audio_seconds, transcription_seconds)
+            if len(segments) > 1 and resumed:
+                transcription_stats["resumed_chunks"] = len(resumed)
+                transcription_stats["resumed_audio_seconds"] = round(resumed_audio_seconds, 3)
+            
+            # Save transcript
+            await asyncio.to_thread(write_text_file, transcript_path, transcript)
+            save_checkpoint(transcript=transcription_stats)
+        notify_progress(filename, 60, step="transcription_done")
         
-        # Chunking and embedding
-        await notify_progress(filename, 70, step="chunking_and_embedding")
-        from vector_pipeline import process_transcript
-        process_transcript(filename)
-        await notify_progress(filename, 100, step="done")
+        # Chunking and embedding. Re-running is cheap: vectors are upserted by
+        # chunk ID and embeddings already computed are in the embedding cache.
+        coverage = None
+        if not checkpoint.get("indexed"):
+            notify_progress(filename, 70, step="chunking_and_embedding")
+            if indexer is not None:
+                # Flush the held-back chunk and drop chunks of earlier runs
+                state = await asyncio.to_thread(
+                    index_transcribed_prefix, indexer, transcript_chunks, transcript_path, True, timings
+                )
+                save_checkpoint(incremental=state)
+                coverage = coverage_of(state, len(segments), complete=True)
+            else:
+                await asyncio.to_thread(process_transcript, filename, content_hash, timings)
+            save_checkpoint(indexed=True)
+        notify_progress(filename, 100, step="done")
         
         # Success
-        with open(db_path, "r+") as dbf:
-            db = json.load(dbf)
-            for job in db["processing_jobs"]:
-                if job["filename"] == filename:
-                    job["status"] = "done"
-                    job["progress"] = 100
-                    job["audio_path"] = audio_path
-                    job["transcript_path"] = transcript_path
-                    job["transcript_metadata"] = {
-                        "length": len(transcript) if transcript else 0
-                    }
-            dbf.seek(0)
-            json.dump(db, dbf, indent=2)
-            dbf.truncate()
-        await notify_progress(filename, 100)
+        job_store.update_job(
+            filename,
+            status="done",
+            progress=100,
+            audio_path=audio_path,
+            transcript_path=transcript_path,
+            coverage=coverage,
+            transcript_metadata={
+                "length": len(transcript) if transcript else 0,
+                **transcription_stats
+            }
+        )
+        # Checkpoints only serve unfinished work; a later restart reprocesses
+        job_store.delete_checkpoint(key)
+        notify_progress(filename, 100, status="done", coverage=coverage)
         
     except Exception as e:
-        with open(db_path, "r+") as dbf:
-            db = json.load(dbf)
-            for job in db["processing_jobs"]:
-                if job["filename"] == filename:
-                    job["status"] = "error"
-                    job["progress"] = 0
-                    job["error"] = str(e)
-            dbf.seek(0)
-            json.dump(db, dbf, indent=2)
-            dbf.truncate()
-        await notify_progress(filename, 0)
+        mark_job_error(filename, str(e))
+        notify_progress(filename, 0)
 
 
 @app.get("/")
@@ -447,33 +496,192 @@ def root():
 
 
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...), background_tasks: BackgroundTasks = None, restart: bool = False):
-    os.makedirs("uploads", exist_ok=True)
-    from datetime import datetime
-    # Add timestamp to filename
-    base, ext = os.path.splitext(file.filename)
+# --- UPLOADS ---
+# Uploads are streamed to disk in UPLOAD_BUFFER_SIZE pieces and hashed in the
+# same pass. MAX_UPLOAD_SIZE (bytes, 0 = unlimited) rejects oversized files.
+UPLOAD_BUFFER_SIZE = int(os.getenv("UPLOAD_BUFFER_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", "0"))
+PARTIAL_UPLOAD_DIR = os.path.join("uploads", ".partial")
+# upload_id -> (bytes hashed, running sha256) for resumable uploads
+upload_hashers = {}
+
+def timestamped_filename(filename: str) -> str:
+    base, ext = os.path.splitext(os.path.basename(filename))
     timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
-    new_filename = f"{base}_{timestamp}{ext}"
-    file_location = f"uploads/{new_filename}"
-    with open(file_location, "wb") as f:
-        f.write(await file.read())
+    return f"{base}_{timestamp}{ext}"
+
+def check_upload_size(size: int):
+    if MAX_UPLOAD_SIZE and size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds maximum size of {MAX_UPLOAD_SIZE} bytes")
+
+def hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_BUFFER_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+async def iter_upload_file(file: UploadFile):
+    while True:
+        chunk = await file.read(UPLOAD_BUFFER_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+async def stream_to_file(chunks, out, hasher=None):
+    """
+    Write an async iterator of byte chunks to an open file, coalescing them
+    into UPLOAD_BUFFER_SIZE writes. The hasher only ever sees bytes that were
+    written, so it stays consistent with out.tell() if the stream breaks.
+    """
+    buffer = bytearray()
+
+    async def flush():
+        if hasher is not None:
+            hasher.update(buffer)
+        await asyncio.to_thread(out.write, bytes(buffer))
+        buffer.clear()
+
+    try:
+        async for chunk in chunks:
+            check_upload_size(out.tell() + len(buffer) + len(chunk))
+            buffer.extend(chunk)
+            if len(buffer) >= UPLOAD_BUFFER_SIZE:
+                await flush()
+    finally:
+        if buffer:
+            await flush()
+
+def start_processing(new_filename: str, restart: bool, content_hash: str, size: int, priority: int = 0) -> dict:
+    """
+    Create a session for a stored upload and queue its processing job.
+    If the same content was uploaded before, record the new filename as an
+    alias of that lecture and reuse its transcript and vectors instead.
+    With restart, the content is processed again, unless a job for it is
+    still queued or running; the upload then becomes an alias of that job.
+    """
     # Clean up previous sessions and create a new session
     cleanup_sessions()
     session = create_session(new_filename)
     # If restart requested, remove any previous failed jobs for this file
     if restart:
-        db_path = "db.json"
-        with open(db_path, "r+") as dbf:
-            db = json.load(dbf)
-            db["processing_jobs"] = [j for j in db["processing_jobs"] if j["filename"] != new_filename]
-            dbf.seek(0)
-            json.dump(db, dbf, indent=2)
-            dbf.truncate()
-    # Enqueue processing job
-    if background_tasks is not None:
-        background_tasks.add_task(process_job, new_filename)
-    return {"filename": new_filename, "status": "uploaded", "session": session}
+        job_store.delete_job(new_filename)
+    # Restart reprocesses, but never alongside a job for the same content
+    # that is still queued or running: they would share its artifacts
+    canonical = job_store.find_active_job_by_hash(content_hash) if restart else job_store.find_job_by_hash(content_hash)
+    while canonical is None:
+        if job_store.add_job_unless_active(new_filename, content_hash, priority) is not None:
+            break
+        # Another upload of the same content was queued meanwhile: join it
+        canonical = job_store.find_active_job_by_hash(content_hash)
+    if canonical is not None:
+        # Identical bytes are already stored under the original filename
+        try:
+            os.remove(os.path.join("uploads", new_filename))
+        except OSError:
+            pass
+        alias = job_store.add_alias(new_filename, canonical)
+        return {"filename": new_filename, "status": alias["status"], "session": session, "content_hash": content_hash, "size": size, "alias_of": canonical["filename"]}
+    BYTES_PROCESSED.labels("upload").inc(size)
+    # Queue for the scheduler's workers; the response does not wait for them
+    scheduler.notify()
+    notify_progress(new_filename, 0, status="queued")
+    return {
+        "filename": new_filename,
+        "status": "queued",
+        "session": session,
+        "content_hash": content_hash,
+        "size": size,
+        "priority": priority,
+        "queue_position": job_store.queue_position(new_filename),
+        "queue_depth": job_store.queue_depth()
+    }
+
+@app.post("/upload")
+async def upload_file(file: UploadFile = File(...), restart: bool = False, priority: int = 0):
+    os.makedirs("uploads", exist_ok=True)
+    # Add timestamp to filename
+    new_filename = timestamped_filename(file.filename)
+    file_location = f"uploads/{new_filename}"
+    partial_location = f"{file_location}.part"
+    hasher = hashlib.sha256()
+    try:
+        with open(partial_location, "wb") as f:
+            await stream_to_file(iter_upload_file(file), f, hasher)
+            size = f.tell()
+    except BaseException:
+        try:
+            os.remove(partial_location)
+        except OSError:
+            pass
+        raise
+    os.replace(partial_location, file_location)
+    return start_processing(new_filename, restart, hasher.hexdigest(), size, priority)
+
+@app.post("/uploads")
+def init_resumable_upload(upload: UploadInit):
+    """Start a resumable upload; send bytes with PUT /uploads/{upload_id}?offset=N"""
+    if upload.total_size is not None:
+        check_upload_size(upload.total_size)
+    os.makedirs(PARTIAL_UPLOAD_DIR, exist_ok=True)
+    upload_id = str(uuid.uuid4())
+    open(os.path.join(PARTIAL_UPLOAD_DIR, upload_id), "wb").close()
+    upload_hashers[upload_id] = (0, hashlib.sha256())
+    return job_store.create_upload(upload_id, os.path.basename(upload.filename), upload.total_size)
+
+@app.get("/uploads/{upload_id}")
+def get_resumable_upload(upload_id: str):
+    """Current state of a resumable upload; 'received' is the offset to resume from"""
+    upload = job_store.get_upload(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+@app.put("/uploads/{upload_id}")
+async def append_resumable_upload(upload_id: str, request: Request, offset: int = 0):
+    """Append the raw request body to a resumable upload at the given offset"""
+    upload = job_store.get_upload(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if offset != upload["received"]:
+        raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "received": upload["received"]})
+    hashed, hasher = upload_hashers.get(upload_id, (None, None))
+    if hashed != offset:
+        # Hash state lost (e.g. server restart); rehash from disk on completion
+        hasher = None
+    partial_location = os.path.join(PARTIAL_UPLOAD_DIR, upload_id)
+    with open(partial_location, "r+b") as f:
+        f.seek(offset)
+        f.truncate()
+        try:
+            await stream_to_file(request.stream(), f, hasher)
+        finally:
+            received = f.tell()
+            job_store.set_upload_received(upload_id, received)
+            if hasher is not None:
+                upload_hashers[upload_id] = (received, hasher)
+            else:
+                upload_hashers.pop(upload_id, None)
+    return {"upload_id": upload_id, "received": received}
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_resumable_upload(upload_id: str, restart: bool = False, priority: int = 0):
+    """Finish a resumable upload and enqueue it for processing like /upload"""
+    upload = job_store.get_upload(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload["total_size"] is not None and upload["received"] != upload["total_size"]:
+        raise HTTPException(status_code=409, detail={"message": "Upload incomplete", "received": upload["received"]})
+    partial_location = os.path.join(PARTIAL_UPLOAD_DIR, upload_id)
+    hashed, hasher = upload_hashers.pop(upload_id, (None, None))
+    if hasher is not None and hashed == upload["received"]:
+        content_hash = hasher.hexdigest()
+    else:
+        content_hash = await asyncio.to_thread(hash_file, partial_location)
+    new_filename = timestamped_filename(upload["filename"])
+    os.replace(partial_location, os.path.join("uploads", new_filename))
+    job_store.delete_upload(upload_id)
+    return start_processing(new_filename, restart, content_hash, upload["received"], priority)
 
 @app.get("/sessions")
 def get_sessions_endpoint():
@@ -481,22 +689,85 @@ def get_sessions_endpoint():
     return {"sessions": get_sessions()}
 
 @app.get("/processing-status")
-def get_processing_status():
-    """Get status of all processing jobs"""
-    db_path = "db.json"
-    with open(db_path, "r") as dbf:
-        db = json.load(dbf)
-        return {"jobs": db.get("processing_jobs", [])}
+def get_processing_status(filename: Optional[str] = None, status: Optional[str] = None):
+    """Get status of processing jobs (all, one filename, or one status)"""
+    if filename is not None:
+        job = job_store.get_job(filename)
+        if job is not None and job["status"] == "queued":
+            job["queue_position"] = job_store.queue_position(filename)
+        if job is not None and job["status"] != "done":
+            job["checkpoint"] = job_checkpoint_summary(job)
+        return {"jobs": [job] if job else []}
+    return {"jobs": job_store.list_jobs(status=status)}
+
+def job_checkpoint_summary(job: dict) -> dict:
+    from vector_pipeline import artifact_key
+    return checkpoint_summary(job_store.get_checkpoint(artifact_key(job["filename"], job["content_hash"])))
+
+@app.post("/jobs/{filename}/retry")
+def retry_job_endpoint(filename: str):
+    """Queue a failed job again; it resumes from its last checkpoint"""
+    job = job_store.get_job(filename)
+    if job is not None and job["alias_of"]:
+        # Aliases are processed (and fail) with their original, which may have been deleted
+        job = job_store.get_job(job["alias_of"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_store.retry_job(job["filename"]):
+        active = job["content_hash"] and job_store.find_active_job_by_hash(job["content_hash"], exclude=job["filename"])
+        if active:
+            raise HTTPException(
+                status_code=409,
+                detail=f"The same lecture is already being processed as {active['filename']} (status: {active['status']})"
+            )
+        raise HTTPException(status_code=409, detail=f"Only failed jobs can be retried (status: {job['status']})")
+    scheduler.notify()
+    notify_progress(job["filename"], 0, status="queued")
+    return {
+        "filename": job["filename"],
+        "status": "queued",
+        "queue_position": job_store.queue_position(job["filename"]),
+        "queue_depth": job_store.queue_depth(),
+        "checkpoint": job_checkpoint_summary(job)
+    }
+
+@app.get("/queue")
+def get_queue():
+    """Ingest queue: depth, jobs in run order with their positions, and this process's workers"""
+    queued = job_store.list_queued()
+    return {
+        **scheduler.stats(),
+        "queued": [
+            {"filename": job["filename"], "priority": job["priority"], "queued_at": job["queued_at"], "position": position}
+            for position, job in enumerate(queued, start=1)
+        ]
+    }
+
+@app.websocket("/ws")
+async def progress_websocket(websocket: WebSocket, jobs: Optional[str] = None):
+    """
+    Job progress channel. Subscribe with ?jobs=a.mp4,b.mp4 or by sending
+    {"action": "subscribe" | "unsubscribe", "jobs": [...]}; "*" follows every
+    job. Each subscription first receives the job's current state, then
+    {"event": "progress", "filename", "progress", "step", "status", ...}
+    updates, coalesced to the latest state when the client falls behind.
+    """
+    await websocket.accept()
+    await progress_hub.serve(websocket, [job for job in (jobs or "").split(",") if job])
 
 @app.get("/lectures")
 def get_lectures():
     """Get all available lectures for RAG queries"""
-    db_path = "db.json"
-    with open(db_path, "r") as dbf:
-        db = json.load(dbf)
-        # Return completed processing jobs as available lectures
-        completed_jobs = [job for job in db.get("processing_jobs", []) if job.get("status") == "done"]
-        return {"lectures": completed_jobs}
+    # Completed lectures, and lectures still processing whose beginning is
+    # already indexed (status "partially_available", see "coverage")
+    return {"lectures": job_store.list_jobs(status=job_store.QUERYABLE_STATUSES)}
+
+def partial_coverage(video_id: str) -> dict:
+    """Response fields telling clients an answer only covers the indexed part of a lecture."""
+    job = job_store.get_job(video_id)
+    if job is None or job["status"] != "partially_available":
+        return {}
+    return {"partial": True, "coverage": job["coverage"]}
 
 @app.post("/rag-query")
 def rag_query_endpoint(query: RAGQuery):
@@ -508,21 +779,95 @@ def rag_query_endpoint(query: RAGQuery):
             "video_id": query.video_id,
             "query": query.query,
             "answer": result["answer"],
-            "timestamps": result.get("used_timestamps", [])
+            "timestamps": result.get("used_timestamps", []),
+            "context": result.get("context"),
+            **partial_coverage(query.video_id)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG query failed: {str(e)}")
 
+@app.post("/search")
+def search_lectures_endpoint(search: LectureSearch):
+    """Find the most relevant chunks across lectures, merged into one top-k"""
+    from rag_query import QueryError, search_lectures
+    if not 1 <= search.k <= 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+    try:
+        result = search_lectures(search.query, search.video_ids, search.k)
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query": search.query, **result}
+
+@app.get("/cache-stats")
+def get_cache_stats():
+    """Hit/miss counters and memory use of the embedding, query and retriever caches"""
+    from embeddings import embedding_cache_stats
+    from query_cache import query_cache_stats
+    from rag_registry import RETRIEVER_BACKEND, flat_indexes
+    from corpus_index import corpus
+    return {
+        "embeddings": embedding_cache_stats(),
+        "queries": query_cache_stats(),
+        "retriever": {"backend": RETRIEVER_BACKEND, "flat_indexes": flat_indexes.stats(), "corpus": corpus.stats()}
+    }
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics: stage latencies, bytes processed, chunks embedded, cache hits, jobs, retries"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# Upper bound on questions per /rag-query/batch request
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "500"))
+
+@app.post("/rag-query/batch")
+def rag_query_batch_endpoint(batch: RAGBatchQuery):
+    """Answer many questions about one lecture; results are in request order"""
+    if len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    from rag_query import rag_query_batch
+    started = time.perf_counter()
+    results = rag_query_batch(batch.video_id, batch.queries)
+    return {
+        "video_id": batch.video_id,
+        "results": [
+            {
+                "query": query,
+                "answer": result["answer"],
+                "timestamps": result.get("used_timestamps", []),
+                "context": result.get("context"),
+                "error": result["error"]
+            }
+            for query, result in zip(batch.queries, results)
+        ],
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        **partial_coverage(batch.video_id)
+    }
+
+@app.post("/rag-query/stream")
+async def rag_query_stream_endpoint(query: RAGQuery):
+    """Stream a RAG answer as Server-Sent Events: timestamps first, then tokens"""
+    from rag_query import rag_query_stream
+
+    async def event_stream():
+        async for event in rag_query_stream(query.video_id, query.query):
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.delete("/clear-data")
 def clear_all_data():
     """Clear all data - sessions, jobs, and uploaded files"""
-    db_path = "db.json"
-    with open(db_path, "w") as dbf:
-        json.dump({
-            "lectures": [],
-            "processing_jobs": [],
-            "sessions": []
-        }, dbf, indent=2)
+    job_store.clear_all()
+    from rag_registry import invalidate_collection
+    invalidate_collection()
+    
+    upload_hashers.clear()
+    shutil.rmtree(PARTIAL_UPLOAD_DIR, ignore_errors=True)
     
     # Clean up uploaded files
     uploads_dir = "uploads"
@@ -530,7 +875,10 @@ def clear_all_data():
         for file in os.listdir(uploads_dir):
             file_path = os.path.join(uploads_dir, file)
             try:
-                os.remove(file_path)
+                if os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+                else:
+                    os.remove(file_path)
             except Exception:
                 pass
     
@@ -0,0 +1,120 @@
+import time
+import logging
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Prometheus metrics for ingestion and queries, served by GET /metrics.
+# Values are per process; with several uvicorn workers scrape each one.
+
+# Stages run from milliseconds (cache lookups) to tens of minutes (long transcriptions)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+STAGE_SECONDS = Histogram(
+    "lecture_stage_seconds",
+    "Wall time of each pipeline stage",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+BYTES_PROCESSED = Counter("lecture_bytes_processed", "Bytes received or produced per kind", ["kind"])
+CHUNKS_EMBEDDED = Counter("lecture_chunks_embedded", "Transcript chunks embedded and written to the vector store")
+JOBS_IN_FLIGHT = Gauge("lecture_jobs_in_flight", "Processing jobs currently running")
+JOBS_FINISHED = Counter("lecture_jobs_finished", "Processing jobs finished, by final status", ["status"])
+QUEUE_DEPTH = Gauge("lecture_queue_depth", "Jobs waiting in the ingest queue")
+PROGRESS_CLIENTS = Gauge("lecture_progress_clients", "Clients connected to the /ws progress channel")
+PROGRESS_MESSAGES = Counter(
+    "lecture_progress_messages",
+    "Progress updates: 'sent', 'coalesced' into an unsent update for the same job, "
+    "and 'dropped_client' for clients disconnected for being too slow",
+    ["outcome"],
+)
+CONTEXT_TOKENS = Counter(
+    "lecture_context_tokens",
+    "Prompt context tokens: 'packed' sent to the LLM, 'saved' by merging overlapping chunks",
+    ["kind"],
+)
+API_RETRIES = Counter(
+    "lecture_api_retries",
+    "Retried calls: 'openai' counts the SDK's own retries (429s, 5xx, timeouts) by URL, "
+    "'pipeline' counts whole-call retries by the processing pipeline",
+    ["source", "operation"],
+)
+
+
+class StageTimings:
+    """
+    Wall time per stage of one job or query. Each span is observed in
+    STAGE_SECONDS and summed into .stages, which is stored on the job record.
+    """
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.stages = {}
+
+    def add(self, stage: str, elapsed: float):
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + elapsed, 3)
+        STAGE_SECONDS.labels(self.pipeline, stage).observe(elapsed)
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+
+class CacheStatsCollector:
+    """Exports the hit/miss counters the caches already keep, read at scrape time."""
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        hits = CounterMetricFamily("lecture_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("lecture_cache_misses", "Cache misses", labels=["cache"])
+        size = GaugeMetricFamily("lecture_cache_bytes", "Bytes held by each cache", labels=["cache"])
+        for name, stats in cache_stats().items():
+            hits.add_metric([name], stats["hits"])
+            if "misses" in stats:
+                misses.add_metric([name], stats["misses"])
+            size.add_metric([name], stats["bytes"])
+        yield hits
+        yield misses
+        yield size
+
+
+def cache_stats() -> dict:
+    from embeddings import embedding_cache_stats
+    from query_cache import query_cache_stats
+    stats = {}
+    try:
+        stats["embeddings"] = embedding_cache_stats()
+    except Exception as e:
+        # e.g. no OPENAI_API_KEY yet; the other caches are still reported
+        print(f"Embedding cache stats unavailable: {e}")
+    queries = query_cache_stats()
+    for name in ("retrieval", "answers", "semantic"):
+        stats[name] = queries[name]
+    return stats
+
+
+class OpenAIRetryCounter(logging.Handler):
+    """Counts the openai SDK's 'Retrying request to <url>' log records."""
+
+    def emit(self, record: logging.LogRecord):
+        if isinstance(record.msg, str) and record.msg.startswith("Retrying request") and record.args:
+            API_RETRIES.labels("openai", str(record.args[0])).inc()
+
+
+REGISTRY.register(CacheStatsCollector())
+_openai_logger = logging.getLogger("openai._base_client")
+_openai_logger.addHandler(OpenAIRetryCounter(level=logging.INFO))
+# The SDK logs retries at INFO; without this they are never emitted
+if not _openai_logger.isEnabledFor(logging.INFO):
+    _openai_logger.setLevel(logging.INFO)
+
+
+def render_metrics():
+    """(body, content type) of the Prometheus text exposition."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,204 @@
+import os
+import asyncio
+from collections import OrderedDict
+from typing import Iterable, Optional
+from fastapi.websockets import WebSocket, WebSocketDisconnect
+import job_store
+from metrics import PROGRESS_CLIENTS, PROGRESS_MESSAGES
+
+# Job progress fan-out for the /ws WebSocket. Publishing never waits on clients: each
+# client has a bounded map of pending updates, one per job, in which rapid
+# updates are merged into the latest state. A separate task per client sends
+# them; clients that fall behind are disconnected instead of buffered for.
+
+# Max jobs with unsent updates per client before it counts as too slow
+WS_MAX_PENDING_JOBS = int(os.getenv("WS_MAX_PENDING_JOBS", "256"))
+# A client that takes longer than this to accept one message is dropped
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+ALL_JOBS = "*"
+# "Try again later": the client was too slow and should reconnect
+CLOSE_SLOW_CONSUMER = 1013
+
+
+class Subscriber:
+    """One connected client: the jobs it follows and its unsent updates."""
+
+    def __init__(self, max_pending: int = WS_MAX_PENDING_JOBS):
+        self.jobs = set()
+        self.pending = OrderedDict()  # filename -> latest unsent state
+        self.max_pending = max_pending
+        self.ready = asyncio.Event()
+        self.dropped = False
+
+    def offer(self, filename: str, update: dict) -> bool:
+        """Queue an update, merged into any unsent one for the job; False if the client is too far behind."""
+        if filename in self.pending:
+            self.pending[filename].update(update)
+            PROGRESS_MESSAGES.labels("coalesced").inc()
+        elif len(self.pending) >= self.max_pending:
+            self.dropped = True
+        else:
+            self.pending[filename] = dict(update)
+        self.ready.set()
+        return not self.dropped
+
+
+class ProgressHub:
+    """Routes job progress updates to the clients subscribed to each job."""
+
+    def __init__(self):
+        self._by_job = {}  # filename -> set of Subscribers
+        self._all = set()  # Subscribers following every job
+        self.loop = None  # event loop serving the clients, set by serve()
+
+    def subscribe(self, subscriber: Subscriber, filenames: Iterable[str]):
+        for filename in filenames:
+            subscriber.jobs.add(filename)
+            if filename == ALL_JOBS:
+                self._all.add(subscriber)
+            else:
+                self._by_job.setdefault(filename, set()).add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber, filenames: Optional[Iterable[str]] = None):
+        """Stop sending the given jobs (default: all of them) to subscriber."""
+        for filename in list(subscriber.jobs if filenames is None else filenames):
+            subscriber.jobs.discard(filename)
+            subscriber.pending.pop(filename, None)
+            if filename == ALL_JOBS:
+                self._all.discard(subscriber)
+                continue
+            subscribers = self._by_job.get(filename)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_job[filename]
+
+    def publish(self, filename: str, **update):
+        """
+        Send a job update to its subscribers without blocking. Fields that are
+        None are left out, so they don't overwrite the last known value when
+        coalesced. Safe to call from any thread.
+        """
+        if filename not in self._by_job and not self._all:
+            return
+        update = {"filename": filename, **{k: v for k, v in update.items() if v is not None}}
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self.loop is not None and running is not self.loop:
+            # e.g. a sync endpoint on the threadpool; subscribers belong to the loop
+            self.loop.call_soon_threadsafe(self._deliver, filename, update)
+        else:
+            self._deliver(filename, update)
+
+    def _deliver(self, filename: str, update: dict):
+        subscribers = self._by_job.get(filename)
+        for subscriber in list(subscribers or ()) + list(self._all):
+            if not subscriber.offer(filename, update):
+                # Closed by its sender task, which wakes up on ready
+                self.unsubscribe(subscriber)
+
+
+hub = ProgressHub()
+
+
+def job_snapshot(filename: str) -> dict:
+    """Current state of a job, sent when a client subscribes to it."""
+    job = job_store.get_job(filename)
+    if job is None:
+        return {"filename": filename, "status": "not_found"}
+    snapshot = {
+        "filename": filename,
+        "status": job["status"],
+        "progress": job["progress"],
+        "error": job["error"],
+        "coverage": job["coverage"],
+    }
+    if job["status"] == "queued":
+        snapshot["queue_position"] = job_store.queue_position(filename)
+    return {k: v for k, v in snapshot.items() if v is not None}
+
+
+async def close_slow_consumer(websocket: WebSocket):
+    """Tell a client that fell behind to reconnect; its subscription snapshot then catches it up."""
+    try:
+        await asyncio.wait_for(
+            websocket.close(code=CLOSE_SLOW_CONSUMER, reason="Too slow; reconnect to resume"),
+            WS_SEND_TIMEOUT_SECONDS
+        )
+    except Exception:
+        # The close frame can't get through either; the connection is dropped when serve() returns
+        pass
+
+
+async def _send_updates(websocket: WebSocket, subscriber: Subscriber):
+    while True:
+        await subscriber.ready.wait()
+        subscriber.ready.clear()
+        if subscriber.dropped:
+            PROGRESS_MESSAGES.labels("dropped_client").inc()
+            await close_slow_consumer(websocket)
+            return
+        while subscriber.pending:
+            _, update = subscriber.pending.popitem(last=False)
+            try:
+                await asyncio.wait_for(websocket.send_json({"event": "progress", **update}), WS_SEND_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                PROGRESS_MESSAGES.labels("dropped_client").inc()
+                await close_slow_consumer(websocket)
+                return
+            PROGRESS_MESSAGES.labels("sent").inc()
+
+
+async def _receive_commands(websocket: WebSocket, subscriber: Subscriber):
+    while True:
+        try:
+            command = await websocket.receive_json()
+        except WebSocketDisconnect:
+            return
+        except ValueError:
+            await websocket.send_json({"event": "error", "message": "Commands must be JSON"})
+            continue
+        action = command.get("action") if isinstance(command, dict) else None
+        jobs = command.get("jobs") if isinstance(command, dict) else None
+        if action not in ("subscribe", "unsubscribe") or not isinstance(jobs, list):
+            await websocket.send_json({
+                "event": "error",
+                "message": 'Expected {"action": "subscribe" | "unsubscribe", "jobs": [filename, ...]}',
+            })
+            continue
+        if action == "subscribe":
+            subscribe(subscriber, jobs)
+        else:
+            hub.unsubscribe(subscriber, jobs)
+
+
+def subscribe(subscriber: Subscriber, filenames: Iterable[str]):
+    """Subscribe and queue each job's current state, so clients don't miss updates sent before."""
+    filenames = [str(filename) for filename in filenames]
+    hub.subscribe(subscriber, filenames)
+    for filename in filenames:
+        if filename != ALL_JOBS:
+            subscriber.offer(filename, job_snapshot(filename))
+
+
+async def serve(websocket: WebSocket, filenames: Iterable[str] = ()):
+    """Run one accepted connection until the client leaves or is dropped."""
+    hub.loop = asyncio.get_running_loop()
+    subscriber = Subscriber()
+    subscribe(subscriber, filenames)
+    PROGRESS_CLIENTS.inc()
+    tasks = [
+        asyncio.create_task(_send_updates(websocket, subscriber)),
+        asyncio.create_task(_receive_commands(websocket, subscriber)),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        PROGRESS_CLIENTS.dec()
+        hub.unsubscribe(subscriber)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+import numpy as np
+
+# Caches for rag_query: retrieval results and final answers, keyed by
+# (collection, normalized query). Both are LRU with a TTL and a byte budget.
+# The optional semantic layer serves a cached answer when a new question's
+# embedding is close enough to one already answered for the same lecture.
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def approx_size(value: Any) -> int:
+    """Rough recursive memory footprint of cached values (strings dominate)."""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "page_content"):
+        return approx_size(value.page_content) + approx_size(getattr(value, "metadata", {}))
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL and a total byte budget."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, on_evict: Optional[Callable] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str], count: bool = True):
+        """Cached value or None; with count=False the caller records the lookup itself."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if count:
+                self._record(entry is not None)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def record(self, hit: bool):
+        with self._lock:
+            self._record(hit)
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def put(self, key: Tuple[str, str], value):
+        size = approx_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl_seconds)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        with self._lock:
+            keys = [k for k in self._entries if collection_name is None or k[0] == collection_name]
+            for key in keys:
+                self._remove(key)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+        if self.on_evict is not None:
+            self.on_evict(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class SemanticIndex:
+    """Per-collection unit query embeddings for near-duplicate answer hits."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.hits = 0
+        self._vectors = {}  # collection -> {answer key: unit vector}
+        self._lock = threading.Lock()
+
+    def add(self, key: Tuple[str, str], embedding: List[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return
+        with self._lock:
+            self._vectors.setdefault(key[0], {})[key] = vector / norm
+
+    def lookup(self, collection_name: str, embedding: List[float]) -> Optional[Tuple[str, str]]:
+        """Answer key of the most similar cached query above the threshold."""
+        with self._lock:
+            entries = self._vectors.get(collection_name)
+            if not entries:
+                return None
+            keys = list(entries.keys())
+            matrix = np.stack(list(entries.values()))
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        similarities = matrix @ (vector / norm)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return keys[best]
+
+    def record_hit(self):
+        """Count an answer actually served through lookup (it can still miss in the answer cache)."""
+        with self._lock:
+            self.hits += 1
+
+    def remove(self, key: Tuple[str, str]):
+        with self._lock:
+            entries = self._vectors.get(key[0])
+            if entries is not None:
+                entries.pop(key, None)
+                if not entries:
+                    del self._vectors[key[0]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = sum(len(v) for v in self._vectors.values())
+            return {
+                "enabled": SEMANTIC_CACHE_ENABLED,
+                "threshold": self.threshold,
+                "entries": entries,
+                "bytes": sum(vec.nbytes for v in self._vectors.values() for vec in v.values()),
+                "hits": self.hits,
+            }
+
+
+semantic_index = SemanticIndex(SEMANTIC_CACHE_THRESHOLD)
+retrieval_cache = LRUCache(QUERY_CACHE_MAX_BYTES // 2, QUERY_CACHE_TTL_SECONDS)
+# Evicted answers must also leave the semantic index
+answer_cache = LRUCache(QUERY_CACHE_MAX_BYTES // 2, QUERY_CACHE_TTL_SECONDS, on_evict=semantic_index.remove)
+
+
+def cache_key(collection_name: str, query: str) -> Tuple[str, str]:
+    return (collection_name, normalize_query(query))
+
+
+def get_answer(collection_name: str, query: str, query_embedding: Optional[List[float]] = None) -> Optional[dict]:
+    """
+    Exact-match answer, then (if enabled and an embedding is given) a
+    near-duplicate one. Callers look up without an embedding first, so exact
+    repeats skip embedding, then again with it. answer_cache counts one
+    lookup per request: a hit when an answer is returned, a miss only on the
+    call with the embedding.
+    """
+    answer = answer_cache.get(cache_key(collection_name, query), count=False)
+    if answer is None and SEMANTIC_CACHE_ENABLED and query_embedding is not None:
+        similar_key = semantic_index.lookup(collection_name, query_embedding)
+        answer = answer_cache.get(similar_key, count=False) if similar_key else None
+        if answer is not None:
+            semantic_index.record_hit()
+    if answer is not None or query_embedding is not None:
+        answer_cache.record(answer is not None)
+    return answer
+
+
+def put_answer(collection_name: str, query: str, answer: dict, query_embedding: Optional[List[float]] = None):
+    key = cache_key(collection_name, query)
+    answer_cache.put(key, answer)
+    if SEMANTIC_CACHE_ENABLED and query_embedding is not None:
+        semantic_index.add(key, query_embedding)
+
+
+def invalidate(collection_name: Optional[str] = None):
+    """Forget cached results for one collection, or for all of them."""
+    retrieval_cache.invalidate(collection_name)
+    answer_cache.invalidate(collection_name)
+
+
+def query_cache_stats() -> dict:
+    retrieval = retrieval_cache.stats()
+    answers = answer_cache.stats()
+    semantic = semantic_index.stats()
+    return {
+        "retrieval": retrieval,
+        "answers": answers,
+        "semantic": semantic,
+        "total_bytes": retrieval["bytes"] + answers["bytes"] + semantic["bytes"],
+    }
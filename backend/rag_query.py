@@ -1,14 +1,213 @@
 import os
-import json
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import time
+import asyncio
+import heapq
+from concurrent.futures import ThreadPoolExecutor
 from langchain.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
 from dotenv import load_dotenv
+import job_store
+from vector_pipeline import collection_name_for
+from rag_registry import get_collection, get_llm, get_vectorstore, sync_collections
+from embeddings import get_embeddings
+from flat_index import FlatIndex
+import window_index
+import corpus_index
+import context_packing
+from metrics import StageTimings
+import query_cache
 
 # Load environment variables
 load_dotenv()
 
-CHROMA_PATH = "chroma_db"
+# Built once at import; it is immutable and shared by every query
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful lecture assistant. Use the provided context to answer the user's question. Always include relevant timestamps from the context if available. If you cannot answer the question based on the context, say so clearly. When timestamps are available, format them as [MM:SS] in your response."),
+    ("human", "Context:\n{context}\n\nAvailable timestamps: {timestamps}\n\nQuestion: {question}\nAnswer (include timestamps when relevant):")
+])
+
+SEARCH_K = 8
+# Concurrent LLM generations per rag_query_batch call
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "8"))
+
+# Lectures loaded concurrently into the cross-lecture index by search_lectures
+SEARCH_FANOUT_WORKERS = int(os.getenv("SEARCH_FANOUT_WORKERS", "16"))
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_FANOUT_WORKERS, thread_name_prefix="search")
+
+NO_RESULTS_ANSWER = "I couldn't find relevant information in the lecture to answer your question. Please try rephrasing your question."
+
+class QueryError(Exception):
+    """A user-facing failure; its message is returned as the answer."""
+
+def resolve_lecture(video_id):
+    """Collection name and cached vector store handle for a lecture."""
+    # Aliases and re-uploads share the collection of their content hash
+    job = job_store.get_job(video_id)
+    collection_name = collection_name_for(video_id, job["content_hash"] if job else None)
+    # Cached handles and results may predate a reindex in another worker
+    sync_collections([collection_name])
+    try:
+        return collection_name, get_vectorstore(video_id, collection_name)
+    except Exception as e:
+        raise QueryError(f"Error accessing vector database for {video_id}. Please ensure the lecture has been processed. Error: {str(e)}")
+
+def search_chunks(vectordb, collection_name, query, query_embedding):
+    """
+    Top chunks with distance scores, served from the retrieval cache when
+    possible. Long lectures are searched coarse-to-fine through their time
+    window levels, short ones directly.
+    """
+    retrieval_key = query_cache.cache_key(collection_name, query)
+    docs_scores = query_cache.retrieval_cache.get(retrieval_key)
+    if docs_scores is None:
+        try:
+            docs_scores = window_index.search(collection_name, vectordb, query_embedding, SEARCH_K)
+            if docs_scores is None:
+                docs_scores = vectordb.similarity_search_by_vector_with_relevance_scores(query_embedding, k=SEARCH_K)
+        except Exception as e:
+            raise QueryError(f"Error searching for relevant content: {str(e)}")
+        query_cache.retrieval_cache.put(retrieval_key, docs_scores)
+    return docs_scores
+
+def search_chunks_batch(vectordb, collection_name, queries, query_embeddings):
+    """search_chunks for many queries, sending all cache misses to Chroma in one query."""
+    results = [query_cache.retrieval_cache.get(query_cache.cache_key(collection_name, q)) for q in queries]
+    missing = [i for i, docs_scores in enumerate(results) if docs_scores is None]
+    if not missing:
+        return results
+    if window_index.load_levels(collection_name):
+        # Coarse-to-fine searches touch few rows each; no batching needed
+        for i in missing:
+            results[i] = search_chunks(vectordb, collection_name, queries[i], query_embeddings[i])
+        return results
+    if isinstance(vectordb, FlatIndex):
+        for i, docs_scores in zip(missing, vectordb.search_many([query_embeddings[i] for i in missing], k=SEARCH_K)):
+            query_cache.retrieval_cache.put(query_cache.cache_key(collection_name, queries[i]), docs_scores)
+            results[i] = docs_scores
+        return results
+    try:
+        # Chroma scores every query embedding in a single collection.query call
+        response = get_collection(collection_name).query(
+            query_embeddings=[query_embeddings[i] for i in missing],
+            n_results=SEARCH_K,
+            include=["documents", "metadatas", "distances"]
+        )
+    except Exception as e:
+        raise QueryError(f"Error searching for relevant content: {str(e)}")
+    for row, i in enumerate(missing):
+        docs_scores = [
+            (Document(page_content=text, metadata=metadata or {}, id=doc_id), distance)
+            for text, metadata, doc_id, distance in zip(
+                response["documents"][row], response["metadatas"][row],
+                response["ids"][row], response["distances"][row]
+            )
+        ]
+        query_cache.retrieval_cache.put(query_cache.cache_key(collection_name, queries[i]), docs_scores)
+        results[i] = docs_scores
+    return results
+
+def format_timestamp(seconds):
+    minutes = int(seconds // 60)
+    return f"{minutes:02d}:{int(seconds % 60):02d}"
+
+def build_prompt_inputs(docs_scores, query):
+    """
+    Pack hits into the prompt context and assemble the prompt variables.
+    Returns (inputs, timestamps, context_stats); inputs is None without usable hits.
+    """
+    packed = context_packing.pack_context(docs_scores)
+    if packed is None:
+        return None, [], None
+    context, spans, context_stats = packed
+    # One timestamp per span: where it starts, plus its range for the prompt
+    timestamps = []
+    ranges = []
+    for span in spans:
+        if span["timestamp"]:
+            start = span["timestamp"]
+        elif span["start_time"] is not None:
+            start = format_timestamp(span["start_time"])
+        else:
+            continue
+        timestamps.append(start)
+        end = format_timestamp(span["end_time"]) if span["end_time"] is not None else start
+        ranges.append(start if end == start else f"{start}-{end}")
+    
+    # Remove duplicates while preserving order
+    unique_timestamps = list(dict.fromkeys(timestamps))
+    unique_ranges = list(dict.fromkeys(ranges))
+    inputs = {
+        "context": context,
+        "question": query,
+        "timestamps": ", ".join(unique_ranges) if unique_ranges else "No timestamps available"
+    }
+    return inputs, unique_timestamps, context_stats
+
+def lecture_collections(video_ids=None):
+    """
+    {collection_name: [filenames]} for queryable lectures (done or partially
+    available), optionally limited to video_ids. Aliases share their
+    original's collection, which is then searched once.
+    """
+    wanted = set(video_ids) if video_ids is not None else None
+    collections = {}
+    for job in job_store.list_jobs(status=job_store.QUERYABLE_STATUSES):
+        if wanted is not None and job["filename"] not in wanted:
+            continue
+        collection_name = collection_name_for(job["filename"], job["content_hash"])
+        collections.setdefault(collection_name, []).append(job["filename"])
+    return collections
+
+def search_lectures_by_vector(query, query_embedding, video_ids=None, k=10, executor=None):
+    """
+    Search every lecture (or only video_ids) for query_embedding in one pass
+    over the cross-lecture routing index and return the global top-k by
+    distance (lower is more similar). Lectures are loaded into the index on
+    first use, in parallel on executor.
+    Returns {"hits": [...], "lectures_searched": n, "errors": {video_id: message}}.
+    """
+    everything = lecture_collections()
+    sync_collections(everything)
+    collections = everything if video_ids is None else lecture_collections(video_ids)
+    found, load_errors = corpus_index.corpus.search(
+        list(everything), query_embedding, k,
+        wanted=None if video_ids is None else list(collections),
+        executor=executor or search_executor
+    )
+    errors = {
+        collections[collection_name][0]: message
+        for collection_name, message in load_errors.items() if collection_name in collections
+    }
+    candidates = [(score, collections[collection_name], doc) for collection_name, doc, score in found]
+
+    hits = []
+    for score, filenames, doc in heapq.nsmallest(k, candidates, key=lambda c: c[0]):
+        hits.append({
+            "video_id": filenames[0],
+            "aliases": filenames[1:],
+            "score": float(score),
+            "timestamp": doc.metadata.get("timestamp"),
+            "timestamp_end": doc.metadata.get("timestamp_end"),
+            "start_time": doc.metadata.get("start_time"),
+            "end_time": doc.metadata.get("end_time"),
+            "chunk_index": doc.metadata.get("chunk_index"),
+            "text": doc.page_content
+        })
+    return {"hits": hits, "lectures_searched": len(collections), "errors": errors}
+
+def search_lectures(user_query, video_ids=None, k=10):
+    """
+    Search all completed lectures, or only video_ids, for the chunks most
+    relevant to user_query, e.g. "which lecture covered LoRA?".
+    """
+    query = user_query.strip()
+    if not query:
+        raise QueryError("Please provide a valid question.")
+    try:
+        query_embedding = get_embeddings().embed_query(query)
+    except Exception as e:
+        raise QueryError(f"Error searching for relevant content: {str(e)}")
+    return search_lectures_by_vector(query, query_embedding, video_ids, k)
 
 def rag_query(video_id, user_query):
     """
@@ -28,105 +227,218 @@ def rag_query(video_id, user_query):
         if not query:
             return {"answer": "Please provide a valid question.", "used_timestamps": []}
 
+        # Stage latencies are exported on /metrics
+        timings = StageTimings("query")
+
         # --- Semantic search in ChromaDB ---
-        import re
-        def sanitize_collection_name(name: str) -> str:
-            name = re.sub(r'[^a-zA-Z0-9._-]', '_', name)
-            name = re.sub(r'^[^a-zA-Z0-9]+', '', name)
-            name = re.sub(r'[^a-zA-Z0-9]+$', '', name)
-            name = re.sub(r'\.[^.]+$', '', name)
-            return name
-        sanitized_collection = f"lecture_{sanitize_collection_name(video_id)}"
+        with timings.span("resolve"):
+            collection_name, vectordb = resolve_lecture(video_id)
         
-        try:
-            vectordb = Chroma(
-                collection_name=sanitized_collection,
-                embedding_function=OpenAIEmbeddings(model="text-embedding-3-small"),
-                persist_directory=CHROMA_PATH
-            )
-        except Exception as e:
-            return {"answer": f"Error accessing vector database for {video_id}. Please ensure the lecture has been processed. Error: {str(e)}", "used_timestamps": []}
+        # Exact repeat of a cached question: no embedding, search or LLM call
+        cached_answer = query_cache.get_answer(collection_name, query)
+        if cached_answer is not None:
+            return cached_answer
         
         # Efficient chunk retrieval with score filtering and cache
-        cache = getattr(rag_query, "_cache", None)
-        if cache is None:
-            cache = {}
-            setattr(rag_query, "_cache", cache)
-        cache_key = f"{video_id}:{query}"
-        if cache_key in cache:
-            docs_scores = cache[cache_key]
-        else:
-            try:
-                docs_scores = vectordb.similarity_search_with_score(query, k=8)
-                cache[cache_key] = docs_scores
-            except Exception as e:
-                return {"answer": f"Error searching for relevant content: {str(e)}", "used_timestamps": []}
-        
-        # Filter by score threshold (lower is more similar)
-        threshold = 2.0  # Increased threshold to allow more results
-        docs = [doc for doc, score in docs_scores if score <= threshold][:4]
-        
-        if not docs:
-            return {"answer": "I couldn't find relevant information in the lecture to answer your question. Please try rephrasing your question.", "used_timestamps": []}
-        
-        # --- Context retrieval with relevance scoring ---
-        context = "\n---\n".join([d.page_content for d in docs])
-        # Extract timestamps from metadata
-        timestamps = []
-        for d in docs:
-            if d.metadata.get("timestamp"):
-                timestamps.append(d.metadata["timestamp"])
-            elif d.metadata.get("start_time") is not None:
-                # Format timestamp from seconds
-                start_seconds = d.metadata["start_time"]
-                minutes = int(start_seconds // 60)
-                seconds = int(start_seconds % 60)
-                timestamp_str = f"{minutes:02d}:{seconds:02d}"
-                timestamps.append(timestamp_str)
+        try:
+            with timings.span("embed"):
+                query_embedding = get_embeddings().embed_query(query)
+        except Exception as e:
+            return {"answer": f"Error searching for relevant content: {str(e)}", "used_timestamps": []}
+        # Near-duplicate of a cached question (optional semantic layer)
+        cached_answer = query_cache.get_answer(collection_name, query, query_embedding)
+        if cached_answer is not None:
+            return cached_answer
+        with timings.span("retrieve"):
+            docs_scores = search_chunks(vectordb, collection_name, query, query_embedding)
         
-        # Remove duplicates while preserving order
-        unique_timestamps = list(dict.fromkeys(timestamps))
+        with timings.span("pack"):
+            inputs, unique_timestamps, context_stats = build_prompt_inputs(docs_scores, query)
+        if inputs is None:
+            return {"answer": NO_RESULTS_ANSWER, "used_timestamps": []}
         
         # --- Response generation with OpenAI GPT-4o mini ---
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a helpful lecture assistant. Use the provided context to answer the user's question. Always include relevant timestamps from the context if available. If you cannot answer the question based on the context, say so clearly. When timestamps are available, format them as [MM:SS] in your response."),
-            ("human", "Context:\n{context}\n\nAvailable timestamps: {timestamps}\n\nQuestion: {question}\nAnswer (include timestamps when relevant):")
-        ])
-        
         try:
-            llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
-            chain = prompt | llm
-            response = chain.invoke({
-                "context": context, 
-                "question": query,
-                "timestamps": ", ".join(unique_timestamps) if unique_timestamps else "No timestamps available"
-            })
+            chain = PROMPT | get_llm()
+            with timings.span("generate"):
+                response = chain.invoke(inputs)
             
-            return {
+            result = {
                 "answer": response.content,
-                "used_timestamps": unique_timestamps
+                "used_timestamps": unique_timestamps,
+                "context": context_stats
             }
         except Exception as e:
             return {"answer": f"Error generating response: {str(e)}", "used_timestamps": []}
-            
+        query_cache.put_answer(collection_name, query, result, query_embedding)
+        return result
+    
+    except QueryError as e:
+        return {"answer": str(e), "used_timestamps": []}
     except Exception as e:
         return {"answer": f"Unexpected error: {str(e)}", "used_timestamps": []}
 
-if __name__ == "__main__":
-    # Load job info safely
+def rag_query_batch(video_id, user_queries, max_concurrency=LLM_BATCH_CONCURRENCY):
+    """
+    Answer many questions about one lecture at once.
+
+    Uncached questions are embedded in one embeddings request and searched
+    in one Chroma query; LLM generations run with at most max_concurrency
+    in flight. Returns one dict per question, in input order, shaped like
+    rag_query's result plus "error" (None on success) so a failing item
+    does not fail the batch.
+    """
+    def failed(message):
+        return {"answer": message, "used_timestamps": [], "error": message}
+
+    timings = StageTimings("batch_query")
+    queries = [q.strip() for q in user_queries]
+    results = [None] * len(queries)
+    for i, query in enumerate(queries):
+        if not query:
+            results[i] = failed("Please provide a valid question.")
+    try:
+        with timings.span("resolve"):
+            collection_name, vectordb = resolve_lecture(video_id)
+    except QueryError as e:
+        return [r or failed(str(e)) for r in results]
+
+    # Exact repeats are answered from the cache; duplicates within the batch run once
+    pending = {}
+    for i, query in enumerate(queries):
+        if results[i] is not None:
+            continue
+        cached_answer = query_cache.get_answer(collection_name, query)
+        if cached_answer is not None:
+            results[i] = {**cached_answer, "error": None}
+        else:
+            pending.setdefault(query_cache.normalize_query(query), []).append(i)
+    if not pending:
+        return results
+
+    unique = [queries[indices[0]] for indices in pending.values()]
     try:
-        with open("db.json", "r") as dbf:
-            db = json.load(dbf)
-            jobs = db.get("processing_jobs", [])
-    except FileNotFoundError:
-        print("db.json not found. No jobs to process.")
-        jobs = []
-    except json.JSONDecodeError:
-        print("Invalid JSON in db.json. No jobs to process.")
-        jobs = []
+        with timings.span("embed"):
+            query_embeddings = get_embeddings().embed_documents(unique)
+        with timings.span("retrieve"):
+            docs_scores_list = search_chunks_batch(vectordb, collection_name, unique, query_embeddings)
+    except Exception as e:
+        message = str(e) if isinstance(e, QueryError) else f"Error searching for relevant content: {str(e)}"
+        return [r or failed(message) for r in results]
+
+    answers = {}
+    to_generate = []
+    for query, query_embedding, docs_scores in zip(unique, query_embeddings, docs_scores_list):
+        cached_answer = query_cache.get_answer(collection_name, query, query_embedding)
+        if cached_answer is not None:
+            answers[query] = {**cached_answer, "error": None}
+            continue
+        with timings.span("pack"):
+            inputs, unique_timestamps, context_stats = build_prompt_inputs(docs_scores, query)
+        if inputs is None:
+            answers[query] = {"answer": NO_RESULTS_ANSWER, "used_timestamps": [], "error": None}
+        else:
+            to_generate.append((query, query_embedding, inputs, unique_timestamps, context_stats))
+
+    if to_generate:
+        with timings.span("generate"):
+            responses = (PROMPT | get_llm()).batch(
+                [inputs for _, _, inputs, _, _ in to_generate],
+                config={"max_concurrency": max(1, max_concurrency)},
+                return_exceptions=True
+            )
+        for (query, query_embedding, _, unique_timestamps, context_stats), response in zip(to_generate, responses):
+            if isinstance(response, Exception):
+                answers[query] = failed(f"Error generating response: {str(response)}")
+                continue
+            result = {"answer": response.content, "used_timestamps": unique_timestamps, "context": context_stats}
+            query_cache.put_answer(collection_name, query, result, query_embedding)
+            answers[query] = {**result, "error": None}
+
+    for query, indices in zip(unique, pending.values()):
+        for i in indices:
+            results[i] = answers[query]
+    return results
+
+async def rag_query_stream(video_id, user_query):
+    """
+    Streaming variant of rag_query. Yields event dicts:
+      {"event": "timestamps", "timestamps": [...]} once retrieval is done,
+      {"event": "token", "content": "..."} per answer token,
+      {"event": "done", "answer": "...", "timestamps": [...], "context": {...}} at the end
+      ("context" reports the prompt context's token counts when it was built).
+    Failures are reported like rag_query, as a complete answer.
+    Embedding and generation are awaited on the async clients; only the
+    local Chroma lookup runs in a worker thread.
+    """
+    def complete(result):
+        return [
+            {"event": "timestamps", "timestamps": result["used_timestamps"]},
+            {"event": "token", "content": result["answer"]},
+            {"event": "done", "answer": result["answer"], "timestamps": result["used_timestamps"]},
+        ]
+
+    query = user_query.strip()
+    if not query:
+        for event in complete({"answer": "Please provide a valid question.", "used_timestamps": []}):
+            yield event
+        return
+    timings = StageTimings("stream_query")
+    try:
+        with timings.span("resolve"):
+            collection_name, vectordb = await asyncio.to_thread(resolve_lecture, video_id)
+        cached_answer = query_cache.get_answer(collection_name, query)
+        if cached_answer is None:
+            try:
+                with timings.span("embed"):
+                    query_embedding = await get_embeddings().aembed_query(query)
+            except Exception as e:
+                raise QueryError(f"Error searching for relevant content: {str(e)}")
+            cached_answer = query_cache.get_answer(collection_name, query, query_embedding)
+        if cached_answer is not None:
+            for event in complete(cached_answer):
+                yield event
+            return
+        with timings.span("retrieve"):
+            docs_scores = await asyncio.to_thread(search_chunks, vectordb, collection_name, query, query_embedding)
+        with timings.span("pack"):
+            inputs, unique_timestamps, context_stats = build_prompt_inputs(docs_scores, query)
+        if inputs is None:
+            for event in complete({"answer": NO_RESULTS_ANSWER, "used_timestamps": []}):
+                yield event
+            return
+    except QueryError as e:
+        for event in complete({"answer": str(e), "used_timestamps": []}):
+            yield event
+        return
+
+    # Timestamps are known before the first token, so send them right away
+    yield {"event": "timestamps", "timestamps": unique_timestamps}
+    parts = []
+    generation_started = time.perf_counter()
+    try:
+        async for chunk in (PROMPT | get_llm()).astream(inputs):
+            if chunk.content:
+                if not parts:
+                    timings.add("first_token", time.perf_counter() - generation_started)
+                parts.append(chunk.content)
+                yield {"event": "token", "content": chunk.content}
+        timings.add("generate", time.perf_counter() - generation_started)
+    except Exception as e:
+        error_answer = f"Error generating response: {str(e)}"
+        yield {"event": "token", "content": error_answer}
+        yield {"event": "done", "answer": error_answer, "timestamps": []}
+        return
+    result = {"answer": "".join(parts), "used_timestamps": unique_timestamps, "context": context_stats}
+    query_cache.put_answer(collection_name, query, result, query_embedding)
+    yield {"event": "done", "answer": result["answer"], "timestamps": unique_timestamps, "context": context_stats}
+
+if __name__ == "__main__":
+    # Load completed jobs from the job store
+    job_store.init_db()
     
     # Example usage for completed jobs
-    completed_jobs = [job for job in jobs if job.get("status") == "done"]
+    completed_jobs = job_store.list_jobs(status="done")
     
     if not completed_jobs:
         print("No completed jobs found for testing.")
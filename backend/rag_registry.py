@@ -0,0 +1,193 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+import httpx
+import chromadb
+from langchain_chroma import Chroma
+from langchain_openai import ChatOpenAI
+from embeddings import EMBEDDING_MODEL, embedding_model_id, get_embeddings
+from flat_index import FlatIndex, FlatIndexCache
+import job_store
+import query_cache
+
+# Process-wide clients for the query path: one persistent Chroma client, an
+# LRU of opened collection handles, and a single pooled LLM client. Building
+# these per request used to dominate the latency of cached queries.
+CHROMA_PATH = "chroma_db"
+LLM_MODEL = "gpt-4o-mini"
+COLLECTION_CACHE_SIZE = int(os.getenv("COLLECTION_CACHE_SIZE", "32"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+# Query-time retrieval: "chroma" (HNSW via langchain) or "flat" (exact NumPy index)
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma").lower()
+
+_lock = threading.Lock()
+_chroma_client = None
+_llm = None
+# video_id -> (collection_name, Chroma)
+_vectorstores: "OrderedDict[str, tuple]" = OrderedDict()
+# collection_name -> raw chromadb collection, checked by open_collection
+_collections: "OrderedDict[str, object]" = OrderedDict()
+flat_indexes = FlatIndexCache()
+# collection_name -> version in job_store when this process last used it
+_seen_versions = {}
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+
+
+def get_chroma_client():
+    global _chroma_client
+    with _lock:
+        if _chroma_client is None:
+            _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+        return _chroma_client
+
+
+class EmbeddingModelMismatch(ValueError):
+    """A collection holds vectors from a different embedding model than the configured one."""
+
+
+def open_collection(collection_name: str):
+    """
+    Get or create a lecture's chromadb collection and check that it was built
+    with the configured embedding model, recording the model on first use.
+    Mixing models in one collection would make similarity scores meaningless.
+    """
+    collection = get_chroma_client().get_or_create_collection(collection_name)
+    model_id = embedding_model_id()
+    metadata = dict(collection.metadata or {})
+    recorded = metadata.get("embedding_model")
+    if recorded is None:
+        # Collections from before this field existed were always embedded with OpenAI
+        recorded = EMBEDDING_MODEL if collection.count() else model_id
+        if recorded == model_id:
+            collection.modify(metadata={**metadata, "embedding_model": model_id})
+    if recorded != model_id:
+        raise EmbeddingModelMismatch(
+            f"Collection {collection_name} was embedded with {recorded}, but the configured "
+            f"embedding model is {model_id}. Reprocess the lecture after clearing its data, "
+            f"or switch EMBEDDING_BACKEND back."
+        )
+    return collection
+
+
+def get_collection(collection_name: str):
+    """Cached raw chromadb collection of a lecture, opened (and checked) with open_collection on first use."""
+    with _lock:
+        collection = _collections.get(collection_name)
+        if collection is not None:
+            _collections.move_to_end(collection_name)
+            return collection
+    collection = open_collection(collection_name)
+    with _lock:
+        _collections[collection_name] = collection
+        _collections.move_to_end(collection_name)
+        while len(_collections) > COLLECTION_CACHE_SIZE:
+            _collections.popitem(last=False)
+    return collection
+
+
+def get_flat_index(collection_name: str) -> FlatIndex:
+    """A lecture's chunks as a cached FlatIndex, loaded from Chroma on first use."""
+    return flat_indexes.get(
+        collection_name,
+        lambda: FlatIndex.from_collection(open_collection(collection_name))
+    )
+
+
+def get_vectorstore(video_id: str, collection_name: str):
+    """
+    Return the cached retriever for a lecture, opening it on first use: a
+    Chroma handle, or a FlatIndex when RETRIEVER_BACKEND is "flat". Both
+    answer similarity_search_by_vector_with_relevance_scores.
+    """
+    if RETRIEVER_BACKEND == "flat":
+        return get_flat_index(collection_name)
+    with _lock:
+        entry = _vectorstores.get(video_id)
+        if entry is not None and entry[0] == collection_name:
+            _vectorstores.move_to_end(video_id)
+            return entry[1]
+    get_collection(collection_name)
+    vectordb = Chroma(
+        client=get_chroma_client(),
+        collection_name=collection_name,
+        embedding_function=get_embeddings()
+    )
+    with _lock:
+        _vectorstores[video_id] = (collection_name, vectordb)
+        _vectorstores.move_to_end(video_id)
+        while len(_vectorstores) > COLLECTION_CACHE_SIZE:
+            _vectorstores.popitem(last=False)
+    return vectordb
+
+
+def get_llm() -> ChatOpenAI:
+    """Shared chat model with pooled keep-alive HTTP connections."""
+    global _llm
+    with _lock:
+        if _llm is None:
+            _llm = ChatOpenAI(
+                model=LLM_MODEL,
+                temperature=0.2,
+                http_client=httpx.Client(limits=http_limits()),
+                http_async_client=httpx.AsyncClient(limits=http_limits())
+            )
+        return _llm
+
+
+def invalidate_collection(collection_name: Optional[str] = None):
+    """
+    Drop cached handles, flat indexes (including its window levels), its
+    rows in the cross-lecture index and cached query results for one
+    collection (e.g. after a lecture is reprocessed), or for every
+    collection when no name is given.
+    """
+    from window_index import WINDOW_LEVELS, window_collection_name
+    from corpus_index import corpus
+    query_cache.invalidate(collection_name)
+    corpus.invalidate(collection_name)
+    flat_indexes.invalidate(collection_name)
+    if collection_name is not None:
+        for seconds in WINDOW_LEVELS:
+            flat_indexes.invalidate(window_collection_name(collection_name, seconds))
+    with _lock:
+        if collection_name is None:
+            _vectorstores.clear()
+            _collections.clear()
+            return
+        _collections.pop(collection_name, None)
+        for video_id in [v for v, (name, _) in _vectorstores.items() if name == collection_name]:
+            del _vectorstores[video_id]
+
+
+def publish_collection_change(collection_name: str):
+    """
+    Record that a collection was (re)indexed: bump its version for every
+    process and drop this process's cached state for it right away.
+    """
+    version = job_store.bump_collection_version(collection_name)
+    with _lock:
+        _seen_versions[collection_name] = version
+    invalidate_collection(collection_name)
+
+
+def sync_collections(collection_names):
+    """
+    Drop this process's cached state for collections reindexed elsewhere
+    (another uvicorn worker or host) since they were last used here. Call
+    before serving a collection from any per-process cache.
+    """
+    names = list(collection_names)
+    versions = job_store.get_collection_versions(names)
+    stale = []
+    with _lock:
+        for name in names:
+            version = versions.get(name)
+            if name in _seen_versions and _seen_versions[name] != version:
+                stale.append(name)
+            _seen_versions[name] = version
+    for name in stale:
+        invalidate_collection(name)
@@ -0,0 +1,153 @@
+import os
+import socket
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+import job_store
+from metrics import QUEUE_DEPTH
+
+# Durable ingest queue: jobs live in the job store with status 'queued' and
+# INGEST_WORKERS tasks per process claim and run them one at a time. Several
+# uvicorn workers (or hosts sharing jobs.db) can serve the same queue, since
+# claims are atomic in SQLite.
+INGEST_WORKERS = max(1, int(os.getenv("INGEST_WORKERS", "2")))
+# Idle workers also poll, to pick up jobs queued by other processes
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "2"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# A processing job whose worker has not sent a heartbeat for this long is requeued
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+
+# Unique per process start, so a restarted server never mistakes a crashed
+# predecessor's claims (same host, possibly the same pid) for its own
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def owner_is_gone(claimed_by: Optional[str]) -> bool:
+    """True if the process that claimed a job is known to have exited."""
+    if not claimed_by:
+        # Claimed before the scheduler existed (BackgroundTasks), never resumed
+        return True
+    if claimed_by == WORKER_ID:
+        return False
+    host, pid, _ = claimed_by.rsplit(":", 2)
+    if host != socket.gethostname():
+        # Can't see other hosts' processes; only heartbeats tell
+        return False
+    if int(pid) == os.getpid():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def heartbeat_is_stale(heartbeat_at: Optional[str]) -> bool:
+    if not heartbeat_at:
+        return True
+    last = datetime.fromisoformat(heartbeat_at.rstrip("Z"))
+    return datetime.utcnow() - last > timedelta(seconds=JOB_STALE_SECONDS)
+
+
+def recover_jobs() -> list:
+    """Requeue jobs left running by a crashed or restarted worker; returns their filenames."""
+    recovered = []
+    for job in job_store.list_jobs(status=job_store.RUNNING_STATUSES):
+        if job["alias_of"] or job["claimed_by"] == WORKER_ID:
+            continue
+        if owner_is_gone(job["claimed_by"]) or heartbeat_is_stale(job["heartbeat_at"]):
+            if job_store.requeue_job(job["filename"], job["claimed_by"]):
+                recovered.append(job["filename"])
+    if recovered:
+        print(f"Requeued {len(recovered)} interrupted jobs: {', '.join(recovered)}")
+    return recovered
+
+
+class Scheduler:
+    """Runs queued jobs on a fixed number of worker tasks."""
+
+    def __init__(self, run_job: Callable[[str], Awaitable[None]], workers: int = INGEST_WORKERS):
+        self.run_job = run_job
+        self.workers = workers
+        self.running = {}  # filename -> worker number
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self.loop = None  # event loop running the workers, set by start()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        recover_jobs()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        print(f"Scheduler {WORKER_ID} started with {self.workers} workers, {job_store.queue_depth()} jobs queued")
+
+    async def stop(self):
+        interrupted = list(self.running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Interrupted jobs keep their place in the queue for the next start
+        for filename in interrupted:
+            job_store.requeue_job(filename, WORKER_ID)
+
+    def notify(self):
+        """Wake idle workers after a job was queued. Safe to call from any thread."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self.loop is not None and running is not self.loop:
+            # e.g. a sync endpoint on the threadpool; asyncio.Event is not thread-safe
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        else:
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": WORKER_ID,
+            "workers": self.workers,
+            "running": sorted(self.running),
+            "depth": job_store.queue_depth(),
+        }
+
+    async def _worker(self, number: int):
+        while True:
+            # Cleared before claiming, so a notify() that races the claim is not lost
+            self._wakeup.clear()
+            try:
+                job = job_store.claim_next_job(WORKER_ID)
+            except Exception as e:
+                print(f"Scheduler worker {number} could not claim a job: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), SCHEDULER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            filename = job["filename"]
+            self.running[filename] = number
+            try:
+                await self.run_job(filename)
+            except Exception as e:
+                # run_job records its own failures; this is a last resort
+                job_store.update_job(filename, status="error", progress=0, error=str(e))
+            finally:
+                self.running.pop(filename, None)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                job_store.heartbeat_jobs(list(self.running))
+                # Also picks up jobs from other processes that stopped heartbeating
+                recover_jobs()
+            except Exception as e:
+                print(f"Scheduler heartbeat failed: {e}")
+
+
+QUEUE_DEPTH.set_function(job_store.queue_depth)
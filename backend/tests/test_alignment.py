@@ -0,0 +1,68 @@
+import random
+
+from vector_pipeline import build_alignment_index, chunk_documents
+from word_timeline import build_timeline
+
+WORDS = "the model learns a gradient and the loss goes down so we train again".split()
+
+
+def timeline_for(words, seconds_per_word=0.5):
+    starts = [i * seconds_per_word for i in range(len(words))]
+    return build_timeline(words, starts, [start + seconds_per_word * 0.8 for start in starts])
+
+
+def chunk_starts(transcript, alignment):
+    docs, _ = chunk_documents(transcript, alignment, "lecture.mp4")
+    return [doc.metadata["start_time"] for doc in docs]
+
+
+def test_long_repetitive_transcript_gets_monotonic_exact_timestamps():
+    # The same short sentence thousands of times: every word occurs everywhere
+    words = WORDS * 2000
+    transcript = " ".join(words)
+    alignment = build_alignment_index(transcript, timeline_for(words))
+    assert len(alignment["word_indices"]) == len(words)
+    docs, offsets = chunk_documents(transcript, alignment, "lecture.mp4")
+    starts = [doc.metadata["start_time"] for doc in docs]
+    assert len(docs) > 100
+    assert starts == sorted(starts)
+    for doc, offset in zip(docs, offsets):
+        # Chunks start on a word, so their start time is that word's
+        word_index = len(transcript[:offset].split())
+        assert doc.metadata["start_time"] == word_index * 0.5
+
+
+def test_words_missing_from_text_are_skipped():
+    random.seed(7)
+    words = [random.choice(WORDS) for _ in range(3000)]
+    # Whisper's word list has a few extra words that are not in its text
+    inserted = (10, 1000, 2000, 2900)
+    timeline_words = list(words)
+    for position in sorted(inserted, reverse=True):
+        timeline_words.insert(position, "um")
+    transcript = " ".join(words)
+    alignment = build_alignment_index(transcript, timeline_for(timeline_words))
+    assert len(alignment["word_indices"]) == len(words)
+    docs, offsets = chunk_documents(transcript, alignment, "lecture.mp4")
+    for doc, offset in zip(docs, offsets):
+        word_index = len(transcript[:offset].split())
+        word_index += sum(1 for position in inserted if position <= word_index)
+        assert doc.metadata["start_time"] == word_index * 0.5
+
+
+def test_alignment_resyncs_after_text_without_words():
+    random.seed(3)
+    before = [random.choice(WORDS) for _ in range(500)]
+    after = [random.choice(WORDS) for _ in range(500)]
+    # A segment with text but no word timestamps, far longer than the search window
+    transcript = " ".join(before + ["applause"] * 300 + after)
+    words = before + after
+    alignment = build_alignment_index(transcript, timeline_for(words))
+    # Only the words before the resync are lost
+    assert len(alignment["word_indices"]) >= len(words) - 10
+    docs, offsets = chunk_documents(transcript, alignment, "lecture.mp4")
+    assert docs[-1].metadata["start_time"] > len(before) * 0.5
+    for doc, offset in zip(docs, offsets):
+        # Time of the first timed word at or after the chunk start
+        word_index = sum(1 for word in transcript[:offset].split() if word != "applause")
+        assert abs(doc.metadata["start_time"] - word_index * 0.5) <= 5.0
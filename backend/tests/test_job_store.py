@@ -0,0 +1,30 @@
+import pytest
+
+import job_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # init_db also imports a db.json from the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(job_store, "DB_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(job_store, "_local", type(job_store._local)())
+    job_store.init_db()
+    return job_store
+
+
+def test_alias_follows_its_original(store):
+    store.add_job("lecture.mp4", content_hash="abc")
+    store.update_job("lecture.mp4", status="processing", progress=40)
+    alias = store.add_alias("copy.mp4", store.get_job("lecture.mp4"))
+    assert (alias["status"], alias["progress"], alias["alias_of"]) == ("processing", 40, "lecture.mp4")
+    store.update_job("lecture.mp4", status="done", progress=100)
+    assert store.get_job("copy.mp4")["status"] == "done"
+
+
+def test_alias_of_partially_available_lecture_reports_its_coverage(store):
+    store.add_job("lecture.mp4", content_hash="abc")
+    store.update_job("lecture.mp4", status="partially_available", coverage={"end": 600.0})
+    alias = store.add_alias("copy.mp4", store.get_job("lecture.mp4"))
+    assert alias["status"] == "partially_available"
+    assert alias["coverage"] == {"end": 600.0}
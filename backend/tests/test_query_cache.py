@@ -0,0 +1,40 @@
+import pytest
+
+import query_cache
+from query_cache import LRUCache, SemanticIndex
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    semantic = SemanticIndex(threshold=0.9)
+    answers = LRUCache(1 << 20, 3600, on_evict=semantic.remove)
+    monkeypatch.setattr(query_cache, "semantic_index", semantic)
+    monkeypatch.setattr(query_cache, "answer_cache", answers)
+    monkeypatch.setattr(query_cache, "SEMANTIC_CACHE_ENABLED", True)
+    return answers, semantic
+
+
+def lookup(query, embedding):
+    """Both lookups of one request, as rag_query does them."""
+    return query_cache.get_answer("lec", query) or query_cache.get_answer("lec", query, embedding)
+
+
+def test_each_request_counts_one_lookup(caches):
+    answers, semantic = caches
+    assert lookup("what is entropy", [1.0, 0.0]) is None
+    query_cache.put_answer("lec", "what is entropy", {"answer": "a"}, [1.0, 0.0])
+    assert lookup("What is  entropy", [1.0, 0.0]) == {"answer": "a"}
+    assert lookup("what's entropy", [0.99, 0.05]) == {"answer": "a"}
+    assert lookup("who is shannon", [0.0, 1.0]) is None
+    assert (answers.hits, answers.misses) == (2, 2)
+    assert semantic.hits == 1
+
+
+def test_semantic_match_without_cached_answer_is_a_miss(caches):
+    answers, semantic = caches
+    # Already expired: the semantic index still points at it until a get removes it
+    answers.ttl_seconds = -1
+    query_cache.put_answer("lec", "what is entropy", {"answer": "a"}, [1.0, 0.0])
+    assert lookup("what's entropy", [0.99, 0.05]) is None
+    assert (answers.hits, answers.misses) == (0, 1)
+    assert semantic.hits == 0
@@ -0,0 +1,171 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Optional
+import numpy as np
+import ffmpeg
+from openai import OpenAI
+from audio_processing import MAX_TRANSCRIBE_BYTES
+from word_timeline import WordTimeline, build_timeline
+
+# Speech-to-text engines behind one interface. Each returns the transcript
+# text plus a word timeline in the format the rest of the pipeline stores.
+#   openai          whisper-1 over the API (25 MB request limit, so long
+#                   lectures are split into segments)
+#   faster-whisper  local CPU Whisper via CTranslate2, int8 by default; no
+#                   size limit, so a lecture is transcribed in one pass
+#   fake            deterministic words from the audio duration, no model;
+#                   used to benchmark the rest of the pipeline offline
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "openai").lower()
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "small")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 = CTranslate2 default
+FAKE_WORDS_PER_SECOND = float(os.getenv("FAKE_WORDS_PER_SECOND", "2.5"))
+# Simulated processing time as a fraction of audio duration (0 = instant)
+FAKE_REAL_TIME_FACTOR = float(os.getenv("FAKE_REAL_TIME_FACTOR", "0"))
+
+
+class Transcription:
+    """Transcript text, its word timeline, and the seconds of audio it covers."""
+
+    def __init__(self, text: str, timeline: WordTimeline, duration: float):
+        self.text = text
+        self.timeline = timeline
+        self.duration = duration
+
+    def shifted(self, offset: float) -> WordTimeline:
+        """The word timeline moved by offset seconds (a segment's start in the lecture)."""
+        return WordTimeline(
+            np.asarray(self.timeline.starts, dtype=np.float32) + np.float32(offset),
+            np.asarray(self.timeline.ends, dtype=np.float32) + np.float32(offset),
+            self.timeline.word_ids,
+            self.timeline.vocab,
+        )
+
+
+def probe_duration(audio_path: str) -> float:
+    return float(ffmpeg.probe(audio_path)["format"]["duration"])
+
+
+class Transcriber:
+    """Base class. max_file_bytes is the largest file one call accepts (None = no limit)."""
+
+    name = "base"
+    max_file_bytes: Optional[int] = None
+
+    def transcribe(self, audio_path: str) -> Transcription:
+        raise NotImplementedError
+
+
+class OpenAITranscriber(Transcriber):
+    name = "openai"
+    max_file_bytes = MAX_TRANSCRIBE_BYTES
+
+    def __init__(self):
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def transcribe(self, audio_path: str) -> Transcription:
+        with open(audio_path, "rb") as audio_file:
+            whisper_response = self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                response_format="verbose_json",
+                timestamp_granularities=["word"]
+            )
+        words = getattr(whisper_response, "words", None) or []
+        timeline = build_timeline(
+            (word.word for word in words),
+            (word.start for word in words),
+            (word.end for word in words),
+        )
+        duration = getattr(whisper_response, "duration", None)
+        if duration is None:
+            duration = probe_duration(audio_path)
+        return Transcription(whisper_response.text, timeline, float(duration))
+
+
+class FasterWhisperTranscriber(Transcriber):
+    name = "faster-whisper"
+
+    def __init__(self, model_size: str = WHISPER_MODEL, compute_type: str = WHISPER_COMPUTE_TYPE,
+                 cpu_threads: int = WHISPER_CPU_THREADS):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from faster_whisper import WhisperModel
+                self._model = WhisperModel(
+                    self.model_size,
+                    device="cpu",
+                    compute_type=self.compute_type,
+                    cpu_threads=self.cpu_threads
+                )
+            return self._model
+
+    def transcribe(self, audio_path: str) -> Transcription:
+        segments, info = self.model.transcribe(audio_path, word_timestamps=True)
+        texts, words = [], []
+        # segments is a generator; decoding happens while iterating
+        for segment in segments:
+            texts.append(segment.text.strip())
+            words.extend(segment.words or [])
+        timeline = build_timeline(
+            (word.word.strip() for word in words),
+            (word.start for word in words),
+            (word.end for word in words),
+        )
+        return Transcription(" ".join(t for t in texts if t), timeline, float(info.duration))
+
+
+class FakeTranscriber(Transcriber):
+    """Evenly spaced words from a fixed vocabulary, seeded by the audio's duration."""
+
+    name = "fake"
+    # Keep the API's limit so the same segmenting path is exercised
+    max_file_bytes = MAX_TRANSCRIBE_BYTES
+    VOCABULARY = (
+        "today we discuss gradient descent and how the learning rate controls each step "
+        "of optimisation we then look at regularisation overfitting and validation data "
+        "before an example that trains a small neural network on images"
+    ).split()
+
+    def transcribe(self, audio_path: str) -> Transcription:
+        duration = probe_duration(audio_path)
+        if FAKE_REAL_TIME_FACTOR > 0:
+            time.sleep(duration * FAKE_REAL_TIME_FACTOR)
+        count = int(duration * FAKE_WORDS_PER_SECOND)
+        seed = int.from_bytes(hashlib.sha256(f"{duration:.3f}".encode()).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+        words = [self.VOCABULARY[i] for i in rng.integers(0, len(self.VOCABULARY), size=count)]
+        step = 1.0 / FAKE_WORDS_PER_SECOND
+        starts = np.arange(count, dtype=np.float32) * step
+        timeline = build_timeline(words, starts, starts + np.float32(step * 0.8))
+        return Transcription(" ".join(words), timeline, duration)
+
+
+TRANSCRIBERS = {
+    "openai": OpenAITranscriber,
+    "faster-whisper": FasterWhisperTranscriber,
+    "fake": FakeTranscriber,
+}
+
+_transcriber: Optional[Transcriber] = None
+_transcriber_lock = threading.Lock()
+
+
+def get_transcriber() -> Transcriber:
+    """Process-wide transcription backend selected by TRANSCRIPTION_BACKEND."""
+    global _transcriber
+    with _transcriber_lock:
+        if _transcriber is None:
+            if TRANSCRIPTION_BACKEND not in TRANSCRIBERS:
+                raise ValueError(f"Unknown TRANSCRIPTION_BACKEND: {TRANSCRIPTION_BACKEND}")
+            _transcriber = TRANSCRIBERS[TRANSCRIPTION_BACKEND]()
+        return _transcriber
@@ -1,126 +1,176 @@
 import os
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain.docstore.document import Document
-import json
+from embeddings import get_embeddings
+from rag_registry import open_collection, publish_collection_change
+from metrics import CHUNKS_EMBEDDED, StageTimings
+from window_index import drop_levels, write_levels
+import hashlib
+import uuid
 import glob
 import re
+from bisect import bisect_left
+from word_timeline import (
+    WordTimeline,
+    concat_timelines,
+    convert_detailed_json,
+    load_timeline,
+    save_timeline,
+    timeline_path,
+)
 
 # CONFIGURABLE PARAMETERS
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 150
-CHROMA_PATH = "chroma_db"
+# How far past the previous aligned word (in characters) to look for the next one
+ALIGN_SEARCH_WINDOW = 200
+# Consecutive misses after which the next words are searched for anywhere ahead
+ALIGN_RESYNC_MISSES = 8
+# Words that must appear in sequence in the text for such a match
+ALIGN_RESYNC_PHRASE = 3
 
-def find_timestamp_for_text(text_chunk: str, words_with_timestamps: list) -> dict:
+def sanitize_collection_name(name: str) -> str:
+    # Remove invalid characters, replace spaces and periods, ensure valid start/end
+    name = re.sub(r'[^a-zA-Z0-9._-]', '_', name)
+    name = re.sub(r'^[^a-zA-Z0-9]+', '', name)  # Remove invalid start
+    name = re.sub(r'[^a-zA-Z0-9]+$', '', name)  # Remove invalid end
+    name = re.sub(r'\.[^.]+$', '', name)  # Remove file extension
+    return name
+
+def artifact_key(filename: str, content_hash: str = None) -> str:
+    """
+    Base name for a lecture's audio/transcript files in uploads/.
+    Content-addressed lectures share artifacts by hash; legacy ones use the filename.
+    """
+    return content_hash or os.path.splitext(filename)[0]
+
+def collection_name_for(video_id: str, content_hash: str = None) -> str:
+    """Chroma collection holding a lecture's chunks (keyed by content hash when known)."""
+    if content_hash:
+        # Chroma names are limited to 63 chars; 128 bits of the hash is plenty
+        return f"lecture_{content_hash[:32]}"
+    return f"lecture_{sanitize_collection_name(video_id)}"
+
+def normalize_word(word: str) -> str:
+    return word.strip().lower().strip('.,!?";:')
+
+def resync_pattern(tokens: list, i: int):
+    """Regex for up to ALIGN_RESYNC_PHRASE consecutive words from tokens[i], separated by non-word text."""
+    phrase = [token for token in tokens[i:i + 4 * ALIGN_RESYNC_PHRASE] if token][:ALIGN_RESYNC_PHRASE]
+    return re.compile(r"(?<!\w)" + r"\W+".join(re.escape(token) for token in phrase))
+
+def build_alignment_index(transcript: str, timeline: WordTimeline) -> dict:
     """
-    Find the start and end timestamps for a given text chunk
+    Map character offsets in the transcript to word timestamps.
+
+    Walks the transcript and the word timeline together once, locating
+    each word at or shortly after the previous match, so cost is linear in
+    transcript length. Words that cannot be found nearby (text/word list
+    mismatches) are skipped. After ALIGN_RESYNC_MISSES misses in a row the
+    text and word list have drifted apart (e.g. a segment with text but no
+    words), so the next few words are searched for as a phrase anywhere
+    ahead; failed attempts back off exponentially to keep cost near-linear.
     """
-    # Clean the text chunk for matching
-    chunk_words = text_chunk.strip().split()
-    if not chunk_words:
+    # Per-character lowercase keeps offsets identical to the original text
+    lowered = "".join(c.lower() if len(c.lower()) == 1 else c for c in transcript)
+    # The vocabulary is interned, so each distinct word is normalized once
+    normalized_vocab = [normalize_word(str(word)) for word in timeline.vocab]
+    tokens = [normalized_vocab[word_id] for word_id in timeline.word_ids.tolist()]
+    char_offsets = []
+    word_indices = []
+    pos = 0
+    misses = 0
+    next_resync = ALIGN_RESYNC_MISSES
+    for i, token in enumerate(tokens):
+        if not token:
+            continue
+        limit = pos + ALIGN_SEARCH_WINDOW + len(token)
+        idx = lowered.find(token, pos, limit)
+        # Require a word boundary so "a" does not match inside "and"
+        while idx > 0 and lowered[idx - 1].isalnum():
+            idx = lowered.find(token, idx + 1, limit)
+        if idx < 0 and misses + 1 >= next_resync:
+            match = resync_pattern(tokens, i).search(lowered, pos)
+            if match:
+                idx = match.start()
+            else:
+                next_resync *= 2
+        if idx < 0:
+            misses += 1
+            continue
+        char_offsets.append(idx)
+        word_indices.append(i)
+        pos = idx + len(token)
+        misses = 0
+        next_resync = ALIGN_RESYNC_MISSES
+    return {"char_offsets": char_offsets, "word_indices": word_indices, "timeline": timeline}
+
+def find_timestamp_for_span(alignment: dict, start_char: int, end_char: int) -> dict:
+    """
+    Find the start and end timestamps for the transcript span [start_char, end_char)
+    """
+    offsets = alignment["char_offsets"]
+    if not offsets:
         return {"start": 0, "end": 0}
-    
-    # Find the first word of the chunk in the timestamp data
-    first_word = chunk_words[0].lower().strip('.,!?";')
-    last_word = chunk_words[-1].lower().strip('.,!?";')
-    
-    start_time = None
-    end_time = None
-    
-    # Find start time
-    for word_data in words_with_timestamps:
-        if word_data["word"].lower().strip('.,!?";') == first_word:
-            start_time = word_data["start"]
-            break
-    
-    # Find end time (search from the end)
-    for word_data in reversed(words_with_timestamps):
-        if word_data["word"].lower().strip('.,!?";') == last_word:
-            end_time = word_data["end"]
-            break
-    
+    # First word starting inside the span, last word starting before its end
+    first = min(bisect_left(offsets, start_char), len(offsets) - 1)
+    last = max(bisect_left(offsets, end_char) - 1, first)
+    timeline = alignment["timeline"]
     return {
-        "start": start_time or 0,
-        "end": end_time or 0
+        "start": float(timeline.starts[alignment["word_indices"][first]]),
+        "end": float(timeline.ends[alignment["word_indices"][last]])
     }
 
+def load_word_timeline(base_name: str) -> WordTimeline:
+    """
+    Load a transcript's word timeline, converting legacy *_detailed.json
+    files (combined, or per chunk) to the columnar format if needed.
+    """
+    path = timeline_path(base_name)
+    if not os.path.exists(path):
+        combined_json = f"{base_name}_detailed.json"
+        if os.path.exists(combined_json):
+            convert_detailed_json(combined_json)
+        else:
+            chunk_timelines = []
+            for chunk_json in sorted(glob.glob(f"{base_name}_chunk_*_detailed.json")):
+                chunk_timelines.append(load_timeline(convert_detailed_json(chunk_json)))
+            save_timeline(path, concat_timelines(chunk_timelines))
+    return load_timeline(path)
+
+def chunk_id(chunk_index: int, text: str) -> str:
+    """Stable vector ID for a chunk, so reprocessing upserts instead of appending."""
+    return hashlib.sha256(f"{chunk_index}:{text}".encode("utf-8")).hexdigest()[:32]
+
 def format_timestamp(seconds: float) -> str:
     """Convert seconds to MM:SS format"""
     minutes = int(seconds // 60)
     secs = int(seconds % 60)
     return f"{minutes:02d}:{secs:02d}"
 
-def process_transcript(filename: str):
-    import os
-    import json
-    import glob
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain_chroma import Chroma
-    from langchain_openai import OpenAIEmbeddings
-    from langchain.docstore.document import Document
-
-    CHUNK_SIZE = 800
-    CHUNK_OVERLAP = 150
-    CHROMA_PATH = "chroma_db"
-
-    db_path = "db.json"
-    transcript_path = os.path.join("uploads", f"{os.path.splitext(filename)[0]}.transcript.txt")
-    base_name = os.path.splitext(transcript_path)[0]
-    video_id = filename
-
-    import re
-    def sanitize_collection_name(name: str) -> str:
-        # Remove invalid characters, replace spaces and periods, ensure valid start/end
-        name = re.sub(r'[^a-zA-Z0-9._-]', '_', name)
-        name = re.sub(r'^[^a-zA-Z0-9]+', '', name)  # Remove invalid start
-        name = re.sub(r'[^a-zA-Z0-9]+$', '', name)  # Remove invalid end
-        name = re.sub(r'\.[^.]+$', '', name)  # Remove file extension
-        return name
-    sanitized_collection = f"lecture_{sanitize_collection_name(video_id)}"
-
-    if not os.path.exists(transcript_path):
-        print(f"Transcript not found for {filename}")
-        return
-
-    # Read the main transcript
-    with open(transcript_path, "r", encoding="utf-8") as tf:
-        transcript = tf.read()
-
-    # Collect all timestamp data from detailed transcripts
-    all_words_with_timestamps = []
-    
-    # Check for detailed transcript files (both single file and chunked)
-    detailed_files = glob.glob(f"{base_name}_detailed.json") + glob.glob(f"{base_name}_chunk_*_detailed.json")
-    
-    if detailed_files:
-        for detailed_file in sorted(detailed_files):
-            try:
-                with open(detailed_file, "r", encoding="utf-8") as f:
-                    detailed_data = json.load(f)
-                    if "words" in detailed_data:
-                        all_words_with_timestamps.extend(detailed_data["words"])
-            except Exception as e:
-                print(f"Error reading {detailed_file}: {e}")
-    
-    print(f"Found {len(all_words_with_timestamps)} words with timestamps")
-
-    # Chunk transcript
+def chunk_documents(text: str, alignment: dict, video_id: str, content_hash: str = None,
+                    char_offset: int = 0, first_index: int = 0) -> tuple:
+    """
+    Split transcript text into timestamped chunk Documents. text starts at
+    char_offset in the transcript that alignment was built for; chunks are
+    numbered from first_index. Returns (docs, start offsets in the transcript).
+    """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP
+        chunk_overlap=CHUNK_OVERLAP,
+        add_start_index=True
     )
-    chunks = splitter.create_documents([transcript])
-    
-    # Attach metadata including timestamps
     docs = []
-    for i, chunk in enumerate(chunks):
-        # Find timestamp for this chunk
-        timestamp_info = find_timestamp_for_text(chunk.page_content, all_words_with_timestamps)
+    starts = []
+    for i, chunk in enumerate(splitter.create_documents([text])):
+        # Find timestamp for this chunk from its character span
+        start_char = char_offset + chunk.metadata.get("start_index", 0)
+        timestamp_info = find_timestamp_for_span(alignment, start_char, start_char + len(chunk.page_content))
         
         metadata = {
             "video_id": video_id,
-            "chunk_index": i,
+            "content_hash": content_hash or "",
+            "chunk_index": first_index + i,
             "start_time": timestamp_info["start"],
             "end_time": timestamp_info["end"],
             "timestamp": format_timestamp(timestamp_info["start"]),
@@ -128,24 +178,166 @@ def process_transcript(filename: str):
         }
         
         docs.append(Document(page_content=chunk.page_content, metadata=metadata))
+        starts.append(start_char)
+    return docs, starts
+
+def upsert_documents(collection, docs: list, timings: StageTimings) -> list:
+    """
+    Embed chunk Documents and upsert them under their stable IDs; returns the IDs.
+    Embedding and the write are separate calls so each can be timed.
+    """
+    ids = [chunk_id(doc.metadata["chunk_index"], doc.page_content) for doc in docs]
+    texts = [doc.page_content for doc in docs]
+    with timings.span("embedding"):
+        vectors = get_embeddings().embed_documents(texts) if docs else []
+    with timings.span("vector_write"):
+        if docs:
+            collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                documents=texts,
+                metadatas=[doc.metadata for doc in docs]
+            )
+    CHUNKS_EMBEDDED.inc(len(docs))
+    return ids
+
+def process_transcript(filename: str, content_hash: str = None, timings: StageTimings = None):
+    key = artifact_key(filename, content_hash)
+    transcript_path = os.path.join("uploads", f"{key}.transcript.txt")
+    base_name = os.path.splitext(transcript_path)[0]
+    video_id = filename
+    sanitized_collection = collection_name_for(video_id, content_hash)
+    # Stages are added to the caller's job timings when given
+    timings = timings or StageTimings("ingest")
+
+    if not os.path.exists(transcript_path):
+        print(f"Transcript not found for {filename}")
+        return
+
+    with timings.span("load_transcript"):
+        # Read the main transcript
+        with open(transcript_path, "r", encoding="utf-8") as tf:
+            transcript = tf.read()
+
+        # Load the word timeline (memory-mapped); convert legacy JSON on first use
+        timeline = load_word_timeline(base_name)
+    print(f"Found {len(timeline)} words with timestamps")
+
+    with timings.span("chunking"):
+        alignment = build_alignment_index(transcript, timeline)
+        docs, _ = chunk_documents(transcript, alignment, video_id, content_hash)
     
-    # Store in ChromaDB
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    vectordb = Chroma(
-        collection_name=sanitized_collection,
-        embedding_function=embeddings,
-        persist_directory=CHROMA_PATH
-    )
-    vectordb.add_documents(docs)
-    print(f"Processed and stored {len(docs)} chunks with timestamps for {video_id}")
+    # Store in ChromaDB. Deterministic IDs make this an idempotent upsert, and
+    # unchanged chunks are served from the embedding cache. Refuses to add
+    # vectors from a different embedding model than the collection holds.
+    collection = open_collection(sanitized_collection)
+    ids = upsert_documents(collection, docs, timings)
+    with timings.span("vector_write"):
+        # Drop chunks from an earlier run that no longer exist (e.g. CHUNK_SIZE changed)
+        stale_ids = set(collection.get(include=[])["ids"]) - set(ids)
+        if stale_ids:
+            collection.delete(ids=list(stale_ids))
+    print(f"Processed and stored {len(docs)} chunks with timestamps for {video_id} ({len(stale_ids)} stale removed)")
+    with timings.span("windows"):
+        # Coarse time-window levels for coarse-to-fine retrieval
+        windows = write_levels(sanitized_collection, timeline)
+    print(f"Stored {windows} time windows for {video_id}")
+    # Query-side handles and caches for this lecture, in every process, must be refreshed
+    publish_collection_change(sanitized_collection)
     
     # Don't cleanup transcript files during development - keep them for debugging
     print(f"Transcript files preserved for debugging")
     # Cleanup only audio files to save space
     try:
-        audio_path = os.path.join("uploads", f"{os.path.splitext(filename)[0]}.mp3")
+        audio_path = os.path.join("uploads", f"{key}.mp3")
         if os.path.exists(audio_path):
             os.remove(audio_path)
             print(f"Cleaned up audio file: {audio_path}")
     except Exception as cleanup_err:
         print(f"Cleanup error: {cleanup_err}")
+
+class IncrementalIndexer:
+    """
+    Indexes a lecture while it is still being transcribed, one transcribed
+    prefix of audio segments at a time.
+
+    Each pass re-splits the transcript from the start of the last chunk it
+    held back. Every chunk except the last one is final at that point, so it
+    is embedded and upserted. The last chunk may still grow with the next
+    segment's words, so it is carried over to the next pass. Chunks that
+    straddle a segment boundary are therefore written once, never
+    duplicated, though chunks near a boundary may be cut differently than
+    in a one-shot split (splitting resumes at the held-back chunk's start).
+    state is JSON-serializable and is kept in the job's checkpoint.
+    """
+
+    def __init__(self, filename: str, content_hash: str = None, state: dict = None):
+        self.video_id = filename
+        self.content_hash = content_hash
+        self.collection_name = collection_name_for(filename, content_hash)
+        self.state = state or {
+            "segments": 0,         # segments consumed so far
+            "carry_start": 0,      # transcript offset of the held-back chunk
+            "next_chunk_index": 0,
+            "covered_until": 0.0,  # end time of the last indexed chunk
+            "run": uuid.uuid4().hex,
+        }
+
+    def index(self, texts: list, timelines: list, final: bool = False, timings: StageTimings = None) -> dict:
+        """
+        Index segments [0, len(texts)) in order. timelines holds each segment's
+        word timeline (None if it had no words). Chunks of earlier runs are
+        removed on the first pass, so partial results are never mixed with a
+        previous index, and again on the final pass, which also flushes the
+        held-back chunk. Returns the new state.
+        """
+        timings = timings or StageTimings("ingest")
+        state = dict(self.state)
+        collection = open_collection(self.collection_name)
+        if state["segments"] == 0:
+            self._remove_other_runs(collection, state["run"], timings)
+            # Windows of an earlier run point at chunks that no longer exist
+            drop_levels(self.collection_name)
+        with timings.span("chunking"):
+            # Joined like the final transcript so offsets line up
+            transcript = " ".join(text for text in texts if text)
+            timeline = concat_timelines([t for t in timelines if t is not None])
+            alignment = build_alignment_index(transcript, timeline)
+            docs, starts = chunk_documents(
+                transcript[state["carry_start"]:], alignment, self.video_id, self.content_hash,
+                char_offset=state["carry_start"], first_index=state["next_chunk_index"]
+            )
+        if not final:
+            # Hold back the last chunk; with only one there is nothing final yet
+            if docs:
+                state["carry_start"] = starts[-1]
+            docs = docs[:-1]
+        for doc in docs:
+            doc.metadata["ingest_run"] = state["run"]
+        upsert_documents(collection, docs, timings)
+        if docs:
+            state["covered_until"] = max(state["covered_until"], max(doc.metadata["end_time"] for doc in docs))
+        state["next_chunk_index"] += len(docs)
+        state["segments"] = len(texts)
+        if final:
+            if len(timeline):
+                state["covered_until"] = max(state["covered_until"], float(timeline.ends[-1]))
+            self._remove_other_runs(collection, state["run"], timings)
+            with timings.span("windows"):
+                write_levels(self.collection_name, timeline)
+        # Queries in every process must see the new chunks, not cached results
+        publish_collection_change(self.collection_name)
+        self.state = state
+        return state
+
+    @staticmethod
+    def _remove_other_runs(collection, run: str, timings: StageTimings):
+        """Delete chunks written by an earlier (full or interrupted) run of this lecture."""
+        with timings.span("vector_write"):
+            existing = collection.get(include=["metadatas"])
+            stale_ids = [
+                doc_id for doc_id, metadata in zip(existing["ids"], existing["metadatas"])
+                if (metadata or {}).get("ingest_run") != run
+            ]
+            if stale_ids:
+                collection.delete(ids=stale_ids)
@@ -0,0 +1,185 @@
+import os
+from typing import List, Optional
+import numpy as np
+from chromadb.errors import NotFoundError
+from flat_index import FlatIndex
+from word_timeline import WordTimeline
+
+# Coarse-to-fine retrieval over long lectures. Ingest cuts each lecture into
+# time windows at several levels (by default ~10 minutes and ~1 minute) along
+# its word timeline and stores each level in a collection next to the chunk
+# collection. A window's vector is the mean of the vectors of the chunks it
+# overlaps, weighted by overlap, so building the levels needs no extra
+# embedding calls. A query scores the coarsest windows, then only the
+# children of the best ones, and finally only the chunks inside the best
+# finest windows: per-query work grows with the number of coarse windows
+# plus a constant, not with the number of chunks.
+WINDOW_LEVELS = tuple(sorted(
+    {int(seconds) for seconds in os.getenv("WINDOW_LEVELS", "600,60").split(",") if seconds.strip()},
+    reverse=True
+))
+# Lectures with fewer chunks get no window levels; a flat search is as cheap
+WINDOW_MIN_CHUNKS = int(os.getenv("WINDOW_MIN_CHUNKS", "64"))
+# Windows kept per level; the finest level keeps at least k
+WINDOW_BEAM = int(os.getenv("WINDOW_BEAM", "4"))
+
+
+def window_collection_name(collection_name: str, seconds: int) -> str:
+    """Collection holding one window level of a lecture (Chroma names are limited to 63 chars)."""
+    suffix = f"_w{seconds}"
+    return collection_name[:63 - len(suffix)] + suffix
+
+
+def build_levels(timeline: WordTimeline, chunk_ids: List[str], chunk_metadatas: List[dict],
+                 chunk_vectors: np.ndarray, levels=WINDOW_LEVELS) -> dict:
+    """
+    {seconds: (ids, documents, metadatas, vectors)} for each window level,
+    coarse to fine. Windows are aligned to multiples of their length and
+    trimmed to the words they contain, so start_time/end_time are exact word
+    times. Each window records its parent in the next coarser level and the
+    chunks it overlaps (IDs and index range).
+    """
+    starts = np.asarray(timeline.starts, dtype=np.float64)
+    ends = np.asarray(timeline.ends, dtype=np.float64)
+    words = timeline.words()
+    chunk_starts = np.array([m["start_time"] for m in chunk_metadatas], dtype=np.float64)
+    chunk_ends = np.array([m["end_time"] for m in chunk_metadatas], dtype=np.float64)
+    chunk_indexes = np.array([m["chunk_index"] for m in chunk_metadatas], dtype=np.int64)
+    vectors = np.asarray(chunk_vectors, dtype=np.float32)
+    built = {}
+    parent_seconds = None
+    for seconds in levels:
+        window_of_word = (starts // seconds).astype(np.int64)
+        # Words are in time order, so each window is one contiguous run
+        cuts = np.flatnonzero(np.diff(window_of_word)) + 1
+        ids, documents, metadatas, window_vectors = [], [], [], []
+        for first, last in zip(np.concatenate(([0], cuts)), np.concatenate((cuts, [len(starts)]))):
+            if first == last:
+                continue
+            start, end = float(starts[first]), float(ends[last - 1])
+            # Chunks overlapping the window; a point-like chunk counts if it lies inside
+            overlap = np.minimum(chunk_ends, end) - np.maximum(chunk_starts, start)
+            members = (overlap > 0) | ((chunk_starts >= start) & (chunk_ends <= end))
+            if not members.any():
+                continue
+            weights = np.maximum(overlap[members], 0.0) + 1e-3
+            window_vectors.append((weights[:, None] * vectors[members]).sum(axis=0) / weights.sum())
+            window = int(window_of_word[first])
+            ids.append(f"w{seconds}_{window}")
+            documents.append(" ".join(str(word) for word in words[first:last]))
+            metadatas.append({
+                "level": seconds,
+                "window_index": window,
+                "parent": int(start // parent_seconds) if parent_seconds else -1,
+                "start_time": start,
+                "end_time": end,
+                "first_chunk": int(chunk_indexes[members].min()),
+                "last_chunk": int(chunk_indexes[members].max()),
+                # Metadata values must be scalars; IDs never contain spaces
+                "chunk_ids": " ".join(chunk_ids[i] for i in np.flatnonzero(members)),
+            })
+        built[seconds] = (ids, documents, metadatas, np.asarray(window_vectors, dtype=np.float32))
+        parent_seconds = seconds
+    return built
+
+
+def drop_levels(collection_name: str):
+    """Delete a lecture's window levels, e.g. before it is reindexed."""
+    from rag_registry import get_chroma_client
+    for seconds in WINDOW_LEVELS:
+        try:
+            get_chroma_client().delete_collection(window_collection_name(collection_name, seconds))
+        except NotFoundError:
+            pass
+
+
+def write_levels(collection_name: str, timeline: WordTimeline) -> int:
+    """
+    Rebuild a lecture's window levels from its chunk collection (blocking).
+    Returns the number of windows written; lectures below WINDOW_MIN_CHUNKS
+    get none and are searched flat.
+    """
+    from rag_registry import open_collection
+    drop_levels(collection_name)
+    collection = open_collection(collection_name)
+    if collection.count() < WINDOW_MIN_CHUNKS or not len(timeline) or not WINDOW_LEVELS:
+        return 0
+    chunks = collection.get(include=["embeddings", "metadatas"])
+    written = 0
+    for seconds, (ids, documents, metadatas, vectors) in build_levels(
+        timeline, chunks["ids"], chunks["metadatas"], np.asarray(chunks["embeddings"])
+    ).items():
+        if ids:
+            open_collection(window_collection_name(collection_name, seconds)).upsert(
+                ids=ids, embeddings=vectors.tolist(), documents=documents, metadatas=metadatas
+            )
+            written += len(ids)
+    return written
+
+
+def _load_level(name: str) -> FlatIndex:
+    from rag_registry import get_chroma_client, open_collection
+    try:
+        get_chroma_client().get_collection(name)
+    except NotFoundError:
+        # Cached as "no levels" until the lecture is indexed again
+        return FlatIndex([], [], [], np.zeros((0, 0), dtype=np.float32))
+    return FlatIndex.from_collection(open_collection(name))
+
+
+def load_levels(collection_name: str) -> list:
+    """[(seconds, FlatIndex)] coarse to fine, or [] if the lecture has no complete set of levels."""
+    from rag_registry import flat_indexes
+    levels = []
+    for seconds in WINDOW_LEVELS:
+        name = window_collection_name(collection_name, seconds)
+        index = flat_indexes.get(name, lambda: _load_level(name))
+        if not len(index):
+            return []
+        levels.append((seconds, index))
+    return levels
+
+
+def search_chunk_ids(collection_name: str, vectordb, query_embedding, chunk_ids: List[str], k: int) -> list:
+    """Top-k of the given chunks by squared L2 distance, like a flat search."""
+    from rag_registry import get_collection
+    if isinstance(vectordb, FlatIndex):
+        return vectordb.search_rows(query_embedding, vectordb.rows_for_ids(chunk_ids), k)
+    # A get by ID plus scoring in process is several times faster than a
+    # Chroma query with a metadata filter over the same chunks
+    found = get_collection(collection_name).get(ids=chunk_ids, include=["embeddings", "documents", "metadatas"])
+    if not found["ids"]:
+        return []
+    candidates = FlatIndex(found["ids"], found["documents"], [m or {} for m in found["metadatas"]],
+                           np.asarray(found["embeddings"]), dtype="float32")
+    return candidates.similarity_search_by_vector_with_relevance_scores(query_embedding, k)
+
+
+def search(collection_name: str, vectordb, query_embedding, k: int, top_windows: Optional[list] = None) -> Optional[list]:
+    """
+    Coarse-to-fine search: the best windows of each level, then the best
+    chunks inside the finest ones. Returns (Document, distance) pairs like a
+    flat search, or None if the lecture has no window levels. top_windows
+    are hits already found at the coarsest level (e.g. by a cross-lecture
+    search) to descend from instead of scoring that level again.
+    """
+    levels = load_levels(collection_name)
+    if not levels:
+        return None
+    hits = top_windows
+    parents = None if hits is None else {doc.metadata["window_index"] for doc, _ in hits}
+    for depth, (seconds, index) in enumerate(levels):
+        if depth == 0 and top_windows is not None:
+            continue
+        if parents is None:
+            rows = np.arange(len(index))
+        else:
+            groups = index.rows_by("parent")
+            rows = sorted(row for parent in parents for row in groups.get(parent, ()))
+        beam = max(WINDOW_BEAM, k) if depth == len(levels) - 1 else WINDOW_BEAM
+        hits = index.search_rows(query_embedding, rows, beam)
+        if not hits:
+            return None
+        parents = {doc.metadata["window_index"] for doc, _ in hits}
+    chunk_ids = list(dict.fromkeys(chunk_id for doc, _ in hits for chunk_id in doc.metadata["chunk_ids"].split()))
+    return search_chunk_ids(collection_name, vectordb, query_embedding, chunk_ids, k)
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import glob
+import shutil
+from typing import Iterable, List
+import numpy as np
+
+# Word-level timestamps stored column-wise as plain .npy files in a directory:
+#   start.npy / end.npy  float32 seconds
+#   word_id.npy          uint32 index into vocab.npy
+#   vocab.npy            interned unique words (fixed-width unicode)
+# Plain .npy (unlike .npz) can be memory-mapped, so loading is zero-copy.
+TIMELINE_SUFFIX = "_words"
+
+
+def timeline_path(base_name: str) -> str:
+    """Timeline directory for a transcript base, e.g. uploads/<key>.transcript_words"""
+    return f"{base_name}{TIMELINE_SUFFIX}"
+
+
+class WordTimeline:
+    """Columnar view over a lecture's word timestamps."""
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, word_ids: np.ndarray, vocab: np.ndarray):
+        self.starts = starts
+        self.ends = ends
+        self.word_ids = word_ids
+        self.vocab = vocab
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def words(self) -> np.ndarray:
+        return self.vocab[self.word_ids]
+
+    def to_dicts(self) -> List[dict]:
+        """Legacy [{"word", "start", "end"}, ...] form."""
+        return [
+            {"word": str(word), "start": float(start), "end": float(end)}
+            for word, start, end in zip(self.words(), self.starts, self.ends)
+        ]
+
+
+def build_timeline(words: Iterable[str], starts: Iterable[float], ends: Iterable[float]) -> WordTimeline:
+    vocab, word_ids = np.unique(np.array(list(words), dtype=str), return_inverse=True)
+    return WordTimeline(
+        np.asarray(list(starts), dtype=np.float32),
+        np.asarray(list(ends), dtype=np.float32),
+        np.asarray(word_ids, dtype=np.uint32),
+        vocab,
+    )
+
+
+def timeline_from_dicts(words_with_timestamps: List[dict]) -> WordTimeline:
+    return build_timeline(
+        (w["word"] for w in words_with_timestamps),
+        (w["start"] for w in words_with_timestamps),
+        (w["end"] for w in words_with_timestamps),
+    )
+
+
+def save_timeline(path: str, timeline: WordTimeline):
+    """Write a timeline directory atomically (build in a temp dir, then rename)."""
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "start.npy"), timeline.starts)
+    np.save(os.path.join(tmp_path, "end.npy"), timeline.ends)
+    np.save(os.path.join(tmp_path, "word_id.npy"), timeline.word_ids)
+    np.save(os.path.join(tmp_path, "vocab.npy"), timeline.vocab)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def load_timeline(path: str, mmap: bool = True) -> WordTimeline:
+    mode = "r" if mmap else None
+    return WordTimeline(
+        np.load(os.path.join(path, "start.npy"), mmap_mode=mode),
+        np.load(os.path.join(path, "end.npy"), mmap_mode=mode),
+        np.load(os.path.join(path, "word_id.npy"), mmap_mode=mode),
+        np.load(os.path.join(path, "vocab.npy"), mmap_mode=mode),
+    )
+
+
+def concat_timelines(timelines: List[WordTimeline]) -> WordTimeline:
+    """Merge per-chunk timelines in order, re-interning the vocabulary."""
+    timelines = [t for t in timelines if len(t)]
+    if not timelines:
+        return build_timeline([], [], [])
+    vocab, inverse = np.unique(np.concatenate([t.vocab for t in timelines]), return_inverse=True)
+    word_ids = []
+    vocab_offset = 0
+    for t in timelines:
+        # Remap each chunk's local ids into the merged vocabulary
+        remap = inverse[vocab_offset:vocab_offset + len(t.vocab)]
+        word_ids.append(remap[np.asarray(t.word_ids)])
+        vocab_offset += len(t.vocab)
+    return WordTimeline(
+        np.concatenate([t.starts for t in timelines]).astype(np.float32),
+        np.concatenate([t.ends for t in timelines]).astype(np.float32),
+        np.concatenate(word_ids).astype(np.uint32),
+        vocab,
+    )
+
+
+def convert_detailed_json(json_path: str) -> str:
+    """Convert a legacy *_detailed.json file to a timeline directory beside it."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        detailed_data = json.load(f)
+    path = timeline_path(json_path[: -len("_detailed.json")])
+    save_timeline(path, timeline_from_dicts(detailed_data.get("words", [])))
+    return path
+
+
+if __name__ == "__main__":
+    # Convert existing detailed transcripts: python word_timeline.py [uploads_dir]
+    uploads_dir = sys.argv[1] if len(sys.argv) > 1 else "uploads"
+    for json_path in sorted(glob.glob(os.path.join(uploads_dir, "*_detailed.json"))):
+        print(f"{json_path} -> {convert_detailed_json(json_path)}")
@@ -5,18 +5,89 @@ import ProcessingStatus from './components/ProcessingStatus';
 import { useEffect, useRef, useState } from 'react';
 
 function App() {
-  // Placeholder for WebSocket connection
+  // Progress updates pushed by the backend for the job being watched
   const ws = useRef<WebSocket | null>(null);
+  const watchedFile = useRef<string | null>(null);
   const [uploading, setUploading] = useState(false);
   const [progress, setProgress] = useState(0);
-  const [uploadStatus, setUploadStatus] = useState<{ success: boolean; message: string; filename?: string; status?: string; session?: any } | null>(null);
+  const [uploadStatus, setUploadStatus] = useState<{ success: boolean; message: string; filename?: string; aliasOf?: string; status?: string; session?: any } | null>(null);
+
+  // File polled for status while the socket is down (null: not polling)
+  const polling = useRef<string | null>(null);
+
+  // Follow the watched job over /ws when connected, otherwise by polling
+  const followJob = () => {
+    const filename = watchedFile.current;
+    if (!filename) return;
+    if (ws.current?.readyState === WebSocket.OPEN) {
+      // The server answers with the job's current state, so nothing missed while away is lost
+      ws.current.send(JSON.stringify({ action: 'subscribe', jobs: [filename] }));
+    } else if (polling.current !== filename) {
+      polling.current = filename;
+      pollJob(filename);
+    }
+  };
+
+  const pollJob = async (filename: string) => {
+    // Stop once the socket is back (it resubscribes) or another job is watched or polled
+    if (polling.current !== filename) return;
+    if (watchedFile.current !== filename || ws.current?.readyState === WebSocket.OPEN) {
+      polling.current = null;
+      return;
+    }
+    try {
+      const res = await fetch(`http://localhost:8000/processing-status?filename=${encodeURIComponent(filename)}`);
+      const data = await res.json();
+      const job = data.jobs && data.jobs.length > 0 ? data.jobs[0] : null;
+      if (job && watchedFile.current === filename && applyJobUpdate(job)) {
+        watchedFile.current = null;
+        polling.current = null;
+        return;
+      }
+    } catch (err) {
+      // Backend unreachable: keep trying, the socket is reconnecting too
+      console.error('Failed to fetch processing status', err);
+    }
+    setTimeout(() => pollJob(filename), 2000);
+  };
 
   useEffect(() => {
-    ws.current = new WebSocket('ws://localhost:8000/ws');
-    ws.current.onopen = () => console.log('WebSocket connected');
-    ws.current.onclose = () => console.log('WebSocket closed');
-    ws.current.onerror = (e) => console.error('WebSocket error', e);
-    return () => { ws.current?.close(); };
+    let unmounted = false;
+    let retryDelay = 1000;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    const connect = () => {
+      const socket = new WebSocket('ws://localhost:8000/ws');
+      ws.current = socket;
+      socket.onopen = () => {
+        console.log('WebSocket connected');
+        retryDelay = 1000;
+        followJob();
+      };
+      // Also after the server's 1013 close for slow clients: reconnect with backoff, poll meanwhile
+      socket.onclose = (e) => {
+        if (unmounted) return;
+        console.log(`WebSocket closed (${e.code}), reconnecting in ${retryDelay / 1000}s`);
+        followJob();
+        retryTimer = setTimeout(connect, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 30000);
+      };
+      socket.onerror = (e) => console.error('WebSocket error', e);
+      socket.onmessage = (e) => {
+        const update = JSON.parse(e.data);
+        // Progress-only updates carry no status; the status line ignores them
+        if (update.event !== 'progress' || update.filename !== watchedFile.current || !update.status) return;
+        if (applyJobUpdate(update)) {
+          socket.send(JSON.stringify({ action: 'unsubscribe', jobs: [update.filename] }));
+          watchedFile.current = null;
+        }
+      };
+    };
+    connect();
+    return () => {
+      unmounted = true;
+      clearTimeout(retryTimer);
+      ws.current?.close();
+    };
   }, []);
 
   const handleUpload = async (file: File) => {
@@ -46,6 +117,7 @@ function App() {
             success: true,
             message: 'Upload successful!',
             filename: response.filename,
+            aliasOf: response.alias_of,
             status: response.status,
             session: response.session
           });
@@ -67,47 +139,45 @@ function App() {
   // State for controlling chat interface visibility
   const [showChat, setShowChat] = useState(false);
   const [processing, setProcessing] = useState(false);
-  const [processingStatus, setProcessingStatus] = useState<{ status: string; error?: string }>({ status: "queued" });
+  const [processingStatus, setProcessingStatus] = useState<{ status: string; error?: string; coverage?: { end: number } }>({ status: "queued" });
   const [videoFile, setVideoFile] = useState<string | null>(null);
 
+  // Show a job's status; returns true once it has finished (done or error)
+  const applyJobUpdate = (job: { status: string; error?: string; coverage?: { end: number } }) => {
+    setProcessingStatus({
+      status: job.status,
+      error: job.error,
+      coverage: job.coverage
+    });
+    if (job.status === "done") {
+      setProcessing(false);
+      setShowChat(true);
+      return true;
+    }
+    if (job.status === "partially_available") {
+      // The indexed part can be queried already; keep following the job
+      setShowChat(true);
+      return false;
+    }
+    if (job.status === "error") {
+      setProcessing(false);
+      setShowChat(false);
+      return true;
+    }
+    return false;
+  };
+
   // Listen for uploadStatus and switch to chat interface after upload and processing
   useEffect(() => {
     if (uploadStatus?.success) {
       setProcessing(true);
       setShowChat(false);
-      // Poll the backend for processing status
-      const poll = async () => {
-        try {
-          const res = await fetch('http://localhost:8000/processing-status');
-          const data = await res.json();
-          // Find the latest job for this file
-          const job = data.jobs && data.jobs.length > 0 ? data.jobs[data.jobs.length - 1] : null;
-          if (job) {
-            setProcessingStatus({
-              status: job.status,
-              error: job.error
-            });
-            if (job.status === "done") {
-              setProcessing(false);
-              setShowChat(true);
-              return;
-            }
-            if (job.status === "error") {
-              setProcessing(false);
-              setShowChat(false);
-              return;
-            }
-          }
-        } catch (err) {
-          setProcessingStatus({ status: "error", error: "Failed to fetch processing status." });
-          setProcessing(false);
-          setShowChat(false);
-          return;
-        }
-        setTimeout(poll, 2000);
-      };
-      poll();
-      setVideoFile((prev) => prev || (typeof uploadStatus === 'object' ? uploadStatus.filename : null));
+      if (uploadStatus.filename) {
+        // Progress of a re-uploaded lecture is published under the original's filename
+        watchedFile.current = uploadStatus.aliasOf ?? uploadStatus.filename;
+        followJob();
+      }
+      setVideoFile((prev) => prev || uploadStatus.filename || null);
     }
   }, [uploadStatus]);
 
@@ -121,14 +191,22 @@ function App() {
           {uploadStatus && <div className={uploadStatus.success ? 'text-green-600' : 'text-red-600'}>{uploadStatus.message}</div>}
           {processing && (
             <div className="w-full max-w-md mt-6">
-              <ProcessingStatus status={processingStatus.status as any} error={processingStatus.error} />
+              <ProcessingStatus status={processingStatus.status as any} error={processingStatus.error} coverage={processingStatus.coverage} />
             </div>
           )}
         </div>
       )}
       {showChat && (
         <div className="w-full">
+          {processing && (
+            <ProcessingStatus status={processingStatus.status as any} error={processingStatus.error} coverage={processingStatus.coverage} />
+          )}
           <ChatContainer videoFile={videoFile || undefined} onUploadNew={() => {
+            // Stop following the previous job, so its updates do not reopen the chat
+            if (watchedFile.current && ws.current?.readyState === WebSocket.OPEN) {
+              ws.current.send(JSON.stringify({ action: 'unsubscribe', jobs: [watchedFile.current] }));
+            }
+            watchedFile.current = null;
             setShowChat(false);
             setVideoFile(null);
             setUploadStatus(null);
@@ -1,10 +1,14 @@
 import React from "react";
 
 export interface ProcessingStatusProps {
-  status: "queued" | "processing" | "done" | "error";
+  status: "queued" | "processing" | "partially_available" | "done" | "error";
   error?: string;
+  // Seconds of the lecture already indexed while it is still processing
+  coverage?: { end: number };
 }
 
+const formatMinutes = (seconds: number) => `${Math.floor(seconds / 60)}:${String(Math.floor(seconds % 60)).padStart(2, "0")}`;
+
 
 const spinner = (
   <svg className="animate-spin h-4 w-4 text-blue-500 mr-1" viewBox="0 0 24 24">
@@ -13,7 +17,7 @@ const spinner = (
   </svg>
 );
 
-const ProcessingStatus: React.FC<ProcessingStatusProps> = ({ status, error }) => {
+const ProcessingStatus: React.FC<ProcessingStatusProps> = ({ status, error, coverage }) => {
   if (status === "processing" || status === "queued") {
     return (
       <div className="flex items-center gap-2 text-sm min-h-[32px]">
@@ -22,6 +26,16 @@ const ProcessingStatus: React.FC<ProcessingStatusProps> = ({ status, error }) =>
       </div>
     );
   }
+  if (status === "partially_available") {
+    return (
+      <div className="flex items-center gap-2 text-sm min-h-[32px]">
+        {spinner}
+        <span className="text-blue-600 font-semibold">
+          Still processing; the first {formatMinutes(coverage?.end ?? 0)} can already be queried.
+        </span>
+      </div>
+    );
+  }
   if (status === "done") {
     return (
       <div className="flex items-center gap-2 text-sm min-h-[32px]">